@@ -1,15 +1,50 @@
-import json
+import asyncio
 import logging
 import os
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from telegram import InlineQueryResultArticle, InputTextMessageContent, ReplyKeyboardMarkup, KeyboardButton
-from telegram import Update
+import httpx
+from telegram import InlineQueryResultArticle, InputTextMessageContent, ReplyKeyboardMarkup, KeyboardButton, \
+    InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Message, Update
 from telegram.error import BadRequest
-from telegram.ext import filters, MessageHandler, ApplicationBuilder, CommandHandler, ContextTypes, InlineQueryHandler
+from telegram.ext import filters, MessageHandler, ApplicationBuilder, CommandHandler, ContextTypes, InlineQueryHandler, \
+    CallbackQueryHandler, Application, BasePersistence
+
+from achi_classifiers import Classifier, Classifiers
+from achi_codes import CodeIndex, CodeMatch, fold_code, looks_like_code
+from achi_inline_cache import InlineQueryCache
+from achi_metrics import InstrumentedRequest, Metrics, MetricsExporter
+from achi_navigation import NavigationIndex
+from achi_pages import PAGE_CALLBACK_PREFIX, PARSE_MODE, escape, format_leaf, parse_page_callback_data
+from achi_persistence import SqlitePersistence
+from achi_rate_limiter import ChatRateLimiter
+from achi_reload import RELOAD_INTERVAL, DataReloader
+from achi_store import StoreFile
+from achi_updates import ChatOrderedUpdateProcessor
+from achi_webhook import WebhookConfig, run_webhook
 
 BACK = "Назад ⤴️"
 LAST_MESSAGE_ID_KEY = "last_message_id"
+NODE_KEY = "node"
+CLASSIFIER_KEY = "classifier"
+CLASSIFIER_CALLBACK_PREFIX = "classifier:"
+MAX_CONCURRENT_UPDATES = 64
+# Updates waiting for a handler, a full queue pushes back on polling and webhook delivery
+MAX_PENDING_UPDATES = 256
+# Every pooled connection is scanned on each request by httpcore, a larger pool costs more CPU than
+# it saves: requests beyond it wait up to BOT_API_POOL_TIMEOUT for a free connection
+BOT_API_CONNECTION_POOL_SIZE = 32
+BOT_API_POOL_TIMEOUT = 5.0
+# Taps are seconds apart, keep the TLS connections to the Bot API warm between them
+BOT_API_KEEPALIVE_EXPIRY = 60.0
+DATA_PATH = 'data/achi.bin'
+CLASSIFIER_TITLES = {"achi": "АКМІ", "mkh10": "МКХ-10"}
+STORAGE_DIR = '/storage'
+STATE_DB_NAME = 'chat_state.sqlite3'
+NO_LEVEL = "none"
+# Telegram answers a repeated inline query itself for this long, without asking the bot
+INLINE_CACHE_TIME = 300
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -17,10 +52,9 @@ logging.basicConfig(
 )
 
 
-def parse_data_tree() -> Dict:
-    # Opening JSON file
-    with open('data/achi.json', 'r') as openfile:
-        return json.load(openfile)
+def parse_data_tree(path: str = DATA_PATH) -> StoreFile:
+    # Memory-mapped store generated by achi_parser.py with every classifier, see achi_store.py for the format
+    return StoreFile.open(path)
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -29,66 +63,143 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = update.message.text
+    if looks_like_code(message_text) and await reply_with_code(update, context, message_text):
+        return
     await proceed_with_selected_option(message_text, update, context)
 
 
-async def proceed_with_selected_option(message_text: str, update: Update, context: ContextTypes.DEFAULT_TYPE):
-    level = context.chat_data.get("level", 0)  # todo: what if no level
-    if message_text == BACK:
-        level -= 1
-    else:
-        context.chat_data[f'choice{level}'] = message_text
-        level += 1
+async def code(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = ' '.join(context.args)
+    if not query:
+        await context.bot.send_message(chat_id=update.effective_chat.id,
+                                       text="Надішліть код, наприклад: /code 40803-00 або /code A41.50")
+    elif not await reply_with_code(update, context, query):
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="Код не знайдено.")
 
-    context.chat_data["level"] = level
 
-    achi_node = context.bot_data["achi_data"]
-    breadcrumbs = []
-    for i in range(level):
-        achi_node = achi_node["children"][context.chat_data[f'choice{i}']]
-        breadcrumbs.append(context.chat_data[f"choice{i}"])
+async def reply_with_code(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str) -> bool:
+    classifiers: Classifiers = context.bot_data["classifiers"]
+    code_index = classifiers.code_index
+    matches = code_index.lookup(query)
+    if not matches:
+        return False
+    # The most specific match, its breadcrumbs already name the enclosing block and class
+    answer = format_code_match(classifiers, matches[0])
+    if not matches[0].exact:
+        answer = f"Код {escape(fold_code(query))} не знайдено, найближчий:\n\n{answer}"
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=answer, parse_mode=PARSE_MODE)
+    return True
 
-    joined_breadcrumbs = " -> ".join(breadcrumbs)
 
-    await clean_up_old_messages(context, update)
+def format_code_match(classifiers: Classifiers, match: CodeMatch) -> str:
+    code_index: CodeIndex = classifiers.code_index
+    store = code_index.stores[match.classifier]
+    breadcrumbs = code_index.breadcrumbs(match)
+    title = classifiers.title(match.classifier)
+    header = escape(f"{title}: {breadcrumbs}" if breadcrumbs else title)
+    return f"{header}\n\n{format_leaf(store.code(match.node), store.name_ua(match.node))}"
 
-    if level == 0:
-        sent_message = await context.bot.send_message(chat_id=update.effective_chat.id,
-                                                      text=f"{joined_breadcrumbs}\nОберіть категорію:",
-                                                      reply_markup=build_reply_keyboard_markup(list(achi_node["children"].keys())))
-        context.chat_data[LAST_MESSAGE_ID_KEY] = sent_message.message_id
-    elif level == 4:
-        await context.bot.send_message(chat_id=update.effective_chat.id, text=f"{joined_breadcrumbs}")
-        for record in achi_node["children"]:
-            code = record["code"]
-            name_ua = record["name_ua"]
-            await context.bot.send_message(chat_id=update.effective_chat.id,
-                                           text=f"*Код: {code}*\nНазва: {name_ua}",
-                                           parse_mode="markdown")
+
+def current_classifier(context: ContextTypes.DEFAULT_TYPE) -> Classifier:
+    classifiers: Classifiers = context.bot_data["classifiers"]
+    return classifiers.get(context.chat_data.get(CLASSIFIER_KEY) if context.chat_data is not None else None)
+
+
+def current_node(context: ContextTypes.DEFAULT_TYPE) -> int:
+    navigation = current_classifier(context).navigation
+    key = context.chat_data.get(NODE_KEY)
+    # A category that is gone after a reload, or state saved before chats kept node keys, starts over
+    node = navigation.node_by_key(key) if key is not None else None
+    return navigation.root if node is None else node
+
+
+def set_current_node(context: ContextTypes.DEFAULT_TYPE, classifier: Classifier, node: int) -> None:
+    # The key rather than the id, it finds the same category in the next version of the data
+    context.chat_data[NODE_KEY] = classifier.navigation.key(node)
+
+
+async def proceed_with_selected_option(message_text: str, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    classifier = current_classifier(context)
+    navigation: NavigationIndex = classifier.navigation
+    node = current_node(context)
+    if message_text == BACK:
+        node = navigation.back(node)
     else:
-        possible_options = list(achi_node["children"].keys())
-        if len(possible_options) == 1:
-            await proceed_with_selected_option(possible_options[0], update, context)
+        selected_node = navigation.child_by_label(node, message_text)
+        if selected_node is None:
+            await unknown(update, context)
             return
+        node = navigation.skip_single_choices(selected_node)
+
+    set_current_node(context, classifier, node)
+    joined_breadcrumbs = navigation.breadcrumbs(node)
+
+    if node == navigation.root:
+        sent_message = await send_replacing_old_messages(update, context,
+                                                         text=f"{joined_breadcrumbs}\nОберіть категорію:",
+                                                         reply_markup=build_reply_keyboard_markup(
+                                                             navigation.child_labels(node)))
+        context.chat_data[LAST_MESSAGE_ID_KEY] = sent_message.message_id
+    elif navigation.has_leaf_children(node):
+        page_text, page_markup = classifier.leaf_pages.render(node, 0)
+        await send_replacing_old_messages(update, context, text=page_text,
+                                          parse_mode=PARSE_MODE, reply_markup=page_markup)
+    else:
+        sent_message = await send_replacing_old_messages(update, context,
+                                                         text=f"{joined_breadcrumbs}\nОберіть під-категорію:",
+                                                         reply_markup=build_reply_keyboard_markup(
+                                                             [BACK] + navigation.child_labels(node)))
+        context.chat_data[LAST_MESSAGE_ID_KEY] = sent_message.message_id
 
-        sent_message = await context.bot.send_message(chat_id=update.effective_chat.id,
-                                                      text=f"{joined_breadcrumbs}\nОберіть під-категорію:",
-                                                      reply_markup=build_reply_keyboard_markup(
-                                                          [BACK] + possible_options))
+
+async def send_replacing_old_messages(update: Update, context: ContextTypes.DEFAULT_TYPE, **kwargs) -> Message:
+    # The previous step is deleted while the next one is being sent, a tap costs one round-trip instead of three
+    last_message_id = context.chat_data.pop(LAST_MESSAGE_ID_KEY, None)
+    sent_message, cleanup_error = await asyncio.gather(
+        context.bot.send_message(chat_id=update.effective_chat.id, **kwargs),
+        clean_up_old_messages(context, update, last_message_id),
+        return_exceptions=True)
+    if isinstance(sent_message, BaseException):
+        raise sent_message
+    if isinstance(cleanup_error, BaseException):
         context.chat_data[LAST_MESSAGE_ID_KEY] = sent_message.message_id
+        raise cleanup_error
+    return sent_message
+
+
+async def leaf_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    parsed = parse_page_callback_data(query.data)
+    if parsed is None:
+        return
+    node_id, page, classifier_name, data_version = parsed
+    classifiers: Classifiers = context.bot_data["classifiers"]
+    if data_version and data_version != classifiers.data_version:
+        # The node id is from the data served before a reload, the buttons can't be trusted anymore
+        await query.edit_message_reply_markup(reply_markup=None)
+        return
+    leaf_pages = classifiers.get(classifier_name).leaf_pages
+    if leaf_pages.page_count(node_id) == 0:
         return
+    page_text, page_markup = leaf_pages.render(node_id, page)
+    await query.edit_message_text(text=page_text, parse_mode=PARSE_MODE, reply_markup=page_markup)
 
 
-async def clean_up_old_messages(context, update):
+async def clean_up_old_messages(context, update, last_message_id: Optional[int]):
+    message_ids = [update.message.message_id]
+    if last_message_id is not None:
+        message_ids.append(last_message_id)
+    await asyncio.gather(*(delete_message_if_exists(context, update.effective_chat.id, message_id)
+                           for message_id in message_ids))
+
+
+async def delete_message_if_exists(context, chat_id: int, message_id: int):
     try:
-        await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=update.message.message_id)
+        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
     except BadRequest as e:
         if e.message != "Message to delete not found":  # already deleted, that's fine
             raise e
-    if LAST_MESSAGE_ID_KEY in context.chat_data:
-        await context.bot.delete_message(chat_id=update.effective_chat.id,
-                                         message_id=context.chat_data[LAST_MESSAGE_ID_KEY])
-        del context.chat_data[LAST_MESSAGE_ID_KEY]
 
 
 async def caps(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -96,37 +207,79 @@ async def caps(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_message(chat_id=update.effective_chat.id, text=text_caps)
 
 
-async def inline_caps(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.inline_query.query
-    if not query:
+    if not query.strip():
         return
 
-    results = [InlineQueryResultArticle(
-        id=query.upper(),
-        title='Caps',
-        input_message_content=InputTextMessageContent(query.upper())
-    )]
-    await context.bot.answer_inline_query(update.inline_query.id, results)
+    # Inline queries come without a chat, the user's private chat with the bot has their classifier
+    user_id = update.inline_query.from_user.id
+    if context.application.persistence is not None:
+        # The application only loads the state of an update's own chat, after a restart it's not there yet
+        await context.application.persistence.refresh_chat_data(user_id, context.application.chat_data[user_id])
+    private_chat_data = context.application.chat_data.get(user_id)
+    classifiers: Classifiers = context.bot_data["classifiers"]
+    classifier = classifiers.get(private_chat_data and private_chat_data.get(CLASSIFIER_KEY))
+    inline_cache: InlineQueryCache = context.bot_data["inline_cache"]
+    store = classifier.store
+    results = []
+    for leaf in inline_cache.search(classifier, query):
+        code = store.code(leaf)
+        name_ua = store.name_ua(leaf)
+        results.append(InlineQueryResultArticle(
+            id=f"{classifier.name}:{leaf}",
+            title=f"{code} {name_ua}",
+            description=" -> ".join(store.name_ua(node) for node in store.path(leaf)[:-1]),
+            input_message_content=InputTextMessageContent(format_leaf(code, name_ua), parse_mode=PARSE_MODE)
+        ))
+    # With several classifiers the same query has different results depending on the user's choice
+    await context.bot.answer_inline_query(update.inline_query.id, results, cache_time=INLINE_CACHE_TIME,
+                                          is_personal=len(classifiers) > 1)
 
 
 async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_message(chat_id=update.effective_chat.id, text="Вибачте, я не зрозумів вашу команду.")
 
 
-def select_factory(options: List[str]):
-    reply_markup = build_reply_keyboard_markup(options)
-
-    async def select_inner(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user = update.message.from_user
-        logging.info(f"User initiated new selection "
-                     f"[id={user.id}, name={user.first_name} {user.last_name}, username={user.username}]")
-        context.chat_data["level"] = 0
-        sent_message = await context.bot.send_message(chat_id=update.effective_chat.id,
-                                                      text="Оберіть категорію:",
-                                                      reply_markup=reply_markup)
-        context.chat_data["last_message_id"] = sent_message.message_id
-
-    return select_inner
+async def select(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.message.from_user
+    logging.info(f"User initiated new selection "
+                 f"[id={user.id}, name={user.first_name} {user.last_name}, username={user.username}]")
+    await start_selection(update, context)
+
+
+async def start_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    classifier = current_classifier(context)
+    navigation = classifier.navigation
+    set_current_node(context, classifier, navigation.root)
+    sent_message = await context.bot.send_message(chat_id=update.effective_chat.id,
+                                                  text="Оберіть категорію:",
+                                                  reply_markup=build_reply_keyboard_markup(
+                                                      navigation.child_labels(navigation.root)))
+    context.chat_data[LAST_MESSAGE_ID_KEY] = sent_message.message_id
+
+
+async def choose_classifier(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    classifiers: Classifiers = context.bot_data["classifiers"]
+    selected = current_classifier(context)
+    buttons = [[InlineKeyboardButton(("✅ " if classifier is selected else "") + classifier.title,
+                                     callback_data=f"{CLASSIFIER_CALLBACK_PREFIX}{classifier.name}")]
+               for classifier in classifiers]
+    await context.bot.send_message(chat_id=update.effective_chat.id, text="Оберіть класифікатор:",
+                                   reply_markup=InlineKeyboardMarkup(buttons))
+
+
+async def switch_classifier(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    classifiers: Classifiers = context.bot_data["classifiers"]
+    name = query.data[len(CLASSIFIER_CALLBACK_PREFIX):]
+    if name not in classifiers:
+        return
+    # Node ids belong to a classifier, the chat starts over from the root of the new one
+    context.chat_data[CLASSIFIER_KEY] = name
+    await query.edit_message_text(text=f"Класифікатор: {classifiers.title(name)}")
+    await start_selection(update, context)
 
 
 def build_reply_keyboard_markup(options: List[str]) -> ReplyKeyboardMarkup:
@@ -138,10 +291,95 @@ def build_keys_for_each_children(achi_data: Dict, achi_node: Dict) -> List[Tuple
     return [(achi_data[str(key)]["name_ua"], key) for key in achi_node["children"]]
 
 
-if __name__ == '__main__':
-    parsed_data = parse_data_tree()
-    application = ApplicationBuilder().token(os.environ['TOKEN']).build()
-    application.bot_data["achi_data"] = parsed_data
+def navigation_level(context: ContextTypes.DEFAULT_TYPE) -> str:
+    # Inline queries have no chat, and a chat that never opened /select has no node yet
+    if context.chat_data is None or NODE_KEY not in context.chat_data:
+        return NO_LEVEL
+    return str(current_classifier(context).navigation.depth(current_node(context)))
+
+
+async def post_init(application: Application) -> None:
+    metrics_exporter: Optional[MetricsExporter] = application.bot_data.get("metrics_exporter")
+    if metrics_exporter is not None:
+        await metrics_exporter.start()
+    data_reloader: Optional[DataReloader] = application.bot_data.get("data_reloader")
+    if data_reloader is not None:
+        await data_reloader.start()
+
+
+async def post_stop(application: Application) -> None:
+    # Everything is handed over when the application stops, don't leave it to the shutdown
+    if isinstance(application.persistence, SqlitePersistence):
+        await application.persistence.write_pending()
+
+
+async def post_shutdown(application: Application) -> None:
+    metrics_exporter: Optional[MetricsExporter] = application.bot_data.get("metrics_exporter")
+    if metrics_exporter is not None:
+        await metrics_exporter.stop()
+    data_reloader: Optional[DataReloader] = application.bot_data.get("data_reloader")
+    if data_reloader is not None:
+        await data_reloader.stop()
+
+
+def build_metrics_exporter(metrics: Metrics) -> MetricsExporter:
+    metrics_port = os.environ.get('METRICS_PORT')
+    return MetricsExporter(metrics,
+                           host=os.environ.get('METRICS_HOST', '127.0.0.1'),
+                           port=int(metrics_port) if metrics_port else None,
+                           log_interval=float(os.environ.get('METRICS_LOG_INTERVAL', 0)))
+
+
+def build_bot_api_request(metrics: Metrics) -> InstrumentedRequest:
+    limits = httpx.Limits(max_connections=BOT_API_CONNECTION_POOL_SIZE,
+                          max_keepalive_connections=BOT_API_CONNECTION_POOL_SIZE,
+                          keepalive_expiry=BOT_API_KEEPALIVE_EXPIRY)
+    return InstrumentedRequest(metrics, connection_pool_size=BOT_API_CONNECTION_POOL_SIZE,
+                               pool_timeout=BOT_API_POOL_TIMEOUT, httpx_kwargs={"limits": limits})
+
+
+def build_data_reloader(path: str = DATA_PATH) -> Optional[DataReloader]:
+    # Polls the store file for a new version, 0 turns reloading off
+    interval = float(os.environ.get('DATA_RELOAD_INTERVAL', RELOAD_INTERVAL))
+    return DataReloader(path, CLASSIFIER_TITLES, interval) if interval > 0 else None
+
+
+def build_persistence() -> Optional[SqlitePersistence]:
+    # Chat state survives restarts when there is a volume to keep it on
+    path = os.environ.get('STATE_DB_PATH')
+    if path is None and os.path.isdir(STORAGE_DIR):
+        path = os.path.join(STORAGE_DIR, STATE_DB_NAME)
+    return SqlitePersistence(path) if path else None
+
+
+def build_bot_data(parsed_data: StoreFile, metrics: Optional[Metrics] = None) -> Dict:
+    return {
+        "classifiers": Classifiers(parsed_data, CLASSIFIER_TITLES),
+        "inline_cache": InlineQueryCache(metrics=metrics),
+    }
+
+
+def build_application(application_builder: ApplicationBuilder, parsed_data: StoreFile,
+                      rate_limiter: Optional[ChatRateLimiter] = None, metrics: Optional[Metrics] = None,
+                      metrics_exporter: Optional[MetricsExporter] = None,
+                      persistence: Optional[BasePersistence] = None,
+                      data_reloader: Optional[DataReloader] = None) -> Application:
+    metrics = metrics or Metrics()
+    if persistence is not None:
+        application_builder = application_builder.persistence(persistence)
+    application = application_builder \
+        .request(build_bot_api_request(metrics)) \
+        .update_queue(asyncio.Queue(maxsize=MAX_PENDING_UPDATES)) \
+        .rate_limiter(rate_limiter or ChatRateLimiter()) \
+        .concurrent_updates(ChatOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES)) \
+        .post_init(post_init) \
+        .post_stop(post_stop) \
+        .post_shutdown(post_shutdown) \
+        .build()
+    application.bot_data.update(build_bot_data(parsed_data, metrics))
+    application.bot_data["metrics"] = metrics
+    if metrics_exporter is not None:
+        application.bot_data["metrics_exporter"] = metrics_exporter
 
     start_handler = CommandHandler('start', start)
     application.add_handler(start_handler)
@@ -152,22 +390,51 @@ if __name__ == '__main__':
     caps_handler = CommandHandler('caps', caps)
     application.add_handler(caps_handler)
 
-    select_handler = CommandHandler("select", select_factory(
-        parsed_data["children"].keys()))
+    code_handler = CommandHandler('code', code)
+    application.add_handler(code_handler)
+
+    select_handler = CommandHandler("select", select)
     application.add_handler(select_handler)
 
-    inline_caps_handler = InlineQueryHandler(inline_caps)
-    application.add_handler(inline_caps_handler)
+    classifier_handler = CommandHandler("classifier", choose_classifier)
+    application.add_handler(classifier_handler)
+
+    switch_classifier_handler = CallbackQueryHandler(switch_classifier, pattern=f"^{CLASSIFIER_CALLBACK_PREFIX}")
+    application.add_handler(switch_classifier_handler)
+
+    leaf_page_handler = CallbackQueryHandler(leaf_page, pattern=f"^{PAGE_CALLBACK_PREFIX}")
+    application.add_handler(leaf_page_handler)
+
+    inline_search_handler = InlineQueryHandler(inline_search)
+    application.add_handler(inline_search_handler)
 
     # Other handlers
     unknown_handler = MessageHandler(filters.COMMAND, unknown)
     application.add_handler(unknown_handler)
 
-    application.run_polling()
+    metrics.instrument_handlers(application, navigation_level)
+    if data_reloader is not None:
+        # Wraps the instrumented callbacks, a replaced version is released after the metrics are recorded
+        data_reloader.attach(application)
+        application.bot_data["data_reloader"] = data_reloader
+    return application
+
+
+if __name__ == '__main__':
+    # Read first, a webhook without its secret refuses to start before the data is loaded
+    webhook_config = WebhookConfig.from_env()
+    bot_metrics = Metrics()
+    bot_data_reloader = build_data_reloader()
+    application = build_application(ApplicationBuilder().token(os.environ['TOKEN']), parse_data_tree(),
+                                     metrics=bot_metrics, metrics_exporter=build_metrics_exporter(bot_metrics),
+                                     persistence=build_persistence(), data_reloader=bot_data_reloader)
+    if webhook_config is None:
+        application.run_polling()
+    else:
+        run_webhook(application, webhook_config)
 
 """
 TODO:
 * skip selection if only one option available
 * button to start selection
-* handle case when bot is restarted and state is lost
 """
@@ -0,0 +1,82 @@
+"""
+Classifiers served by one bot process.
+
+Every classifier (ACHI, MKH10) is a view over the same store file, so labels repeated across
+levels and classifiers share the file's string pool. Code lookup, navigation, leaf pages, the
+search and the fuzzy index of every classifier are built along with ``Classifiers``: at startup,
+before the bot serves updates, and in a worker thread for a reloaded file (see ``achi_reload.py``).
+No handler builds an index on the event loop, MKH10's navigation alone takes ~330 ms and a fuzzy
+index ~430 ms.
+"""
+from collections import OrderedDict
+from functools import cached_property
+from typing import Dict, Iterator, Optional
+
+from achi_codes import CodeIndex
+from achi_fuzzy import FuzzyIndex
+from achi_navigation import NavigationIndex
+from achi_pages import LeafPages
+from achi_search import SearchIndex
+from achi_store import ClassifierStore, StoreFile
+
+
+class Classifier:
+    def __init__(self, store: ClassifierStore, title: str, data_version: str = ""):
+        self.store = store
+        self.name = store.name
+        self.title = title
+        self.data_version = data_version
+
+    @cached_property
+    def navigation(self) -> NavigationIndex:
+        return NavigationIndex(self.store)
+
+    @cached_property
+    def leaf_pages(self) -> LeafPages:
+        return LeafPages(self.navigation, classifier=self.name, data_version=self.data_version)
+
+    @cached_property
+    def search_index(self) -> SearchIndex:
+        return SearchIndex.from_store(self.store)
+
+    @cached_property
+    def fuzzy_index(self) -> FuzzyIndex:
+        return FuzzyIndex.build(self.store)
+
+    def warm_up(self) -> "Classifier":
+        """Builds the indexes now instead of in the handler of the first chat that needs them."""
+        for index in ("navigation", "leaf_pages", "search_index", "fuzzy_index"):
+            getattr(self, index)
+        return self
+
+
+class Classifiers:
+    def __init__(self, store_file: StoreFile, titles: Dict[str, str]):
+        self.store_file = store_file
+        self.data_version = store_file.digest
+        self._classifiers: "OrderedDict[str, Classifier]" = OrderedDict(
+            (store.name, Classifier(store, titles.get(store.name, store.name), self.data_version))
+            for store in store_file)
+        if not self._classifiers:
+            raise ValueError("The store has no classifiers")
+        for classifier in self._classifiers.values():
+            classifier.warm_up()
+        # The first classifier of the file is what chats see until they switch
+        self.default = next(iter(self._classifiers.values()))
+        self.code_index = CodeIndex.build({name: classifier.store for name, classifier in self._classifiers.items()})
+
+    def get(self, name: Optional[str]) -> Classifier:
+        """The named classifier, or the default one for chats that never switched or a classifier that's gone."""
+        return self._classifiers.get(name, self.default) if name else self.default
+
+    def title(self, name: str) -> str:
+        return self._classifiers[name].title
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._classifiers
+
+    def __iter__(self) -> Iterator[Classifier]:
+        return iter(self._classifiers.values())
+
+    def __len__(self) -> int:
+        return len(self._classifiers)
@@ -0,0 +1,133 @@
+"""
+Direct code lookup over the loaded classifiers.
+
+Codes (ACHI ``40803-00``, MKH10 ``A41.50``, ``A41.5``, ``A41`` and block ranges ``A00-A09``) are
+kept in a hash index keyed by their normalized form, so an exact lookup is a single dict access.
+MKH10 block and class ranges additionally go into interval indexes: a code that isn't in the
+data, or a range that isn't a block, still resolves to the block and class it falls into.
+"""
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from achi_search import normalize_code
+from achi_store import ClassifierStore
+
+# Users type MKH10 codes on a Ukrainian keyboard layout just as often
+CYRILLIC_TO_LATIN = str.maketrans("АВСЕНІКМОРТХ", "ABCEHIKMOPTX")
+ACHI_CODE_PATTERN = re.compile(r"^\d{5}\s*[-–]?\s*\d{2}$")
+MKH10_CODE_PATTERN = re.compile(r"^[A-Z]\d{2}(\.?\d{1,2})?$")
+MKH10_RANGE_PATTERN = re.compile(r"^\(?([A-Z]\d{2})\s*[-–]\s*([A-Z]\d{2})\)?$")
+# Ranges and single categories inside a class description like "... (U50 –U73, U90, V00-Y98)"
+CLASS_RANGE_PATTERN = re.compile(r"([A-Z]\d{2})(?:\s*[-–]\s*([A-Z]\d{2}))?")
+CATEGORY_LENGTH = 3
+
+
+def fold_code(text: str) -> str:
+    return text.strip().upper().translate(CYRILLIC_TO_LATIN)
+
+
+def looks_like_code(text: str) -> bool:
+    folded = fold_code(text)
+    return bool(ACHI_CODE_PATTERN.match(folded) or MKH10_CODE_PATTERN.match(folded)
+                or MKH10_RANGE_PATTERN.match(folded))
+
+
+class IntervalIndex:
+    """Disjoint closed intervals of MKH10 categories, e.g. A00..A09, looked up with a binary search."""
+
+    def __init__(self):
+        self._intervals: List[Tuple[str, str, int]] = []
+        self._starts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, start: str, end: str, node: int) -> None:
+        self._intervals.append((start, end, node))
+
+    def freeze(self) -> "IntervalIndex":
+        self._intervals.sort()
+        self._starts = [start for start, _, _ in self._intervals]
+        return self
+
+    def find(self, category: str) -> Optional[int]:
+        index = bisect_right(self._starts, category) - 1
+        if index >= 0 and category <= self._intervals[index][1]:
+            return self._intervals[index][2]
+        return None
+
+
+@dataclass(frozen=True)
+class CodeMatch:
+    classifier: str
+    node: int
+    exact: bool
+
+
+class CodeIndex:
+    def __init__(self, stores: Dict[str, ClassifierStore]):
+        self.stores = stores
+        self._codes: Dict[str, Tuple[str, int]] = {}
+        # Per classifier: (blocks, classes)
+        self._ranges: Dict[str, Tuple[IntervalIndex, IntervalIndex]] = {}
+
+    @classmethod
+    def build(cls, stores: Dict[str, Optional[ClassifierStore]]) -> "CodeIndex":
+        index = cls({name: store for name, store in stores.items() if store is not None})
+        for name, store in index.stores.items():
+            index._add(name, store)
+        return index
+
+    def _add(self, classifier: str, store: ClassifierStore) -> None:
+        blocks, classes = IntervalIndex(), IntervalIndex()
+        for node in range(1, store.node_count):
+            code = fold_code(store.code(node))
+            block_range = MKH10_RANGE_PATTERN.match(code)
+            if block_range:
+                blocks.add(block_range.group(1), block_range.group(2), node)
+            if ACHI_CODE_PATTERN.match(code) or MKH10_CODE_PATTERN.match(code) or block_range:
+                self._codes.setdefault(normalize_code(code), (classifier, node))
+
+        # Only MKH10 classes carry their ranges, in the description
+        for node in store.children(store.root):
+            description = fold_code(store.name_ua(node))
+            if "(" not in description:
+                continue
+            for start, end in CLASS_RANGE_PATTERN.findall(description[description.rindex("("):]):
+                classes.add(start, end or start, node)
+                if end:
+                    self._codes.setdefault(normalize_code(f"{start}{end}"), (classifier, node))
+        if blocks or classes:
+            self._ranges[classifier] = (blocks.freeze(), classes.freeze())
+
+    def lookup(self, text: str) -> List[CodeMatch]:
+        """Exact match, or failing that the closest enclosing codes, most specific first."""
+        folded = fold_code(text)
+        key = normalize_code(folded.strip("()"))
+        exact = self._codes.get(key)
+        if exact is not None:
+            return [CodeMatch(exact[0], exact[1], True)]
+
+        matches = []
+        if MKH10_CODE_PATTERN.match(folded):
+            # A41.59 -> A41.5 -> A41
+            for length in range(len(key) - 1, CATEGORY_LENGTH - 1, -1):
+                parent = self._codes.get(key[:length])
+                if parent is not None:
+                    matches.append(CodeMatch(parent[0], parent[1], False))
+                    break
+        range_match = MKH10_RANGE_PATTERN.match(folded)
+        if range_match or MKH10_CODE_PATTERN.match(folded):
+            category = range_match.group(1) if range_match else key[:CATEGORY_LENGTH]
+            for classifier, interval_indexes in self._ranges.items():
+                for intervals in interval_indexes:
+                    node = intervals.find(category)
+                    if node is not None and CodeMatch(classifier, node, False) not in matches:
+                        matches.append(CodeMatch(classifier, node, False))
+        return matches
+
+    def breadcrumbs(self, match: CodeMatch) -> str:
+        store = self.stores[match.classifier]
+        return " -> ".join(store.name_ua(node) for node in store.path(match.node)[:-1])
@@ -0,0 +1,226 @@
+"""
+Typo-tolerant search over classifier leaves.
+
+Tokens of leaf names (Ukrainian and English) are folded to a Latin skeleton: Ukrainian letters are
+transliterated, so "лапароскопія", "laparoskopiia" and "laparoskopiya" are at most an edit apart.
+The folded vocabulary goes into a SymSpell-style deletion index: every term is filed under all
+strings obtained by deleting up to MAX_DISTANCE characters from its first PREFIX_LENGTH
+characters. A query token looks up its own deletions, which yields the terms within its edit
+distance without scanning the vocabulary, and the candidates are verified with the
+Damerau-Levenshtein (optimal string alignment) distance. A query typed on the wrong keyboard
+layout is tried converted as well.
+
+Leaves are ranked by the number of query tokens they miss, then by the total edit distance.
+Verification stops when the time budget runs out, the leaves ranked by then are returned.
+``export`` writes the index as JSON for consumers outside the bot.
+"""
+import heapq
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+
+from achi_search import MAX_RESULTS, normalize_text, tokenize
+from achi_store import ClassifierStore, StoreFile
+
+EXPORT_VERSION = 1
+MAX_DISTANCE = 2
+# Deletions of longer terms are only generated for their prefix, which keeps the index small
+PREFIX_LENGTH = 6
+# Inline queries arrive as the user types, the fuzzy fallback must not hold the answer back
+SEARCH_BUDGET = 0.05
+
+TRANSLITERATION = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie", "ж": "zh", "з": "z",
+    "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+    "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "'": "",
+    # Russian letters typed by habit
+    "ы": "y", "э": "e", "ъ": "",
+})
+LAYOUT_LATIN = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+LAYOUT_CYRILLIC = "йцукенгшщзхїфівапролджєячсмитьбю'"
+TO_CYRILLIC_LAYOUT = str.maketrans(LAYOUT_LATIN, LAYOUT_CYRILLIC)
+TO_LATIN_LAYOUT = str.maketrans(LAYOUT_CYRILLIC, LAYOUT_LATIN)
+
+
+def fold(token: str) -> str:
+    return token.translate(TRANSLITERATION)
+
+
+def allowed_distance(length: int) -> int:
+    """Edit distance tolerated for a query token of the given length."""
+    if length <= 2:
+        return 0
+    return 1 if length <= 5 else MAX_DISTANCE
+
+
+def deletions(term: str, max_distance: int) -> Set[str]:
+    """The term's prefix and every string obtained by deleting up to max_distance characters from it."""
+    result = {term[:PREFIX_LENGTH]}
+    frontier = result
+    for _ in range(max_distance):
+        frontier = {word[:index] + word[index + 1:] for word in frontier if len(word) > 1
+                    for index in range(len(word))}
+        result |= frontier
+    return result
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    """Optimal string alignment distance, anything above ``limit`` is reported as ``limit + 1``."""
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    before_previous: List[int] = []
+    previous = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        current = [i] + [0] * len(second)
+        row_min = i
+        for j in range(1, len(second) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first[i - 1] != second[j - 1]))
+            if i > 1 and j > 1 and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]:
+                value = min(value, before_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def query_variants(query: str) -> List[str]:
+    """The query as typed and, when it differs, as if it had been typed on the other keyboard layout."""
+    normalized = normalize_text(query)
+    variants = [normalized]
+    for table in (TO_CYRILLIC_LAYOUT, TO_LATIN_LAYOUT):
+        converted = normalized.translate(table)
+        if converted not in variants:
+            variants.append(converted)
+    return variants
+
+
+class FuzzyIndex:
+    def __init__(self, leaves: List[int], codes: List[str], terms: List[str], postings: List[Tuple[int, ...]],
+                 deletes: Dict[str, Tuple[int, ...]]):
+        self.leaves = leaves  # leaf ordinal -> store node id
+        self.codes = codes
+        self._terms = terms
+        self._postings = postings  # term id -> leaf ordinals
+        self._deletes = deletes  # deletion -> term ids
+
+    @classmethod
+    def build(cls, store: ClassifierStore) -> "FuzzyIndex":
+        leaves = [node_id for node_id in range(store.node_count) if store.is_leaf(node_id)]
+        term_postings: Dict[str, List[int]] = {}
+        for ordinal, node_id in enumerate(leaves):
+            for token in set(tokenize(store.name_ua(node_id)) + tokenize(store.name_en(node_id))):
+                term = fold(token)
+                if term:
+                    postings = term_postings.setdefault(term, [])
+                    if not postings or postings[-1] != ordinal:
+                        postings.append(ordinal)
+
+        terms = sorted(term_postings)
+        deletes: Dict[str, List[int]] = {}
+        for term_id, term in enumerate(terms):
+            for deletion in deletions(term, MAX_DISTANCE):
+                deletes.setdefault(deletion, []).append(term_id)
+        return cls(leaves, [store.code(node_id) for node_id in leaves], terms,
+                   [tuple(term_postings[term]) for term in terms],
+                   {deletion: tuple(term_ids) for deletion, term_ids in deletes.items()})
+
+    def _matching_terms(self, token: str, prefix: bool, deadline: float) -> Iterable[Tuple[int, int]]:
+        """(term id, distance) of terms close to the token, a token still being typed also matches term prefixes."""
+        max_distance = allowed_distance(len(token))
+        candidates: Set[int] = set()
+        for deletion in deletions(token, max_distance):
+            candidates.update(self._deletes.get(deletion, ()))
+        for term_id in candidates:
+            if time.perf_counter() > deadline:
+                return
+            term = self._terms[term_id]
+            distance = edit_distance(token, term, max_distance)
+            if prefix and distance and len(term) > len(token):
+                distance = min(distance, edit_distance(token, term[:len(token)], max_distance))
+            if distance <= max_distance:
+                yield term_id, distance
+
+    def _score(self, query: str, deadline: float) -> Dict[int, Tuple[int, int]]:
+        """Leaf ordinal -> (query tokens missed, total edit distance)."""
+        tokens = [term for term in map(fold, tokenize(query)) if term]
+        token_distances: List[Dict[int, int]] = []
+        for position, token in enumerate(tokens):
+            leaf_distances: Dict[int, int] = {}
+            for term_id, distance in self._matching_terms(token, position == len(tokens) - 1, deadline):
+                for ordinal in self._postings[term_id]:
+                    if distance < leaf_distances.get(ordinal, MAX_DISTANCE + 1):
+                        leaf_distances[ordinal] = distance
+            token_distances.append(leaf_distances)
+
+        scores: Dict[int, Tuple[int, int]] = {}
+        for leaf_distances in token_distances:
+            for ordinal in leaf_distances:
+                if ordinal not in scores:
+                    distances = [per_token.get(ordinal) for per_token in token_distances]
+                    scores[ordinal] = (distances.count(None), sum(filter(None, distances)))
+        return scores
+
+    def search(self, query: str, limit: int = MAX_RESULTS, budget: float = SEARCH_BUDGET) -> List[int]:
+        """Returns store node ids of the closest leaves, best first."""
+        deadline = time.perf_counter() + budget
+        scores: Dict[int, Tuple[int, int]] = {}
+        for variant in query_variants(query):
+            for ordinal, score in self._score(variant, deadline).items():
+                previous = scores.get(ordinal)
+                if previous is None or score < previous:
+                    scores[ordinal] = score
+        best = heapq.nsmallest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [self.leaves[ordinal] for ordinal, _ in best]
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": EXPORT_VERSION,
+            "max_distance": MAX_DISTANCE,
+            "prefix_length": PREFIX_LENGTH,
+            "transliteration": {chr(letter): latin for letter, latin in TRANSLITERATION.items()},
+            "leaves": self.leaves,
+            "codes": self.codes,
+            "terms": self._terms,
+            "postings": self._postings,
+            "deletes": self._deletes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FuzzyIndex":
+        if data.get("version") != EXPORT_VERSION or data.get("max_distance") != MAX_DISTANCE \
+                or data.get("prefix_length") != PREFIX_LENGTH:
+            raise ValueError("Fuzzy index was exported with other parameters")
+        return cls(data["leaves"], data["codes"], data["terms"], [tuple(postings) for postings in data["postings"]],
+                   {deletion: tuple(term_ids) for deletion, term_ids in data["deletes"].items()})
+
+    def export(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as outfile:
+            json.dump(self.to_dict(), outfile, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FuzzyIndex":
+        with open(path, "r", encoding="utf-8") as infile:
+            return cls.from_dict(json.load(infile))
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) != 3:
+        print(f"Usage: {argv[0]} <store.bin> <output dir>")
+        sys.exit(1)
+    store_file = StoreFile.open(argv[1])
+    os.makedirs(argv[2], exist_ok=True)
+    for store in store_file:
+        path = os.path.join(argv[2], f"{store.name}-fuzzy.json")
+        FuzzyIndex.build(store).export(path)
+        print(f"{store.name}: {path}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
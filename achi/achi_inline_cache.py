@@ -0,0 +1,111 @@
+"""
+Result cache for inline queries.
+
+Inline queries arrive on every keystroke and repeat, between users and whenever a user deletes a
+character. Results are cached per classifier and normalized query, with LRU eviction and a TTL.
+A query that isn't cached but extends a cached one ("холе" after "хол") hands the cached match of
+the last token to ``SearchIndex.search_refining``, which filters it instead of looking the token
+up in the whole vocabulary. Queries that match nothing as typed go to the fuzzy index, their
+results are cached the same way.
+
+Every query is counted as a ``hit``, ``refined``, ``miss`` or ``fuzzy`` in ``stats`` and, when
+given, in the metrics.
+"""
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from achi_classifiers import Classifier
+from achi_metrics import INLINE_CACHE_METRIC, Metrics
+from achi_search import TokenMatch, normalize_text
+
+MAX_ENTRIES = 4096
+# The cache is cleared when the data is reloaded, the TTL bounds how long rarely used entries hold memory
+TTL = 600.0
+HIT = "hit"
+REFINED = "refined"
+MISS = "miss"
+FUZZY = "fuzzy"
+
+
+@dataclass
+class CachedQuery:
+    leaves: List[int]
+    token_match: Optional[TokenMatch]
+    expires: float
+
+
+class InlineQueryCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL, metrics: Optional[Metrics] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.metrics = metrics
+        self.stats: Counter = Counter()
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], CachedQuery]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: Tuple[str, str]) -> Optional[CachedQuery]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= self._clock():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: Tuple[str, str], leaves: List[int], token_match: Optional[TokenMatch]) -> None:
+        self._entries[key] = CachedQuery(leaves, token_match, self._clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def _previous_match(self, classifier: str, query: str) -> Optional[TokenMatch]:
+        """Last token match of the longest cached query this one extends."""
+        for length in range(len(query) - 1, 0, -1):
+            entry = self._get((classifier, query[:length]))
+            if entry is not None and entry.token_match is not None:
+                return entry.token_match
+        return None
+
+    def _record(self, outcome: str) -> None:
+        self.stats[outcome] += 1
+        if self.metrics is not None:
+            self.metrics.count(INLINE_CACHE_METRIC, (("outcome", outcome),))
+
+    def search(self, classifier: Classifier, query: str) -> List[int]:
+        """Store node ids of the classifier's leaves that best match the query."""
+        normalized_query = normalize_text(query).strip()
+        key = (classifier.name, normalized_query)
+        entry = self._get(key)
+        if entry is not None:
+            self._record(HIT)
+            return entry.leaves
+
+        previous = self._previous_match(classifier.name, normalized_query)
+        leaves, token_match = classifier.search_index.search_refining(normalized_query, previous=previous)
+        if not leaves:
+            # Misspelled or typed on the wrong keyboard layout, the closest leaves are better than nothing
+            leaves = classifier.fuzzy_index.search(query)
+            outcome = FUZZY
+        elif previous is not None and token_match is not None and token_match.token.startswith(previous.token):
+            outcome = REFINED
+        else:
+            outcome = MISS
+        self._put(key, leaves, token_match)
+        self._record(outcome)
+        return leaves
+
+    def hit_rate(self) -> float:
+        total = self.stats[HIT] + self.stats[REFINED] + self.stats[MISS] + self.stats[FUZZY]
+        return self.stats[HIT] / total if total else 0.0
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,231 @@
+"""
+Handler and Bot API latency metrics.
+
+Every registered handler is wrapped to record a latency histogram and an error count labelled
+with the handler name and the navigation level the chat ended up on. Outbound Bot API calls are
+timed per method by ``InstrumentedRequest``. Components count events (e.g. inline cache hits) in
+labelled counters. ``MetricsExporter`` serves the metrics in the
+Prometheus text format on ``/metrics`` and can log a JSON summary line every few seconds.
+"""
+import asyncio
+import bisect
+import functools
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram.ext import Application, CommandHandler
+from telegram.request import HTTPXRequest
+
+# Upper bounds in seconds, from a cached tree walk to a slow Bot API round-trip
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HANDLER_METRIC = "achi_handler_seconds"
+BOT_API_METRIC = "achi_bot_api_seconds"
+INLINE_CACHE_METRIC = "achi_inline_cache_total"
+HELP = {
+    HANDLER_METRIC: "Update handler latency by handler and navigation level",
+    BOT_API_METRIC: "Bot API request latency by method",
+    INLINE_CACHE_METRIC: "Inline queries by result cache outcome",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, fraction: float) -> float:
+        """Estimated by linear interpolation inside the bucket, like Prometheus' histogram_quantile."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {HANDLER_METRIC: {}, BOT_API_METRIC: {}}
+        self._counters: Dict[str, Dict[Labels, int]] = {INLINE_CACHE_METRIC: {}}
+
+    def observe(self, metric: str, labels: Labels, seconds: float, error: bool = False) -> None:
+        series = self._histograms[metric]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(seconds, error)
+
+    def count(self, metric: str, labels: Labels, amount: int = 1) -> None:
+        series = self._counters[metric]
+        series[labels] = series.get(labels, 0) + amount
+
+    def series(self, metric: str) -> Dict[Labels, Histogram]:
+        return self._histograms[metric]
+
+    def counters(self, metric: str) -> Dict[Labels, int]:
+        return self._counters[metric]
+
+    def instrument(self, name: str, callback: Callable[..., Awaitable[Any]],
+                   level: Callable[[Any], str]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(callback)
+        async def instrumented(update, context):
+            started = time.perf_counter()
+            error = False
+            try:
+                return await callback(update, context)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.observe(HANDLER_METRIC, (("handler", name), ("level", level(context))),
+                             time.perf_counter() - started, error)
+
+        return instrumented
+
+    def instrument_handlers(self, application: Application, level: Callable[[Any], str]) -> None:
+        """Wraps the callbacks of all handlers added so far."""
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, CommandHandler):
+                    name = "/" + "/".join(sorted(handler.commands))
+                else:
+                    name = handler.callback.__name__
+                handler.callback = self.instrument(name, handler.callback, level)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = [
+            "# HELP achi_uptime_seconds Seconds since the bot started",
+            "# TYPE achi_uptime_seconds gauge",
+            f"achi_uptime_seconds {time.monotonic() - self.started:.3f}",
+        ]
+        for metric, series in self._histograms.items():
+            errors_metric = metric.replace("_seconds", "_errors_total")
+            lines.append(f"# HELP {metric} {HELP[metric]}")
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{metric}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+            lines.append(f"# TYPE {errors_metric} counter")
+            for labels, histogram in series.items():
+                lines.append(f"{errors_metric}{_format_labels(labels)} {histogram.errors}")
+        for metric, series in self._counters.items():
+            lines.append(f"# HELP {metric} {HELP[metric]}")
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in series.items():
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, List[Dict[str, Any]]]:
+        summary = {
+            metric: [dict(labels, count=histogram.count, errors=histogram.errors,
+                          p50_ms=round(histogram.quantile(0.5) * 1000, 2),
+                          p99_ms=round(histogram.quantile(0.99) * 1000, 2))
+                     for labels, histogram in series.items()]
+            for metric, series in self._histograms.items()
+        }
+        for metric, series in self._counters.items():
+            summary[metric] = [dict(labels, count=value) for labels, value in series.items()]
+        return summary
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times every Bot API round-trip, failed requests count as errors."""
+
+    def __init__(self, metrics: Metrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        started = time.perf_counter()
+        status = None
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+            return status, payload
+        finally:
+            self.metrics.observe(BOT_API_METRIC, (("method", url.rsplit("/", 1)[-1]),),
+                                 time.perf_counter() - started, status is None or status >= 400)
+
+
+class MetricsExporter:
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: Optional[int] = None,
+                 log_interval: float = 0):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.log_interval = log_interval
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._log_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.port is not None:
+            self._server = await asyncio.start_server(self._serve, self.host, self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        if self.log_interval > 0:
+            self._log_task = asyncio.get_running_loop().create_task(self._log_periodically())
+
+    async def stop(self) -> None:
+        if self._log_task is not None:
+            self._log_task.cancel()
+            self._log_task = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _log_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.log_interval)
+            logging.info(f"metrics {json.dumps(self.metrics.summary(), ensure_ascii=False)}")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():  # headers are not needed
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.metrics.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,92 @@
+"""
+Navigation arrays precomputed from the classifier store.
+
+Chats only keep the key of the node they are looking at (see ``ClassifierStore.key``), which finds
+the same node in another version of the data. Everything needed to render a step (node by key,
+parent, depth, breadcrumb, child lookup by button label) is resolved here in constant time.
+"""
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from achi_store import ClassifierStore, NO_PARENT
+
+BREADCRUMB_SEPARATOR = " -> "
+
+
+class NavigationIndex:
+    def __init__(self, store: ClassifierStore):
+        self.store = store
+        self.root = store.root
+        node_count = store.node_count
+        self._parents = array("i", [NO_PARENT]) * node_count
+        self._depths = array("B", [0]) * node_count
+        self._child_counts = array("I", [0]) * node_count
+        self._leaf_parents = bytearray(node_count)
+        # Breadcrumbs and label lookups are only kept for nodes a chat can stand on, leaves are rendered in bulk
+        self._breadcrumbs: Dict[int, str] = {self.root: ""}
+        self._children_by_label: Dict[Tuple[int, str], int] = {}
+        self._nodes_by_key: Dict[int, int] = {}
+
+        for node_id in range(node_count):
+            if store.is_leaf(node_id):
+                self._leaf_parents[store.parent(node_id)] = 1
+                continue
+            parent = store.parent(node_id)
+            self._parents[node_id] = parent
+            self._depths[node_id] = store.depth(node_id)
+            self._child_counts[node_id] = store.child_count_of(node_id)
+            self._nodes_by_key[store.key(node_id)] = node_id
+            if parent != NO_PARENT:
+                name = store.name_ua(node_id)
+                # Parents precede their children in breadth-first order, so the parent breadcrumb is ready
+                parent_breadcrumb = self._breadcrumbs[parent]
+                self._breadcrumbs[node_id] = f"{parent_breadcrumb}{BREADCRUMB_SEPARATOR}{name}" \
+                    if parent_breadcrumb else name
+                self._children_by_label.setdefault((parent, name), node_id)
+
+    def contains(self, node_id: int) -> bool:
+        return 0 <= node_id < len(self._parents)
+
+    def parent(self, node_id: int) -> int:
+        return self._parents[node_id]
+
+    def depth(self, node_id: int) -> int:
+        return self._depths[node_id]
+
+    def child_count(self, node_id: int) -> int:
+        return self._child_counts[node_id]
+
+    def has_leaf_children(self, node_id: int) -> bool:
+        return bool(self._leaf_parents[node_id])
+
+    def breadcrumbs(self, node_id: int) -> str:
+        return self._breadcrumbs[node_id]
+
+    def children(self, node_id: int) -> List[int]:
+        return self.store.children(node_id)
+
+    def child_labels(self, node_id: int) -> List[str]:
+        return self.store.child_names(node_id)
+
+    def child_by_label(self, node_id: int, label: str) -> Optional[int]:
+        return self._children_by_label.get((node_id, label))
+
+    def skip_single_choices(self, node_id: int) -> int:
+        """Descends while there is only one category to pick, there is nothing to ask the user about."""
+        while self._child_counts[node_id] == 1 and not self._leaf_parents[node_id]:
+            node_id = self.store.children(node_id)[0]
+        return node_id
+
+    def back(self, node_id: int) -> int:
+        """Parent of the node, skipping ancestors that would immediately forward back down."""
+        node_id = self._parents[node_id] if node_id != self.root else self.root
+        while node_id != self.root and self._child_counts[node_id] == 1:
+            node_id = self._parents[node_id]
+        return node_id
+
+    def key(self, node_id: int) -> int:
+        return self.store.key(node_id)
+
+    def node_by_key(self, key: int) -> Optional[int]:
+        """The category with the key, None when it's gone from this version of the tree."""
+        return self._nodes_by_key.get(key)
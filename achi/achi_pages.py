@@ -0,0 +1,102 @@
+"""
+Leaf listings packed into as few messages as Telegram allows.
+
+Page boundaries for every block are computed once when the bot starts, a page is rendered from
+the store when a chat opens it or flips to it with the inline buttons.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import MessageLimit, ParseMode
+from telegram.helpers import escape_markdown
+
+from achi_navigation import NavigationIndex
+
+PAGE_CALLBACK_PREFIX = "page:"
+LEAF_SEPARATOR = "\n\n"
+# Reserved for the page counter line so that it never pushes a page over the limit
+FOOTER_RESERVE = 32
+# Labels carry Markdown characters (ACHI has categories named "_", МКХ-10 codes end with "*"), every
+# label and code in a message is escaped for MarkdownV2, which also escapes inside the bold code line
+PARSE_MODE = ParseMode.MARKDOWN_V2
+
+
+def escape(text: str) -> str:
+    return escape_markdown(text, version=2)
+
+
+def format_leaf(code: str, name_ua: str) -> str:
+    return f"*Код: {escape(code)}*\nНазва: {escape(name_ua)}"
+
+
+def page_callback_data(node_id: int, page: int, classifier: str = "", data_version: str = "") -> str:
+    data = f"{PAGE_CALLBACK_PREFIX}{node_id}:{page}:{classifier}"
+    return f"{data}:{data_version}" if data_version else data
+
+
+def parse_page_callback_data(data: str) -> Optional[Tuple[int, int, str, str]]:
+    """(node id, page, classifier, data version), older buttons have no classifier or data version."""
+    try:
+        node_id, page, *rest = data[len(PAGE_CALLBACK_PREFIX):].split(":")
+        if len(rest) > 2:
+            return None
+        classifier, data_version = (rest + ["", ""])[:2]
+        return int(node_id), int(page), classifier, data_version
+    except ValueError:
+        return None
+
+
+class LeafPages:
+    def __init__(self, navigation: NavigationIndex, message_limit: int = MessageLimit.MAX_TEXT_LENGTH,
+                 classifier: str = "", data_version: str = ""):
+        self._navigation = navigation
+        self._message_limit = message_limit
+        self._classifier = classifier
+        # Buttons carry the data version, node ids of a previous version point elsewhere after a reload
+        self._data_version = data_version
+        # leaf parent -> index of the first leaf on every page
+        self._page_starts: Dict[int, Tuple[int, ...]] = {}
+        store = navigation.store
+        for node_id in range(store.node_count):
+            if navigation.has_leaf_children(node_id):
+                leaf_lengths = [len(format_leaf(store.code(leaf), store.name_ua(leaf)))
+                                for leaf in store.children(node_id)]
+                self._page_starts[node_id] = self._split(len(escape(navigation.breadcrumbs(node_id))), leaf_lengths)
+
+    def _split(self, header_length: int, leaf_lengths: List[int]) -> Tuple[int, ...]:
+        budget = self._message_limit - FOOTER_RESERVE - header_length
+        page_starts = [0]
+        used = 0
+        for index, length in enumerate(leaf_lengths):
+            length += len(LEAF_SEPARATOR)
+            if used and used + length > budget:
+                page_starts.append(index)
+                used = 0
+            used += length
+        return tuple(page_starts)
+
+    def page_count(self, node_id: int) -> int:
+        return len(self._page_starts.get(node_id, ()))
+
+    def render(self, node_id: int, page: int) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        """Message text and navigation buttons of the page, ``page`` is clamped to the existing range."""
+        page_starts = self._page_starts[node_id]
+        page = max(0, min(page, len(page_starts) - 1))
+        leaves = self._navigation.children(node_id)
+        end = page_starts[page + 1] if page + 1 < len(page_starts) else len(leaves)
+
+        store = self._navigation.store
+        entries = [format_leaf(store.code(leaf), store.name_ua(leaf)) for leaf in leaves[page_starts[page]:end]]
+        text = escape(self._navigation.breadcrumbs(node_id)) + LEAF_SEPARATOR + LEAF_SEPARATOR.join(entries)
+        if len(page_starts) == 1:
+            return text, None
+
+        text += f"{LEAF_SEPARATOR}Сторінка {page + 1} з {len(page_starts)}"
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton(
+                "◀️", callback_data=page_callback_data(node_id, page - 1, self._classifier, self._data_version)))
+        if page + 1 < len(page_starts):
+            buttons.append(InlineKeyboardButton(
+                "▶️", callback_data=page_callback_data(node_id, page + 1, self._classifier, self._data_version)))
+        return text, InlineKeyboardMarkup([buttons])
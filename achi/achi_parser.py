@@ -1,15 +1,32 @@
 import csv
-import dataclasses
 import json
+import os
+import sys
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Iterable, Iterator, Optional
 
+import achi_store
+import achi_text
+from achi_store import write_store
 
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            return dataclasses.asdict(o)
-        return super().default(o)
+# Shared ingestion helpers live in the repository root package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ingest import json_stream, pipeline, sqlite_export  # noqa: E402
+from ingest.manifest import PARTIAL, SKIP, Manifest, class_digests, file_digest, source_digest, \
+    splice_classes  # noqa: E402
+
+CSV_PATH = 'ACHI UKR-ENG.csv'
+JSON_PATH = 'data/achi.json'
+STORE_PATH = 'data/achi.bin'
+SQLITE_PATH = 'data/achi.sqlite'
+# Served by the bot from the same store when present, see mkh10/mkh10_parser.py
+MKH10_JSON_PATH = '../mkh10/data/mkh10.json'
+MANIFEST_PATH = 'ingest-manifest.json'
+MANIFEST_TARGET = 'achi'
+# Class, axis and block names repeat on every row of their subtree
+NAME_CACHE_SIZE = 65536
 
 
 @dataclass
@@ -85,38 +102,155 @@ class DataTree:
                                             lvl_four_name_en)
 
 
-def parse_achi_file() -> DataTree:
-    tree = DataTree({})
-    with open('ACHI UKR-ENG.csv', 'r') as csv_file:
+def read_achi_rows(csv_path: str = CSV_PATH) -> Iterator[List[str]]:
+    with open(csv_path, 'r') as csv_file:
         reader = csv.reader(csv_file, delimiter=';', )
         next(reader)
         next(reader)
+        yield from reader
+
+
+def parse_achi_file(csv_path: str = CSV_PATH, workers: Optional[int] = None) -> DataTree:
+    """Parses the CSV with a process pool, see ingest/pipeline.py."""
+    return pipeline.build_file(csv_path, parse_achi_rows, merge_achi_trees, workers, skip_lines=2,
+                               pack=pack_achi_tree, unpack=unpack_achi_tree)
+
 
-        for row in reader:
-            lvl_zero_clazz = row[0].strip()
-            lvl_zero_name_ua = row[1].strip().capitalize()
-            lvl_one_code = row[2].strip()
-            lvl_one_name_ua = row[3].strip().capitalize()
-            lvl_two_code = row[4].strip()
-            lvl_two_name_ua = row[5].strip().capitalize()
-            lvl_three_code = row[6].strip()
-            lvl_three_name_ua = row[7].strip().capitalize()
-            lvl_four_code = row[8].strip()
-            lvl_four_name_ua = row[9].strip().capitalize()
-            lvl_four_name_en = row[10].strip().capitalize()
-            tree.add(lvl_zero_clazz, lvl_zero_name_ua, lvl_one_code, lvl_one_name_ua, lvl_two_code, lvl_two_name_ua,
-                     lvl_three_code, lvl_three_name_ua, lvl_four_code, lvl_four_name_ua, lvl_four_name_en)
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_name(text: str) -> str:
+    return text.strip().capitalize()
+
+
+def parse_achi_rows(rows: Iterable[List[str]]) -> DataTree:
+    tree = DataTree({})
+    for row in rows:
+        lvl_zero_clazz = row[0].strip()
+        lvl_zero_name_ua = normalize_name(row[1])
+        lvl_one_code = row[2].strip()
+        lvl_one_name_ua = normalize_name(row[3])
+        lvl_two_code = row[4].strip()
+        lvl_two_name_ua = normalize_name(row[5])
+        lvl_three_code = row[6].strip()
+        lvl_three_name_ua = normalize_name(row[7])
+        lvl_four_code = row[8].strip()
+        lvl_four_name_ua = row[9].strip().capitalize()
+        lvl_four_name_en = row[10].strip().capitalize()
+        tree.add(lvl_zero_clazz, lvl_zero_name_ua, lvl_one_code, lvl_one_name_ua, lvl_two_code, lvl_two_name_ua,
+                 lvl_three_code, lvl_three_name_ua, lvl_four_code, lvl_four_name_ua, lvl_four_name_en)
 
     return tree
 
 
-def write_data_to_json_file(tree: DataTree) -> None:
-    json_object = json.dumps(tree, indent=4, ensure_ascii=False, cls=EnhancedJSONEncoder)
+def merge_achi_trees(tree: DataTree, later: DataTree) -> DataTree:
+    """Adds a tree built from later rows, nodes keep the code of their first row like in ``add``."""
+    def merge_children(children: Dict, later_children: Dict) -> None:
+        for name_ua, node in later_children.items():
+            existing = children.setdefault(name_ua, node)
+            if existing is node:
+                continue
+            if isinstance(node.children, list):
+                existing.children.extend(node.children)
+            else:
+                merge_children(existing.children, node.children)
 
-    with open("data/achi.json", "w") as outfile:
-        outfile.write(json_object)
+    merge_children(tree.children, later.children)
+    return tree
 
 
-if __name__ == '__main__':
-    data_tree = parse_achi_file()
+# Node classes by depth, the children of the last one are RecordLevelFour leaves
+LEVELS = (RecordLevelZero, RecordLevelOne, RecordLevelTwo, RecordLevelThree)
+
+
+def pack_achi_tree(tree: DataTree) -> tuple:
+    """The tree as nested (code, name_ua, children) tuples for the ingestion pipeline."""
+    def pack(children, level: int) -> tuple:
+        if level == len(LEVELS):
+            return tuple((leaf.code, leaf.name_ua, leaf.name_en) for leaf in children)
+        return tuple((node.clazz if level == 0 else node.code, node.name_ua, pack(node.children, level + 1))
+                     for node in children.values())
+
+    return pack(tree.children, 0)
+
+
+def unpack_achi_tree(packed: tuple) -> DataTree:
+    def unpack(children: tuple, level: int):
+        if level == len(LEVELS):
+            return [RecordLevelFour(*leaf) for leaf in children]
+        return {name_ua: LEVELS[level](code, name_ua, unpack(grandchildren, level + 1))
+                for code, name_ua, grandchildren in children}
+
+    return DataTree(unpack(packed, 0))
+
+
+def write_data_to_json_file(tree: DataTree, indent: Optional[int] = 4) -> None:
+    # Streamed straight from the dataclasses, indent=None writes the compact form
+    with open(JSON_PATH, "w") as outfile:
+        json_stream.dump(tree, outfile, indent=indent)
+
+
+def rebuild_changed_classes(changed_classes: Iterable[str], class_order: Iterable[str]) -> DataTree:
+    """Re-parses only the rows of changed classes and splices them into the existing data/achi.json."""
+    changed_classes = set(changed_classes)
+    rebuilt = parse_achi_rows(row for row in read_achi_rows() if row[0].strip() in changed_classes)
+    with open(JSON_PATH, "r") as existing_file:
+        existing = json.load(existing_file, object_pairs_hook=OrderedDict)
+    return DataTree(splice_classes(existing["children"], rebuilt.children, class_order, changed_classes))
+
+
+def classifier_trees(tree) -> "OrderedDict[str, object]":
+    trees = OrderedDict(achi=tree)
+    if os.path.exists(MKH10_JSON_PATH):
+        with open(MKH10_JSON_PATH, "r", encoding="utf-8") as mkh10_file:
+            trees["mkh10"] = json.load(mkh10_file, object_pairs_hook=OrderedDict)
+    return trees
+
+
+def write_sqlite_export(trees) -> None:
+    # Generated on demand and not committed, it's exported again whenever the store changes
+    sqlite_export.write_database(trees, SQLITE_PATH, source=file_digest(STORE_PATH))
+
+
+def write_classifiers_store(tree: DataTree) -> None:
+    trees = classifier_trees(tree)
+    write_store(trees, STORE_PATH)
+    write_sqlite_export(trees)
+
+
+def export_sqlite_if_stale() -> None:
+    """Exports the SQLite database of the current store when it's missing or was exported from another one."""
+    if sqlite_export.database_source(SQLITE_PATH) == file_digest(STORE_PATH):
+        return
+    print(f"Exporting {SQLITE_PATH}...")
+    with open(JSON_PATH, "r", encoding="utf-8") as json_file:
+        write_sqlite_export(classifier_trees(json.load(json_file, object_pairs_hook=OrderedDict)))
+
+
+def regenerate(force: bool = False, workers: Optional[int] = None) -> None:
+    manifest = Manifest.load(MANIFEST_PATH)
+    inputs = {CSV_PATH: file_digest(CSV_PATH)}
+    if os.path.exists(MKH10_JSON_PATH):
+        # A new MKH10 edition alone re-parses no ACHI classes, only the store is rewritten
+        inputs[MKH10_JSON_PATH] = file_digest(MKH10_JSON_PATH)
+    # Any change to how rows are normalized or serialized invalidates the outputs
+    rules = source_digest(sys.modules[__name__], json_stream, pipeline, achi_store, achi_text, sqlite_export)
+    classes = class_digests(read_achi_rows())
+    outputs = [JSON_PATH, STORE_PATH]
+
+    plan = manifest.plan(MANIFEST_TARGET, inputs, rules, classes, outputs, force)
+    if plan.mode == SKIP:
+        print(f"{CSV_PATH} is unchanged, skipping")
+        export_sqlite_if_stale()
+        return
+    if plan.mode == PARTIAL:
+        print(f"Rebuilding {len(plan.changed_classes)} of {len(classes)} classes")
+        data_tree = rebuild_changed_classes(plan.changed_classes, classes)
+    else:
+        data_tree = parse_achi_file(workers=workers)
     write_data_to_json_file(data_tree)
+    write_classifiers_store(data_tree)
+    manifest.record(MANIFEST_TARGET, inputs, rules, classes, outputs)
+    manifest.save()
+
+
+if __name__ == '__main__':
+    regenerate(force='--force' in sys.argv, workers=pipeline.workers_option(sys.argv))
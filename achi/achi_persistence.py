@@ -0,0 +1,184 @@
+"""
+Chat navigation state persisted in a local SQLite database.
+
+Only ``chat_data`` is stored, one JSON row per chat. Nothing is read at startup: a chat's row is
+loaded the first time the chat sends an update after a restart (``refresh_chat_data``). Writes
+never touch the disk on the update path: the application hands over changed chats every
+``update_interval`` seconds, they are collected and written behind in a single transaction on
+a dedicated thread. A batch that fails is retried every ``RETRY_INTERVAL`` seconds on its own,
+``write_pending`` (called once the application stops) and ``flush`` on shutdown write whatever is
+left.
+
+The chats loaded since the start are remembered up to ``MAX_LOADED_CHATS``. A chat that was
+forgotten is read again on its next update, which only fills keys its ``chat_data`` doesn't have.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+# Changes of the last few seconds are what a redeploy can lose, the write itself is off the hot path
+UPDATE_INTERVAL = 5
+RETRY_INTERVAL = 5
+MAX_LOADED_CHATS = 100_000
+SCHEMA = "CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+DROPPED = None
+
+
+class SqlitePersistence(BasePersistence[Dict, Dict, Dict]):
+    def __init__(self, path: str, update_interval: float = UPDATE_INTERVAL):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False,
+                                                     callback_data=False),
+                         update_interval=update_interval)
+        self.path = path
+        # One thread owns the connection, so batches are written in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-persistence")
+        self._connection: Optional[sqlite3.Connection] = None
+        # Least recently seen first
+        self._loaded_chats: "OrderedDict[int, None]" = OrderedDict()
+        self._pending: Dict[int, Optional[str]] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self._retry_now = asyncio.Event()
+        self._stopping = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(SCHEMA)
+            self._connection.commit()
+        return self._connection
+
+    async def _run(self, function, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _read_chat(self, chat_id: int) -> Optional[Dict]:
+        row = self._connect().execute("SELECT data FROM chat_data WHERE chat_id = ?", (chat_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _write_batch(self, batch: Dict[int, Optional[str]]) -> None:
+        connection = self._connect()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO chat_data (chat_id, data) VALUES (?, ?)",
+                                   [(chat_id, data) for chat_id, data in batch.items() if data is not DROPPED])
+            connection.executemany("DELETE FROM chat_data WHERE chat_id = ?",
+                                   [(chat_id,) for chat_id, data in batch.items() if data is DROPPED])
+
+    def _mark_loaded(self, chat_id: int) -> None:
+        self._loaded_chats[chat_id] = None
+        self._loaded_chats.move_to_end(chat_id)
+        if len(self._loaded_chats) > MAX_LOADED_CHATS:
+            self._loaded_chats.popitem(last=False)
+
+    def _schedule_write(self) -> None:
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_behind())
+
+    async def _write_behind(self) -> None:
+        # Chats handed over while a batch is being written go into the next one
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await self._run(self._write_batch, batch)
+            except sqlite3.Error:
+                logging.exception(f"Failed to persist state of {len(batch)} chats")
+                for chat_id, data in batch.items():
+                    self._pending.setdefault(chat_id, data)
+                if self._stopping:
+                    return
+                # Retried without waiting for another update to hand over changes
+                try:
+                    await asyncio.wait_for(self._retry_now.wait(), RETRY_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        await self._run(self._connect)
+        return {}
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        loaded = chat_id in self._loaded_chats
+        self._mark_loaded(chat_id)
+        # State in memory or waiting to be written is newer than the row
+        if loaded or chat_data or chat_id in self._pending:
+            return
+        try:
+            stored = await self._run(self._read_chat, chat_id)
+        except sqlite3.Error:
+            logging.exception(f"Failed to load state of chat {chat_id}, starting over")
+            return
+        for key, value in (stored or {}).items():
+            chat_data.setdefault(key, value)
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        self._mark_loaded(chat_id)
+        self._pending[chat_id] = json.dumps(data)
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._mark_loaded(chat_id)
+        self._pending[chat_id] = DROPPED
+        self._schedule_write()
+
+    async def write_pending(self) -> None:
+        """Writes every chat handed over so far, a failed batch is tried again right away and then given up on."""
+        self._stopping = True
+        self._retry_now.set()
+        if self._writer is not None:
+            await self._writer
+        if self._pending:
+            await self._write_behind()
+        if self._pending:
+            logging.error(f"State of {len(self._pending)} chats was not saved")
+
+    async def flush(self) -> None:
+        await self.write_pending()
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
+
+    # Only chat_data is stored, the rest of the interface is a no-op
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state: Optional[object]) -> None:
+        pass
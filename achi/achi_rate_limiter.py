@@ -0,0 +1,118 @@
+"""
+Rate limiter for outgoing Bot API requests.
+
+Telegram allows about 30 messages per second for the whole bot, about one message per second in
+a private chat (short bursts are fine) and 20 messages per minute in a group. Requests are queued
+per chat in FIFO order and then in a global queue, so a burst in one chat can't exceed the chat
+limit or starve the others.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, Optional, Union
+
+from telegram.constants import FloodLimit
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Only requests that produce or change messages count towards the per-chat limits
+CHAT_LIMITED_ENDPOINT_PREFIXES = ("send", "edit", "copyMessage", "forwardMessage")
+MAX_IDLE_BUCKETS = 1024
+
+
+class TokenBucket:
+    def __init__(self, max_rate: float, time_period: float, burst: Optional[float] = None):
+        self.capacity = burst if burst is not None else max_rate
+        self.refill_rate = max_rate / time_period
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # waiters are woken up in FIFO order
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self._tokens >= self.capacity and not self._lock.locked()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.refill_rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class ChatRateLimiter(BaseRateLimiter[int]):
+    def __init__(self,
+                 overall_max_rate: float = FloodLimit.MESSAGES_PER_SECOND,
+                 chat_max_rate: float = FloodLimit.MESSAGES_PER_SECOND_PER_CHAT,
+                 chat_burst: float = 3,
+                 group_max_rate: float = FloodLimit.MESSAGES_PER_MINUTE_PER_GROUP,
+                 group_time_period: float = 60,
+                 max_retries: int = 2):
+        self._overall_bucket = TokenBucket(overall_max_rate, 1)
+        self._chat_max_rate = chat_max_rate
+        self._chat_burst = chat_burst
+        self._group_max_rate = group_max_rate
+        self._group_time_period = group_time_period
+        self._chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        self._max_retries = max_retries
+        self._retry_after_event = asyncio.Event()
+        self._retry_after_event.set()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_IDLE_BUCKETS:
+                # A full bucket carries no state, recreating it later is equivalent
+                for key, idle_bucket in list(self._chat_buckets.items()):
+                    if idle_bucket.is_full():
+                        del self._chat_buckets[key]
+            # Negative ids and @usernames are groups and channels
+            if isinstance(chat_id, str) or chat_id < 0:
+                bucket = TokenBucket(self._group_max_rate, self._group_time_period)
+            else:
+                bucket = TokenBucket(self._chat_max_rate, 1, self._chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def process_request(self,
+                              callback: Callable[..., Coroutine[Any, Any, Any]],
+                              args: Any,
+                              kwargs: Dict[str, Any],
+                              endpoint: str,
+                              data: Dict[str, Any],
+                              rate_limit_args: Optional[int]) -> Any:
+        max_retries = rate_limit_args if rate_limit_args is not None else self._max_retries
+        chat_id = data.get("chat_id")
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+        chat_limited = chat_id is not None and endpoint.startswith(CHAT_LIMITED_ENDPOINT_PREFIXES)
+
+        for attempt in range(max_retries + 1):
+            if chat_limited:
+                await self._chat_bucket(chat_id).acquire()
+                await self._overall_bucket.acquire()
+            await self._retry_after_event.wait()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == max_retries:
+                    raise e
+                delay = e.retry_after if isinstance(e.retry_after, (int, float)) else e.retry_after.total_seconds()
+                logging.info(f"Flood limit hit on {endpoint}, retrying in {delay} s")
+                # Telegram asks to pause the whole bot, not just this chat
+                self._retry_after_event.clear()
+                await asyncio.sleep(delay + 0.1)
+                self._retry_after_event.set()
@@ -0,0 +1,187 @@
+"""
+Hot reload of the classifier data.
+
+``DataReloader`` polls the store file and, when it has been replaced, opens the new file and
+builds the indexes of every classifier in a worker thread while the bot keeps serving the
+current version. A version that fails to open or validate is logged and skipped until the file
+changes again. A valid one is swapped into ``bot_data`` in a single assignment on the event loop:
+updates handled from then on see the new version, the ones already running finish on theirs.
+
+Node ids only mean something within the version they come from, so chats keep the key of their
+node instead, a hash of its path of codes (see ``ClassifierStore.key``). It finds the same
+category in the new version, a chat whose category is gone starts over from the root.
+
+Every handler holds the version that was current when it started. Once a replaced version has no
+handlers left its mapping is closed and its indexes are collected. No more than two versions are
+in memory at a time: a newer file waits until the previous version has been released.
+"""
+import asyncio
+import functools
+import gc
+import logging
+import os
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram.ext import Application
+
+from achi_classifiers import Classifiers
+from achi_store import StoreFile
+
+RELOAD_INTERVAL = 30.0
+# A store that lost more than this share of a classifier's nodes is taken for a broken export
+MAX_SHRINK = 0.5
+LOADED = "loaded"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+FileKey = Tuple[int, int, int]
+
+
+def file_key(path: str) -> Optional[FileKey]:
+    """Changes whenever the file is replaced or rewritten, None while it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def validate(classifiers: Classifiers, previous: Optional[Classifiers] = None) -> None:
+    """Raises ValueError for data the bot shouldn't switch to."""
+    for classifier in classifiers:
+        store = classifier.store
+        if not store.child_count_of(store.root):
+            raise ValueError(f"Classifier {classifier.name} is empty")
+        if previous is not None and classifier.name in previous:
+            previous_count = previous.get(classifier.name).store.node_count
+            if store.node_count < previous_count * (1 - MAX_SHRINK):
+                raise ValueError(f"Classifier {classifier.name} shrank from {previous_count} "
+                                 f"to {store.node_count} nodes")
+    if not classifiers.default.navigation.child_labels(classifiers.default.navigation.root):
+        raise ValueError("The default classifier has nothing to choose from")
+
+
+class DataVersion:
+    """Classifiers of one store file and the number of handlers running on them."""
+
+    def __init__(self, classifiers: Classifiers):
+        self.classifiers: Optional[Classifiers] = classifiers
+        self.handlers = 0
+        self.replaced = False
+
+
+class DataReloader:
+    def __init__(self, path: str, titles: Dict[str, str], interval: float = RELOAD_INTERVAL):
+        self.path = path
+        self.titles = titles
+        self.interval = interval
+        self.stats: Counter = Counter()
+        self.current: Optional[DataVersion] = None
+        self.previous: Optional[DataVersion] = None
+        self._application: Optional[Application] = None
+        # Taken now, a file replaced between startup and the first poll is still picked up
+        self._file_key = file_key(path)
+        self._poll_task: Optional[asyncio.Task] = None
+
+    def attach(self, application: Application) -> None:
+        """Serves the classifiers already in ``bot_data`` and wraps the callbacks of all handlers added so far."""
+        self._application = application
+        self.current = DataVersion(application.bot_data["classifiers"])
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                handler.callback = self._hold_version(handler.callback)
+
+    def _hold_version(self, callback: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(callback)
+        async def holding_version(update, context):
+            version = self.current
+            version.handlers += 1
+            try:
+                return await callback(update, context)
+            finally:
+                version.handlers -= 1
+                if version.replaced and not version.handlers:
+                    self._release(version)
+
+        return holding_version
+
+    async def start(self) -> None:
+        if self.interval > 0:
+            self._poll_task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logging.exception("Data reload check failed")
+
+    async def check(self) -> bool:
+        """Swaps in the data file if it has changed since the last check, returns whether it did."""
+        if self.previous is not None:
+            return False
+        key = file_key(self.path)
+        if key is None or key == self._file_key:
+            return False
+        # A broken file isn't retried until it changes again
+        self._file_key = key
+        try:
+            classifiers = await asyncio.get_running_loop().run_in_executor(None, self._build)
+        except Exception:
+            self.stats[FAILED] += 1
+            logging.exception(f"Data reload from {self.path} failed, still serving {self.data_version}")
+            return False
+        if classifiers.data_version == self.data_version:
+            # Rewritten with the same content, the ids chats hold stay valid
+            classifiers.store_file.close()
+            self.stats[UNCHANGED] += 1
+            return False
+        self._swap(classifiers)
+        return True
+
+    @property
+    def data_version(self) -> str:
+        return self.current.classifiers.data_version
+
+    def _build(self) -> Classifiers:
+        store_file = StoreFile.open(self.path)
+        try:
+            classifiers = Classifiers(store_file, self.titles)
+            validate(classifiers, self.current.classifiers)
+        except Exception:
+            store_file.close()
+            raise
+        return classifiers
+
+    def _swap(self, classifiers: Classifiers) -> None:
+        bot_data = self._application.bot_data
+        previous = self.current
+        self.current = DataVersion(classifiers)
+        bot_data["classifiers"] = classifiers
+        inline_cache = bot_data.get("inline_cache")
+        if inline_cache is not None:
+            # Cached results are leaf ids of the previous version
+            inline_cache.clear()
+        self.stats[LOADED] += 1
+        logging.info(f"Data reloaded from {self.path}: {previous.classifiers.data_version} -> {self.data_version}")
+        previous.replaced = True
+        self.previous = previous
+        if not previous.handlers:
+            self._release(previous)
+
+    def _release(self, version: DataVersion) -> None:
+        classifiers, version.classifiers = version.classifiers, None
+        classifiers.store_file.close()
+        if self.previous is version:
+            self.previous = None
+        logging.info(f"Released data version {classifiers.data_version}")
+        del classifiers
+        # Memoized index methods are reference cycles, collect them now rather than on the collector's schedule
+        gc.collect()
@@ -0,0 +1,153 @@
+"""
+Inverted index over classifier leaves for inline search.
+
+Every leaf (code, name_ua, name_en) is tokenized once when the store is built, see ``achi_store.py``.
+Tokens are kept in a sorted vocabulary with leaf postings, so a query token resolves to its matching
+vocabulary range with a binary search. Character trigrams of the vocabulary point back to tokens and
+cover queries that hit the middle of a word. The index is read from the mapped store file: opening
+it costs nothing and the bot only decodes the entries a query touches.
+
+Queries arrive on every keystroke. ``search_refining`` returns the vocabulary tokens the last query
+token matched: a token typed further can only match a subset of them, so the next keystroke
+filters those instead of looking the token up in the whole vocabulary again.
+"""
+import heapq
+from array import array
+from functools import lru_cache
+from collections import Counter
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from achi_store import SHORT_PREFIX_LENGTH, ClassifierStore, SearchSection, StringColumn
+from achi_text import normalize_code, normalize_text, tokenize, trigrams
+
+MAX_RESULTS = 50
+# Query tokens repeat from one keystroke to the next, their matches are memoized per index
+MATCH_CACHE_SIZE = 4096
+
+
+def _prefix_range(sorted_values: StringColumn, prefix: str) -> Tuple[int, int]:
+    start = sorted_values.bisect_left(prefix)
+    # U+10FFFF sorts after every character that can follow the prefix
+    end = sorted_values.bisect_left(prefix + "\U0010ffff", start)
+    return start, end
+
+
+@dataclass(frozen=True)
+class TokenMatch:
+    token: str
+    token_ids: FrozenSet[int]
+
+
+class SearchIndex:
+    def __init__(self, section: SearchSection):
+        # leaf ordinal -> store node id, every result goes through it so it's copied out of the file
+        self.leaves = array("I", section.leaves[:])
+        self._codes = section.codes
+        self._names = section.names
+        self._tokens = section.tokens
+        self._vocabulary = section.tokens.keys
+        self._token_trigrams = section.trigrams
+        self._short_prefixes = section.short_prefixes
+        self._match_token = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._match_token)
+
+    @classmethod
+    def from_store(cls, store: ClassifierStore) -> "SearchIndex":
+        return cls(store.search_section())
+
+    def _matching_leaves(self, query_token: str) -> frozenset:
+        return self._match_token(query_token)[1]
+
+    def _match_token(self, query_token: str) -> Tuple[Optional[FrozenSet[int]], frozenset]:
+        """(vocabulary ids, leaf ordinals) the query token matches, short tokens only have leaves."""
+        if len(query_token) <= SHORT_PREFIX_LENGTH:
+            return None, frozenset(self._short_prefixes.get(query_token))
+        token_ids = frozenset(self._matching_tokens(query_token))
+        return token_ids, self._leaves_of(token_ids)
+
+    def _leaves_of(self, token_ids: Iterable[int]) -> frozenset:
+        matched_leaves: Set[int] = set()
+        for token_id in token_ids:
+            matched_leaves.update(self._tokens.values(token_id))
+        return frozenset(matched_leaves)
+
+    def _last_token_leaves(self, query_token: str,
+                           previous: Optional[TokenMatch]) -> Tuple[frozenset, Optional[TokenMatch]]:
+        if previous is not None and len(query_token) > SHORT_PREFIX_LENGTH and query_token.startswith(previous.token):
+            # Every token containing the longer query token contains the shorter one
+            token_ids = frozenset(token_id for token_id in previous.token_ids
+                                  if query_token in self._vocabulary[token_id])
+            return self._leaves_of(token_ids), TokenMatch(query_token, token_ids)
+        token_ids, leaves = self._match_token(query_token)
+        return leaves, TokenMatch(query_token, token_ids) if token_ids is not None else None
+
+    def _matching_tokens(self, query_token: str) -> Iterable[int]:
+        """Vocabulary ids of tokens that start with or contain the query token."""
+        start, end = _prefix_range(self._vocabulary, query_token)
+        matched = set(range(start, end))
+        query_trigrams = trigrams(query_token)
+        if query_trigrams:
+            candidates = None
+            for trigram in query_trigrams:
+                token_ids = self._token_trigrams.get(trigram)
+                if not token_ids:
+                    return matched
+                candidates = set(token_ids) if candidates is None else candidates.intersection(token_ids)
+            matched.update(token_id for token_id in candidates if query_token in self._vocabulary[token_id])
+        return matched
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> List[int]:
+        """Returns store node ids of the best matching leaves.
+
+        Exact code matches come first, then leaves whose code or name starts with the query,
+        then the remaining leaves ordered by the number of matched query tokens.
+        """
+        return self.search_refining(query, limit)[0]
+
+    def search_refining(self, query: str, limit: int = MAX_RESULTS,
+                        previous: Optional[TokenMatch] = None) -> Tuple[List[int], Optional[TokenMatch]]:
+        """Same as ``search``, refining the last token's match of a query this one extends.
+
+        Also returns the match of this query's last token for the next keystroke, if it was needed.
+        """
+        normalized_query = normalize_text(query).strip()
+        if not normalized_query:
+            return [], None
+
+        ranked: List[int] = []
+        prefix_matches: Set[int] = set()
+        code = normalize_code(normalized_query)
+        # A query of separators only ("." or "-") has no code, its empty prefix would match every code
+        if code:
+            start, end = _prefix_range(self._codes.keys, code)
+            exact_end = self._codes.keys.bisect_right(code, start, end)
+            ranked.extend(sorted(self._codes.values(start, exact_end)))
+            prefix_matches.update(self._codes.values(exact_end, end))
+        seen = set(ranked)
+
+        start, end = _prefix_range(self._names.keys, normalized_query)
+        prefix_matches.update(self._names.values(start, end))
+        prefix_matches.difference_update(seen)
+        ranked.extend(heapq.nsmallest(limit - len(ranked), prefix_matches))
+        seen.update(prefix_matches)
+
+        last_match = None
+        query_tokens = tokenize(normalized_query)
+        if len(ranked) < limit and query_tokens:
+            last_leaves, last_match = self._last_token_leaves(query_tokens[-1], previous)
+            token_matches = sorted([self._matching_leaves(token) for token in set(query_tokens[:-1])
+                                    if token != query_tokens[-1]] + [last_leaves], key=len)
+            # Leaves matching every token are enough to fill the page most of the time, which skips the counting
+            full_overlap = token_matches[0].intersection(*token_matches[1:]).difference(seen)
+            if len(token_matches) == 1 or len(full_overlap) >= limit - len(ranked):
+                ranked.extend(heapq.nsmallest(limit - len(ranked), full_overlap))
+            else:
+                overlap: Counter = Counter()
+                for matched_leaves in token_matches:
+                    overlap.update(matched_leaves)
+                for ordinal in seen.intersection(overlap):
+                    del overlap[ordinal]
+                best = heapq.nsmallest(limit - len(ranked), overlap.items(), key=lambda item: (-item[1], item[0]))
+                ranked.extend(ordinal for ordinal, _ in best)
+
+        return [self.leaves[ordinal] for ordinal in ranked[:limit]], last_match
@@ -0,0 +1,135 @@
+"""
+Queries over the SQLite export of the classifiers (see ingest/sqlite_export.py).
+
+Opening the database reads nothing but its schema, so startup costs the same for any classifier
+size, and every query reads only the pages it needs: children come a page at a time, codes
+through the ``leaves`` index and text search through FTS5. Node ids are the ones of the export,
+``node.id - root_id`` of a classifier is the id of the node in the binary store.
+"""
+import sqlite3
+import sys
+from dataclasses import dataclass
+from typing import List, Optional
+
+from achi_codes import fold_code
+from achi_search import MAX_RESULTS, normalize_code, tokenize
+
+SCHEMA_VERSION = 1
+NODE_COLUMNS = ", ".join(f"nodes.{column}" for column in (
+    "id", "classifier", "parent_id", "position", "depth", "code", "name_ua", "name_en", "path", "is_leaf"))
+
+
+@dataclass(frozen=True)
+class Node:
+    id: int
+    classifier: str
+    parent_id: Optional[int]
+    position: int
+    depth: int
+    code: str
+    name_ua: str
+    name_en: str
+    path: str
+    is_leaf: bool
+
+    @property
+    def ancestor_ids(self) -> List[int]:
+        """Ids from the root down to the parent, read from the materialized path."""
+        return [int(node_id) for node_id in self.path.strip("/").split("/")[:-1]]
+
+
+def _node(row) -> Node:
+    return Node(*row[:9], bool(row[9]))
+
+
+def fts_query(text: str) -> str:
+    """All tokens must match, the last one may be incomplete."""
+    tokens = [f'"{token}"' for token in tokenize(text)]
+    if tokens:
+        tokens[-1] += "*"
+    return " ".join(tokens)
+
+
+class ClassifierDatabase:
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        version = connection.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if version is None or int(version[0]) != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported database version {version and version[0]}")
+        self.roots = dict(connection.execute("SELECT name, root_id FROM classifiers ORDER BY position"))
+
+    @classmethod
+    def open(cls, path: str) -> "ClassifierDatabase":
+        return cls(sqlite3.connect(f"file:{path}?mode=ro", uri=True))
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.roots)
+
+    def root(self, classifier: str) -> Node:
+        return self.node(self.roots[classifier])
+
+    def node(self, node_id: int) -> Optional[Node]:
+        row = self._connection.execute(f"SELECT {NODE_COLUMNS} FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        return None if row is None else _node(row)
+
+    def child_count(self, node_id: int) -> int:
+        return self._connection.execute("SELECT count(*) FROM nodes WHERE parent_id = ?", (node_id,)).fetchone()[0]
+
+    def children(self, node_id: int, offset: int = 0, limit: int = -1) -> List[Node]:
+        """Children in source order, ``offset`` and ``limit`` read one page of them."""
+        rows = self._connection.execute(
+            f"SELECT {NODE_COLUMNS} FROM nodes WHERE parent_id = ? ORDER BY position LIMIT ? OFFSET ?",
+            (node_id, limit, offset))
+        return [_node(row) for row in rows]
+
+    def ancestors(self, node: Node) -> List[Node]:
+        """Nodes from the root down to the parent of the node."""
+        ids = node.ancestor_ids
+        if not ids:
+            return []
+        rows = self._connection.execute(
+            f"SELECT {NODE_COLUMNS} FROM nodes WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY depth", ids)
+        return [_node(row) for row in rows]
+
+    def lookup(self, code: str, classifier: Optional[str] = None) -> List[Node]:
+        """Leaves with the code, in every classifier unless one is given."""
+        key = normalize_code(fold_code(code))
+        query = f"SELECT {NODE_COLUMNS} FROM leaves JOIN nodes ON nodes.id = leaves.node_id WHERE code_key = ?"
+        parameters = [key]
+        if classifier is not None:
+            query += " AND leaves.classifier = ?"
+            parameters.append(classifier)
+        return [_node(row) for row in self._connection.execute(query + " ORDER BY nodes.id", parameters)]
+
+    def search(self, text: str, classifier: Optional[str] = None, limit: int = MAX_RESULTS) -> List[Node]:
+        """Leaves whose names match every token of the text, best matches first."""
+        match = fts_query(text)
+        if not match:
+            return []
+        query = (f"SELECT {NODE_COLUMNS} FROM leaves_fts JOIN nodes ON nodes.id = leaves_fts.rowid "
+                 "WHERE leaves_fts MATCH ?")
+        parameters: list = [match]
+        if classifier is not None:
+            query += " AND nodes.classifier = ?"
+            parameters.append(classifier)
+        query += " ORDER BY bm25(leaves_fts), nodes.id LIMIT ?"
+        parameters.append(limit)
+        return [_node(row) for row in self._connection.execute(query, parameters)]
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) != 3:
+        print(f"Usage: {argv[0]} <database.sqlite> <code or text>")
+        sys.exit(1)
+    database = ClassifierDatabase.open(argv[1])
+    for node in database.lookup(argv[2]) or database.search(argv[2]):
+        path = " / ".join(ancestor.name_ua for ancestor in database.ancestors(node)[1:])
+        print(f"{node.classifier} {node.code} {node.name_ua} ({path})")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,488 @@
+"""
+Compact binary classifier store.
+
+The store is a single little-endian file that is memory-mapped read-only by the bot, so
+opening it costs the same regardless of the classifier size and every replica on a host
+shares the pages through the page cache. One file holds any number of classifiers (ACHI,
+MKH10) that share a single string pool: labels repeated across levels and classifiers are
+stored once and have the same string id everywhere in the file.
+
+Layout:
+    header       HEADER, with a sha256 digest of everything after it
+    classifiers  CLASSIFIER * classifier_count, name and sections of every classifier
+    per classifier:
+      nodes      NODE * node_count, node ids are assigned in breadth-first order (root is 0)
+      children   u32 * child_count, child node ids, each node owns a contiguous slice
+      search     SEARCH, then u32 * leaf_count leaf node ids (a leaf's ordinal is its position)
+                 and the posting lists of the inline search index, see ``achi_search.py``:
+                 normalized code -> leaf ordinals, normalized name_ua -> leaf ordinals,
+                 token -> leaf ordinals, trigram -> token ids, short prefix -> leaf ordinals
+    strings      STRING * string_count, (offset, length) into the string pool
+    pool         utf-8 bytes of all distinct strings, string id 0 is the empty string
+
+A posting list section is u32 * key_count string ids of its keys in sorted order, u32 * (key_count + 1)
+start positions and u32 * value_count values: the values of key ``i`` are ``values[starts[i]:starts[i + 1]]``.
+The search index is built with the store, so the bot only decodes the entries a query touches.
+"""
+import dataclasses
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+from collections import deque
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from achi_text import node_fields, normalize_code, normalize_text, tokenize, trigrams
+
+MAGIC = b"ACHS"
+VERSION = 5
+
+# magic, version, flags, classifier_count, string_count, classifiers/strings/pool offsets, digest
+HEADER = struct.Struct("<4sHHIIIII32s")
+# name, node_count, child_count, nodes/children/search offsets
+CLASSIFIER = struct.Struct("<IIIIII")
+# parent, first_child, child_count, code, name_ua, name_en, depth, flags, key
+NODE = struct.Struct("<iIIIIIHHQ")
+# offset, length
+STRING = struct.Struct("<II")
+CHILD = struct.Struct("<I")
+U32 = struct.Struct("<I")
+RANGE = struct.Struct("<II")
+# leaf_count, then (key_count, value_count) of the code, name, token, trigram and short prefix posting lists
+SEARCH = struct.Struct("<11I")
+
+FLAG_LEAF = 1
+NO_PARENT = -1
+DIGEST_LENGTH = 12
+# Node keys are 48-bit hashes of the node's path of codes: unlike node ids they stay the same when
+# other parts of the tree change, so chats keep them across data versions
+NODE_KEY_BYTES = 6
+PATH_SEPARATOR = "/"
+# Prefixes this short match a large part of the vocabulary, their leaves are merged when the store is built
+SHORT_PREFIX_LENGTH = 2
+# Every this many keys of a posting list one is kept decoded, a binary search decodes at most this many from the file
+KEY_FENCE_STEP = 8
+
+
+def node_key(path: str) -> int:
+    """Key of the node at ``path``, the codes (names for nodes without one) from the first level down."""
+    return int.from_bytes(hashlib.blake2b(path.encode("utf-8"), digest_size=NODE_KEY_BYTES).digest(), "little")
+
+
+class _StringPool:
+    def __init__(self):
+        self.ids: Dict[str, int] = {"": 0}
+        self.index: List[Tuple[int, int]] = [(0, 0)]
+        self.data = bytearray()
+
+    def intern(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            encoded = value.encode("utf-8")
+            string_id = len(self.index)
+            self.ids[value] = string_id
+            self.index.append((len(self.data), len(encoded)))
+            self.data += encoded
+        return string_id
+
+
+def _build_nodes(tree, strings: _StringPool) -> Tuple[bytes, bytes, List[Tuple[int, str, str, str]]]:
+    nodes = bytearray()
+    children = bytearray()
+    leaves = []
+    node_count = 1
+    child_count = 0
+
+    keys = set()
+    queue = deque([(tree, NO_PARENT, 0, "")])
+    node_id = 0
+    while queue:
+        node, parent, depth, path = queue.popleft()
+        code, name_ua, name_en, node_children = node_fields(node)
+        key = node_key(path)
+        if key in keys:
+            raise ValueError(f"Node key of {path} collides with another node")
+        keys.add(key)
+        flags = FLAG_LEAF if node_children is None else 0
+        if flags & FLAG_LEAF:
+            leaves.append((node_id, code, name_ua, name_en))
+        node_children = node_children or []
+
+        first_child = child_count
+        sibling_labels: Dict[str, int] = {}
+        for child in node_children:
+            children += CHILD.pack(node_count)
+            child_code, child_name = node_fields(child)[:2]
+            label = child_code or child_name
+            # Siblings with the same code are told apart by their order
+            repeats = sibling_labels[label] = sibling_labels.get(label, 0) + 1
+            if repeats > 1:
+                label = f"{label}#{repeats}"
+            queue.append((child, node_id, depth + 1, f"{path}{PATH_SEPARATOR}{label}" if path else label))
+            node_count += 1
+            child_count += 1
+        nodes += NODE.pack(parent, first_child, len(node_children), strings.intern(code),
+                           strings.intern(name_ua), strings.intern(name_en), depth, flags, key)
+        node_id += 1
+    return bytes(nodes), bytes(children), leaves
+
+
+def _pack_postings(postings: Dict[str, List[int]], strings: _StringPool) -> Tuple[int, int, bytes]:
+    keys = sorted(postings)
+    starts = [0]
+    values = []
+    for key in keys:
+        values.extend(postings[key])
+        starts.append(len(values))
+    data = b"".join(struct.pack(f"<{len(items)}I", *items)
+                    for items in ([strings.intern(key) for key in keys], starts, values))
+    return len(keys), len(values), data
+
+
+def _build_search(leaves: List[Tuple[int, str, str, str]], strings: _StringPool) -> bytes:
+    code_postings: Dict[str, List[int]] = {}
+    name_postings: Dict[str, List[int]] = {}
+    token_postings: Dict[str, List[int]] = {}
+    # Labels repeat across leaves, each distinct one is tokenized once
+    label_tokens: Dict[str, List[str]] = {}
+    for ordinal, (_, code, name_ua, name_en) in enumerate(leaves):
+        code_postings.setdefault(normalize_code(code), []).append(ordinal)
+        name_postings.setdefault(normalize_text(name_ua), []).append(ordinal)
+        tokens = set()
+        for label in (name_ua, name_en):
+            if label not in label_tokens:
+                label_tokens[label] = tokenize(label)
+            tokens.update(label_tokens[label])
+        for token in tokens:
+            token_postings.setdefault(token, []).append(ordinal)
+
+    vocabulary = sorted(token_postings)
+    token_trigrams: Dict[str, List[int]] = {}
+    short_prefixes: Dict[str, set] = {}
+    for token_id, token in enumerate(vocabulary):
+        for trigram in trigrams(token):
+            token_trigrams.setdefault(trigram, []).append(token_id)
+        for length in range(1, min(len(token), SHORT_PREFIX_LENGTH) + 1):
+            short_prefixes.setdefault(token[:length], set()).update(token_postings[token])
+
+    counts = [len(leaves)]
+    sections = [struct.pack(f"<{len(leaves)}I", *(node_id for node_id, _, _, _ in leaves))]
+    for postings in (code_postings, name_postings, token_postings, token_trigrams,
+                     {prefix: sorted(ordinals) for prefix, ordinals in short_prefixes.items()}):
+        key_count, value_count, data = _pack_postings(postings, strings)
+        counts += [key_count, value_count]
+        sections.append(data)
+    return SEARCH.pack(*counts) + b"".join(sections)
+
+
+def build_store(trees: Dict[str, object]) -> bytes:
+    """Serializes classifier trees (``DataTree`` or the equivalent JSON dict) by name into the store format."""
+    strings = _StringPool()
+    sections = []
+    for name, tree in trees.items():
+        nodes, children, leaves = _build_nodes(tree, strings)
+        sections.append((strings.intern(name), nodes, children, _build_search(leaves, strings)))
+
+    classifiers_offset = HEADER.size
+    offset = classifiers_offset + CLASSIFIER.size * len(sections)
+    classifiers = bytearray()
+    for name, nodes, children, search in sections:
+        classifiers += CLASSIFIER.pack(name, len(nodes) // NODE.size, len(children) // CHILD.size,
+                                       offset, offset + len(nodes), offset + len(nodes) + len(children))
+        offset += len(nodes) + len(children) + len(search)
+
+    strings_offset = offset
+    string_index = b"".join(STRING.pack(pool_offset, length) for pool_offset, length in strings.index)
+    pool_offset = strings_offset + len(string_index)
+    body = b"".join([bytes(classifiers)]
+                    + [nodes + children + search for _, nodes, children, search in sections]
+                    + [string_index, bytes(strings.data)])
+    # Hashed once here, opening the file reads it from the header instead of every page
+    header = HEADER.pack(MAGIC, VERSION, 0, len(sections), len(strings.index),
+                         classifiers_offset, strings_offset, pool_offset, hashlib.sha256(body).digest())
+    return header + body
+
+
+def write_store(trees: Dict[str, object], path: str) -> None:
+    data = build_store(trees)
+    # Replace atomically so that processes which already mapped the previous file keep a consistent view
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as outfile:
+        outfile.write(data)
+    os.replace(tmp_path, path)
+
+
+class StringTable:
+    """The string pool shared by all classifiers of a store file."""
+
+    def __init__(self, buffer, string_count: int, strings_offset: int, pool_offset: int):
+        self._buffer = buffer
+        self.string_count = string_count
+        self._strings_offset = strings_offset
+        self._pool_offset = pool_offset
+
+    def get(self, string_id: int) -> str:
+        offset, length = STRING.unpack_from(self._buffer, self._strings_offset + string_id * STRING.size)
+        start = self._pool_offset + offset
+        return str(self._buffer[start:start + length], "utf-8")
+
+
+class U32Array(Sequence):
+    """u32 values stored at ``offset``, decoded on access."""
+
+    def __init__(self, buffer, offset: int, count: int):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self._count)
+            return struct.unpack_from(f"<{max(0, stop - start)}I", self._buffer, self._offset + start * U32.size)
+        if not 0 <= index < self._count:
+            raise IndexError(f"Index {index} is out of range")
+        return U32.unpack_from(self._buffer, self._offset + index * U32.size)[0]
+
+
+class StringColumn(Sequence):
+    """Strings by the u32 string ids stored at ``offset``, in sorted order."""
+
+    def __init__(self, buffer, strings: StringTable, offset: int, count: int):
+        self._buffer = buffer
+        self._strings = strings
+        self._offset = offset
+        self._count = count
+        self._fences = [self[index] for index in range(0, count, KEY_FENCE_STEP)]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        if not 0 <= index < self._count:
+            raise IndexError(f"Index {index} is out of range")
+        return self._strings.get(U32.unpack_from(self._buffer, self._offset + index * U32.size)[0])
+
+    def _block(self, fence: int, lo: int, hi: Optional[int]) -> Tuple[int, int]:
+        """Range between the fences around ``fence``, narrowed to ``lo``..``hi``."""
+        hi = self._count if hi is None else hi
+        start = min(max(lo, (fence - 1) * KEY_FENCE_STEP if fence else 0), hi)
+        return start, max(min(hi, fence * KEY_FENCE_STEP), start)
+
+    def bisect_left(self, value: str, lo: int = 0, hi: Optional[int] = None) -> int:
+        return bisect_left(self, value, *self._block(bisect_left(self._fences, value), lo, hi))
+
+    def bisect_right(self, value: str, lo: int = 0, hi: Optional[int] = None) -> int:
+        return bisect_right(self, value, *self._block(bisect_right(self._fences, value), lo, hi))
+
+
+class PostingLists:
+    """Sorted string keys, each with a list of u32 values."""
+
+    def __init__(self, buffer, strings: StringTable, offset: int, key_count: int, value_count: int):
+        self.keys = StringColumn(buffer, strings, offset, key_count)
+        self._buffer = buffer
+        self._starts_offset = offset + key_count * U32.size
+        self._values = U32Array(buffer, offset + (2 * key_count + 1) * U32.size, value_count)
+        self.size = (2 * key_count + 1 + value_count) * U32.size
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def values(self, start: int, end: Optional[int] = None) -> Tuple[int, ...]:
+        """Values of the key at ``start``, or of all keys from ``start`` up to ``end``."""
+        if end is None:
+            value_start, value_end = RANGE.unpack_from(self._buffer, self._starts_offset + start * U32.size)
+        else:
+            value_start, = U32.unpack_from(self._buffer, self._starts_offset + start * U32.size)
+            value_end, = U32.unpack_from(self._buffer, self._starts_offset + end * U32.size)
+        return self._values[value_start:value_end]
+
+    def get(self, key: str) -> Tuple[int, ...]:
+        index = self.keys.bisect_left(key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return self.values(index)
+        return ()
+
+
+@dataclasses.dataclass(frozen=True)
+class SearchSection:
+    leaves: U32Array  # leaf ordinal -> node id
+    codes: PostingLists
+    names: PostingLists
+    tokens: PostingLists
+    trigrams: PostingLists
+    short_prefixes: PostingLists
+
+
+class StoreFile:
+    """All classifiers of a store file, in the order they were written."""
+
+    def __init__(self, buffer, mapping: Optional[mmap.mmap] = None):
+        magic, version, _, classifier_count, string_count, classifiers_offset, strings_offset, \
+            pool_offset, digest = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a classifier store")
+        if version != VERSION:
+            raise ValueError(f"Unsupported classifier store version {version}")
+        self._mapping = mapping
+        # Tells data versions apart, node ids are only meaningful within the version they come from
+        self.digest = digest.hex()[:DIGEST_LENGTH]
+        self.strings = StringTable(buffer, string_count, strings_offset, pool_offset)
+        self.classifiers: Dict[str, ClassifierStore] = {}
+        for index in range(classifier_count):
+            name, node_count, child_count, nodes_offset, children_offset, search_offset = CLASSIFIER.unpack_from(
+                buffer, classifiers_offset + index * CLASSIFIER.size)
+            name = self.strings.get(name)
+            self.classifiers[name] = ClassifierStore(buffer, self.strings, name, node_count, child_count,
+                                                     nodes_offset, children_offset, search_offset)
+
+    @classmethod
+    def open(cls, path: str) -> "StoreFile":
+        with open(path, "rb") as store_file:
+            mapping = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapping, mapping)
+
+    def close(self) -> None:
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.classifiers)
+
+    def __getitem__(self, name: str) -> "ClassifierStore":
+        return self.classifiers[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.classifiers
+
+    def __iter__(self) -> Iterator["ClassifierStore"]:
+        return iter(self.classifiers.values())
+
+
+class ClassifierStore:
+    """Read-only view over one classifier of a store file. All lookups decode straight from the mapped buffer."""
+
+    def __init__(self, buffer, strings: StringTable, name: str, node_count: int, child_count: int,
+                 nodes_offset: int, children_offset: int, search_offset: int):
+        self._buffer = buffer
+        self.strings = strings
+        self.name = name
+        self.node_count = node_count
+        self.child_count = child_count
+        self._nodes_offset = nodes_offset
+        self._children_offset = children_offset
+        self._search_offset = search_offset
+        self._file: Optional[StoreFile] = None
+
+    @classmethod
+    def open(cls, path: str, name: Optional[str] = None) -> "ClassifierStore":
+        """Opens a single classifier of the file, the first one unless ``name`` is given."""
+        store_file = StoreFile.open(path)
+        store = store_file[name] if name is not None else next(iter(store_file))
+        store._file = store_file
+        return store
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def root(self) -> int:
+        return 0
+
+    def _node(self, node_id: int) -> Tuple[int, int, int, int, int, int, int, int, int]:
+        if not 0 <= node_id < self.node_count:
+            raise IndexError(f"Node {node_id} is out of range")
+        return NODE.unpack_from(self._buffer, self._nodes_offset + node_id * NODE.size)
+
+    def _string(self, string_id: int) -> str:
+        return self.strings.get(string_id)
+
+    def parent(self, node_id: int) -> int:
+        return self._node(node_id)[0]
+
+    def children(self, node_id: int) -> List[int]:
+        _, first_child, child_count = self._node(node_id)[:3]
+        offset = self._children_offset + first_child * CHILD.size
+        return list(struct.unpack_from(f"<{child_count}I", self._buffer, offset))
+
+    def child_count_of(self, node_id: int) -> int:
+        return self._node(node_id)[2]
+
+    def code(self, node_id: int) -> str:
+        return self._string(self._node(node_id)[3])
+
+    def name_ua(self, node_id: int) -> str:
+        return self._string(self._node(node_id)[4])
+
+    def name_en(self, node_id: int) -> str:
+        return self._string(self._node(node_id)[5])
+
+    def string_ids(self, node_id: int) -> Tuple[int, int, int]:
+        """Pool ids of (code, name_ua, name_en), equal strings have equal ids across the whole file."""
+        return self._node(node_id)[3:6]
+
+    def depth(self, node_id: int) -> int:
+        return self._node(node_id)[6]
+
+    def is_leaf(self, node_id: int) -> bool:
+        return bool(self._node(node_id)[7] & FLAG_LEAF)
+
+    def key(self, node_id: int) -> int:
+        """Stable key of the node, the same in every version of the data as long as its path of codes is."""
+        return self._node(node_id)[8]
+
+    def child_names(self, node_id: int) -> List[str]:
+        return [self.name_ua(child) for child in self.children(node_id)]
+
+    def child_by_name(self, node_id: int, name_ua: str) -> Optional[int]:
+        for child in self.children(node_id):
+            if self.name_ua(child) == name_ua:
+                return child
+        return None
+
+    def search_section(self) -> SearchSection:
+        counts = SEARCH.unpack_from(self._buffer, self._search_offset)
+        leaf_count = counts[0]
+        offset = self._search_offset + SEARCH.size
+        leaves = U32Array(self._buffer, offset, leaf_count)
+        offset += leaf_count * U32.size
+        posting_lists = []
+        for key_count, value_count in zip(counts[1::2], counts[2::2]):
+            posting_lists.append(PostingLists(self._buffer, self.strings, offset, key_count, value_count))
+            offset += posting_lists[-1].size
+        return SearchSection(leaves, *posting_lists)
+
+    def path(self, node_id: int) -> List[int]:
+        """Node ids from the first level below the root down to ``node_id``."""
+        path = []
+        while node_id > 0:
+            path.append(node_id)
+            node_id = self.parent(node_id)
+        return path[::-1]
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) < 3 or not all("=" in argument for argument in argv[2:]):
+        print(f"Usage: {argv[0]} <output.bin> <name>=<tree.json> [<name>=<tree.json> ...]")
+        sys.exit(1)
+    trees = {}
+    for argument in argv[2:]:
+        name, tree_path = argument.split("=", 1)
+        with open(tree_path, "r", encoding="utf-8") as tree_file:
+            trees[name] = json.load(tree_file)
+    write_store(trees, argv[1])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,43 @@
+"""
+Normalization shared by everything that reads classifier trees or matches queries against them.
+
+The store builder precomputes the search index with these functions and the bot normalizes
+queries with the same ones, the exports (SQLite, mobile bundles) key their indexes the same way.
+The module lives next to the bot because the bot image ships only this directory, the ingestion
+modules add it to ``sys.path``.
+"""
+import dataclasses
+import re
+from typing import List, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+CODE_STRIP_PATTERN = re.compile(r"[\s.\-–]+")
+
+
+def node_fields(node) -> Tuple[str, str, str, Optional[List]]:
+    """Returns (code, name_ua, name_en, children) for both parser dataclasses and parsed JSON dicts."""
+    if dataclasses.is_dataclass(node):
+        get = lambda key: getattr(node, key, None)  # noqa: E731
+    else:
+        get = node.get
+    code = get("code") or get("clazz") or ""
+    children = get("children")
+    if isinstance(children, dict):
+        children = list(children.values())
+    return code, get("name_ua") or "", get("name_en") or "", children
+
+
+def normalize_text(text: str) -> str:
+    return text.lower().replace("ё", "е").replace("’", "'").replace("ʼ", "'")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+
+def normalize_code(code: str) -> str:
+    return CODE_STRIP_PATTERN.sub("", code).upper()
+
+
+def trigrams(token: str) -> Set[str]:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
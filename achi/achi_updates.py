@@ -0,0 +1,60 @@
+"""
+Concurrent update processing that keeps updates of one chat in order.
+
+Handlers move ``chat_data`` from one navigation step to the next, so two taps of the same chat
+must never run at the same time. Different chats and inline queries (which don't touch chat
+state) are processed concurrently up to ``running_updates``. A chat's update only takes one of
+those slots when the updates before it in the chat are done, so a chat with a backlog holds at
+most one slot and doesn't delay the others.
+
+The library's own limit (``max_concurrent_updates``, applied by ``process_update``) bounds the
+updates the processor has accepted, running or waiting for their chat's turn, and
+``current_concurrent_updates`` counts them.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Updates accepted per running slot by default, the rest wait in the application's update queue
+PENDING_PER_SLOT = 4
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, running_updates: int, accepted_updates: Optional[int] = None):
+        super().__init__(running_updates * PENDING_PER_SLOT if accepted_updates is None else accepted_updates)
+        # Taken only once it's the update's turn in its chat: updates queued behind a busy chat
+        # don't hold slots that other chats could run in
+        self._running = asyncio.BoundedSemaphore(running_updates)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_waiters: Dict[int, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._running:
+                await coroutine
+            return
+
+        chat_id = chat.id
+        lock = self._chat_locks.get(chat_id)
+        if lock is None:
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+        self._chat_waiters[chat_id] = self._chat_waiters.get(chat_id, 0) + 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which is the order updates were fetched in
+            async with lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            self._chat_waiters[chat_id] -= 1
+            if not self._chat_waiters[chat_id]:
+                del self._chat_waiters[chat_id]
+                del self._chat_locks[chat_id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
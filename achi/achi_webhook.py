@@ -0,0 +1,218 @@
+"""
+Webhook serving mode.
+
+Telegram POSTs every update to ``<WEBHOOK_URL>/<path>``. The front end keeps connections alive,
+checks the secret token, hands the update to the application's (bounded) update queue and
+answers as soon as it's queued, so the reply doesn't wait for the handler. Processing itself is
+bounded by the application's update processor. The endpoint is public, so webhook mode doesn't start
+without a secret token: Telegram sends it with every update and requests without it are rejected.
+Telegram posts updates with a ``Content-Length``, a chunked body is refused rather than parsed.
+
+On SIGINT/SIGTERM the server stops accepting connections, reports unhealthy on ``/healthz`` so the
+fly.io proxy stops routing to it, waits for requests in flight and then lets the application
+finish the queued updates. The webhook is never deleted on shutdown: the instance that replaces
+this one on a redeploy serves the same URL, Telegram retries the updates it couldn't deliver in
+between.
+
+Only one instance may serve the webhook. Chat ordering (``achi_updates.py``) and ``chat_data``
+are process-local and chat state is a SQLite file on the machine's volume, so nothing keeps a
+chat's updates on one instance or its state consistent across several.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import re
+import signal
+from dataclasses import dataclass
+from typing import Optional, Set
+
+from telegram import Update
+from telegram.ext import Application
+
+SECRET_TOKEN_HEADER = "x-telegram-bot-api-secret-token"
+# Characters Telegram allows in a secret token, 1-256 of them
+SECRET_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,256}")
+MAX_BODY_SIZE = 1 << 20
+# fly.io sends SIGKILL kill_timeout (5 s) after SIGINT
+DRAIN_TIMEOUT = 4.0
+
+
+@dataclass
+class WebhookConfig:
+    url: str  # public base URL, e.g. https://achi-bot.fly.dev
+    secret_token: str
+    host: str = "0.0.0.0"
+    port: int = 8080
+    path: str = "telegram"
+    max_connections: int = 40  # connections Telegram opens to deliver updates, 1-100
+    drain_timeout: float = DRAIN_TIMEOUT
+
+    @property
+    def webhook_url(self) -> str:
+        return f"{self.url.rstrip('/')}/{self.path}"
+
+    def __post_init__(self):
+        if not SECRET_TOKEN_PATTERN.fullmatch(self.secret_token or ""):
+            raise ValueError("Webhook mode needs WEBHOOK_SECRET, 1-256 characters of A-Z, a-z, 0-9, _ and -")
+
+    @classmethod
+    def from_env(cls) -> Optional["WebhookConfig"]:
+        """Webhook mode is on when WEBHOOK_URL is set, otherwise the bot uses long polling.
+
+        Raises ValueError when WEBHOOK_SECRET is missing or not a valid secret token.
+        """
+        url = os.environ.get("WEBHOOK_URL")
+        if not url:
+            return None
+        return cls(url=url,
+                   secret_token=os.environ.get("WEBHOOK_SECRET", ""),
+                   host=os.environ.get("WEBHOOK_HOST", cls.host),
+                   port=int(os.environ.get("WEBHOOK_PORT", cls.port)),
+                   path=os.environ.get("WEBHOOK_PATH", cls.path),
+                   max_connections=int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", cls.max_connections)))
+
+
+class WebhookServer:
+    def __init__(self, application: Application, config: WebhookConfig):
+        self.application = application
+        self.config = config
+        self.port = config.port
+        self._path = "/" + config.path.strip("/")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._draining = False
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve_connection, self.config.host, self.config.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"Serving webhook on {self.config.host}:{self.port}{self._path}")
+
+    async def stop(self) -> None:
+        """Stops accepting connections and waits up to drain_timeout for requests in flight."""
+        self._draining = True
+        if self._server is not None:
+            self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.config.drain_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Webhook drain timed out with {self._in_flight} requests in flight")
+        for writer in list(self._connections):
+            writer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while not self._draining:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                self._in_flight += 1
+                self._idle.clear()
+                try:
+                    keep_alive = await self._serve_request(request_line, reader, writer)
+                finally:
+                    self._in_flight -= 1
+                    if not self._in_flight:
+                        self._idle.set()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _serve_request(self, request_line: bytes, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> bool:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "transfer-encoding" in headers:
+            await self._respond(writer, "501 Not Implemented", keep_alive=False)
+            return False
+        content_length = int(headers.get("content-length", 0))
+        if content_length > MAX_BODY_SIZE:
+            await self._respond(writer, "413 Payload Too Large", keep_alive=False)
+            return False
+        body = await reader.readexactly(content_length)
+
+        path = target.split("?", 1)[0]
+        if method == "GET" and path == "/healthz":
+            status = "503 Service Unavailable" if self._draining else "200 OK"
+        elif method != "POST" or path != self._path:
+            status = "404 Not Found"
+        elif not hmac.compare_digest(headers.get(SECRET_TOKEN_HEADER, "").encode("latin-1"),
+                                     self.config.secret_token.encode("latin-1")):
+            status = "403 Forbidden"
+        else:
+            status = await self._enqueue(body)
+
+        keep_alive = not self._draining and headers.get("connection", "").lower() != "close"
+        await self._respond(writer, status, keep_alive)
+        return keep_alive
+
+    async def _enqueue(self, body: bytes) -> str:
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            logging.warning("Webhook received an update that can't be parsed", exc_info=True)
+            return "400 Bad Request"
+        # The queue is bounded, a full one holds the response back and Telegram slows down delivery
+        await self.application.update_queue.put(update)
+        return "200 OK"
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str, keep_alive: bool) -> None:
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+
+
+async def serve_webhook(application: Application, config: WebhookConfig,
+                        stop_event: Optional[asyncio.Event] = None) -> None:
+    """Runs the application in webhook mode until stop_event is set, mirroring run_polling's lifecycle."""
+    stop_event = stop_event or asyncio.Event()
+    server = WebhookServer(application, config)
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        # Telegram may deliver right after setWebhook, so it goes last
+        await application.bot.set_webhook(url=config.webhook_url, secret_token=config.secret_token,
+                                          max_connections=config.max_connections,
+                                          allowed_updates=Update.ALL_TYPES)
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, config: WebhookConfig) -> None:
+    async def main():
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop_event.set)
+        await serve_webhook(application, config, stop_event)
+
+    asyncio.run(main())
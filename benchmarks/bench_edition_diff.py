@@ -0,0 +1,110 @@
+"""
+Edition diff and patch against shipping the full dataset.
+
+A new edition is simulated from the current one by renaming, removing, moving and adding
+``--changes`` codes each and renaming a category. For ACHI (``achi/data/achi.json``) and synthetic
+МКХ-10 trees at every ``--scales`` factor, reports the time to diff the editions and to apply the
+patch, the size of the patch against the full tree (raw and gzipped) and whether the patched tree
+is identical to the new edition. Diff time per node stays flat as the trees grow.
+
+    python3 benchmarks/bench_edition_diff.py --changes 50 --scales 1 10
+"""
+import argparse
+import copy
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from common import ACHI_DIR, print_summary
+from synthetic import MKH10_HEADER, mkh10_rows, write_csv
+
+import mkh10_parser
+from ingest.edition_diff import Edition, apply_patch, diff, dump_patch
+
+ACHI_JSON = os.path.join(ACHI_DIR, "data", "achi.json")
+
+
+def leaf_lists(tree: Dict) -> List[List[Dict]]:
+    lists = []
+    stack = [tree]
+    while stack:
+        children = stack.pop()["children"]
+        if isinstance(children, list):
+            lists.append(children)
+        else:
+            stack.extend(children.values())
+    return lists
+
+
+def next_edition(tree: Dict, changes: int, rng: random.Random) -> Dict:
+    edition = copy.deepcopy(tree)
+    lists = [leaves for leaves in leaf_lists(edition) if len(leaves) > 1]
+    for leaves in rng.sample(lists, min(changes, len(lists))):
+        leaves[rng.randrange(len(leaves))]["name_ua"] += " (нова редакція)"
+    for leaves in rng.sample(lists, min(changes, len(lists))):
+        del leaves[rng.randrange(len(leaves))]
+    moved = [leaves.pop(rng.randrange(len(leaves))) for leaves in rng.sample(lists, min(changes, len(lists)))]
+    for leaf in moved:
+        rng.choice(lists).append(leaf)
+    for index in range(changes):
+        leaves = rng.choice(lists)
+        leaves.insert(rng.randrange(len(leaves) + 1),
+                      {"code": f"NEW-{index:05d}", "name_ua": f"Новий код {index}", "name_en": f"New code {index}"})
+    classes = edition["children"]
+    renamed_class = rng.choice(list(classes))
+    class_node = classes[renamed_class]
+    class_node["name_ua"] += " (нова редакція)"
+    edition["children"] = {(class_node["name_ua"] if key == renamed_class else key): node
+                           for key, node in classes.items()}
+    return edition
+
+
+def compare(name: str, tree: Dict, changes: int) -> None:
+    new_tree = next_edition(tree, changes, random.Random(42))
+    full = json.dumps(new_tree, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    node_count = len(Edition.index(tree).codes)
+
+    started = time.perf_counter()
+    edition_diff = diff(tree, new_tree)
+    diff_seconds = time.perf_counter() - started
+    patch = dump_patch(edition_diff.patch())
+    started = time.perf_counter()
+    patched = apply_patch(tree, json.loads(patch))
+    apply_seconds = time.perf_counter() - started
+
+    print_summary(f"{name}, changes", edition_diff.counts)
+    print_summary(f"{name}", {
+        "codes": node_count,
+        "diff_ms": diff_seconds * 1000,
+        "diff_us_per_code": diff_seconds * 1e6 / node_count,
+        "apply_ms": apply_seconds * 1000,
+        "full_kb": len(full) / 1024,
+        "full_gzip_kb": len(gzip.compress(full)) / 1024,
+        "patch_kb": len(patch) / 1024,
+        "patch_gzip_kb": len(gzip.compress(patch)) / 1024,
+        "identical": patched == new_tree,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--changes", type=int, default=50, help="Codes renamed, removed, moved and added each")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    with open(ACHI_JSON, "r", encoding="utf-8") as achi_file:
+        compare("achi", json.load(achi_file), args.changes)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            csv_path = os.path.join(tmp_dir, f"mkh10-x{scale}.csv")
+            write_csv(csv_path, MKH10_HEADER, mkh10_rows(scale))
+            tree = json.loads(json.dumps(mkh10_parser.parse_mkh10_file(csv_path, workers=1)))
+            compare(f"mkh10 (synthetic) x{scale}", tree, args.changes)
+
+
+if __name__ == '__main__':
+    main()
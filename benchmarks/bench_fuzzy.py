@@ -0,0 +1,89 @@
+"""
+Fuzzy search latency and recall over every classifier in the store.
+
+Queries are the first words of random leaf names, misspelled the way people do it: a dropped,
+doubled or swapped letter, transliterated to Latin or typed on the wrong keyboard layout. A query
+counts as found when its leaf is among the first ``--top`` results.
+
+    python3 benchmarks/bench_fuzzy.py --store achi/data/achi.bin
+"""
+import argparse
+import os
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+from common import ACHI_DIR, latency_summary, measure, print_summary
+
+from achi_fuzzy import TO_LATIN_LAYOUT, FuzzyIndex, fold
+from achi_search import tokenize
+from achi_store import ClassifierStore, StoreFile
+
+SAMPLE_LEAVES = 500
+QUERY_WORDS = 3
+
+
+def drop_letter(word: str, rng: random.Random) -> str:
+    index = rng.randrange(len(word))
+    return word[:index] + word[index + 1:]
+
+
+def double_letter(word: str, rng: random.Random) -> str:
+    index = rng.randrange(len(word))
+    return word[:index] + word[index] + word[index:]
+
+
+def swap_letters(word: str, rng: random.Random) -> str:
+    index = rng.randrange(len(word) - 1)
+    return word[:index] + word[index + 1] + word[index] + word[index + 2:]
+
+
+MISSPELLINGS: Dict[str, Callable[[str, random.Random], str]] = {
+    "dropped": drop_letter,
+    "doubled": double_letter,
+    "swapped": swap_letters,
+    "transliterated": lambda word, rng: fold(word),
+    "wrong_layout": lambda word, rng: word.translate(TO_LATIN_LAYOUT),
+}
+
+
+def misspelled_queries(store: ClassifierStore, leaves: List[int], kind: str,
+                       rng: random.Random) -> List[Tuple[str, int]]:
+    queries = []
+    for leaf in rng.sample(leaves, min(SAMPLE_LEAVES, len(leaves))):
+        words = tokenize(store.name_ua(leaf))[:QUERY_WORDS]
+        # Misspell the longest word, short ones are matched exactly
+        longest = max(range(len(words)), key=lambda index: len(words[index]), default=None)
+        if longest is None or len(words[longest]) < 4:
+            continue
+        words[longest] = MISSPELLINGS[kind](words[longest], rng)
+        queries.append((" ".join(words), leaf))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=os.path.join(ACHI_DIR, "data", "achi.bin"))
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for store in StoreFile.open(args.store):
+        started = time.perf_counter()
+        index = FuzzyIndex.build(store)
+        print(f"{store.name}: index build {(time.perf_counter() - started) * 1000:.1f} ms "
+              f"for {len(index.leaves)} leaves")
+        rng = random.Random(42)
+        for kind in MISSPELLINGS:
+            queries = misspelled_queries(store, index.leaves, kind, rng)
+            samples = []
+            found = 0
+            for query, leaf in queries:
+                samples.append(measure(index.search, query))
+                found += leaf in index.search(query, args.top)
+            summary = latency_summary(samples)
+            summary[f"recall_at_{args.top}"] = found / len(queries)
+            print_summary(f"{store.name}, {kind}", summary)
+
+
+if __name__ == '__main__':
+    main()
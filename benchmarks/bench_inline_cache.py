@@ -0,0 +1,82 @@
+"""
+Inline search with and without the result cache, replaying keystrokes of many users.
+
+Every session types the first words of a leaf name one character at a time and sometimes deletes
+the last few characters and retypes them. Sessions pick leaves with a Zipf-like skew, so popular
+procedures are typed by many users. Cached results are checked against uncached ones.
+
+    python3 benchmarks/bench_inline_cache.py --sessions 2000
+"""
+import argparse
+import os
+import random
+import time
+from typing import List
+
+from common import ACHI_DIR, latency_summary, print_summary
+
+import achi_bot
+from achi_inline_cache import FUZZY, HIT, MISS, REFINED, InlineQueryCache
+from achi_search import tokenize
+
+QUERY_WORDS = 2
+BACKSPACE_PROBABILITY = 0.2
+
+
+def keystroke_sessions(classifier, sessions: int, rng: random.Random) -> List[List[str]]:
+    leaves = classifier.search_index.leaves
+    weights = [1 / (rank + 1) for rank in range(len(leaves))]
+    result = []
+    for leaf in rng.choices(leaves, weights, k=sessions):
+        text = " ".join(tokenize(classifier.store.name_ua(leaf))[:QUERY_WORDS])
+        queries = []
+        for length in range(1, len(text) + 1):
+            queries.append(text[:length])
+            if length > 3 and rng.random() < BACKSPACE_PROBABILITY:
+                deleted = rng.randint(1, 3)
+                queries.extend(text[:length - back] for back in range(1, deleted + 1))
+                queries.extend(text[:length - back] for back in range(deleted - 1, 0, -1))
+                queries.append(text[:length])
+        result.append(queries)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=os.path.join(ACHI_DIR, achi_bot.DATA_PATH))
+    parser.add_argument("--sessions", type=int, default=2000)
+    args = parser.parse_args()
+
+    classifiers = achi_bot.build_bot_data(achi_bot.parse_data_tree(args.store))["classifiers"]
+    for classifier in classifiers:
+        classifier.warm_up()
+        sessions = keystroke_sessions(classifier, args.sessions, random.Random(42))
+        queries = [query for session in sessions for query in session]
+
+        def uncached(query: str) -> List[int]:
+            return classifier.search_index.search(query) or classifier.fuzzy_index.search(query)
+
+        cache = InlineQueryCache()
+        for title, search in (("uncached", uncached), ("cached", lambda query: cache.search(classifier, query))):
+            samples = []
+            started = time.perf_counter()
+            for query in queries:
+                query_started = time.perf_counter_ns()
+                search(query)
+                samples.append(time.perf_counter_ns() - query_started)
+            summary = latency_summary(samples)
+            summary["total_ms"] = (time.perf_counter() - started) * 1000
+            print_summary(f"{classifier.name}, {title}", summary)
+
+        total = sum(cache.stats[outcome] for outcome in (HIT, REFINED, MISS, FUZZY))
+        print(f"{classifier.name}: {total} queries, hit rate {cache.hit_rate():.1%}, "
+              f"refined {cache.stats[REFINED] / total:.1%}, missed {cache.stats[MISS] / total:.1%}, "
+              f"fuzzy {cache.stats[FUZZY] / total:.1%}, {len(cache)} entries")
+
+        checked = InlineQueryCache()
+        mismatches = sum(checked.search(classifier, query) != uncached(query) for query in queries)
+        print(f"{classifier.name}: {mismatches} queries where cached results differ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""
+Load test of one bot instance: ``--chats`` simulated chats navigate at the same time through a
+local fake Bot API that answers after ``--latency`` (plus up to ``--jitter``) seconds and fails
+``--flood-rate`` of the calls with 429.
+
+The fake server and the chats run in a separate process, so that the bot process only pays for
+the bot. A chat knows nothing about the data, it reads the keyboard of the last message the bot
+sent it and taps like a user: ``/select``, a random category, ``BACK`` now and then (``--back``),
+and on a leaf listing a page flip (``--page``) or ``BACK``. It starts over with ``/select`` every
+``--session`` taps and pauses ``--think`` seconds on average between taps. Chats join evenly
+over ``--ramp`` seconds.
+
+Reported:
+
+* tap-to-reply latency by kind of tap, from the update reaching the fake server to the bot's
+  answer for the chat (``sendMessage``, or ``editMessageText`` for a page flip); taps without an
+  answer within ``--timeout`` are counted as ``failed``;
+* throughput in answered taps per second and the bot's CPU time per tap;
+* memory: RSS of the bot process before and after the run and its peak, the growth per chat,
+  and the size of a chat's ``chat_data`` as JSON (what ``SqlitePersistence`` writes).
+
+    python3 benchmarks/bench_load.py --chats 1000 --taps 30 --latency 0.05 --flood-rate 0.01
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from bench_tap_latency import message_update
+from bench_webhook import free_port
+from common import ACHI_DIR, latency_summary, print_summary
+from fake_bot_api import FakeBotApi
+
+from telegram.ext import ApplicationBuilder
+
+import achi_bot
+from achi_pages import PAGE_CALLBACK_PREFIX
+from achi_persistence import SqlitePersistence
+from achi_rate_limiter import ChatRateLimiter
+from achi_webhook import WebhookConfig, serve_webhook
+
+FIRST_CHAT_ID = 100_000
+POLLING_TIMEOUT = 10
+RSS_SAMPLE_INTERVAL = 0.5
+SELECT = "select"
+CATEGORY = "category"
+BACK = "back"
+LEAF = "leaf"
+PAGE = "page"
+UNKNOWN_REPLY = "Вибачте"
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def reply_markup(parameters: Dict) -> Dict:
+    markup = parameters.get("reply_markup") or {}
+    # Form-encoded requests carry the markup as a JSON string
+    return json.loads(markup) if isinstance(markup, str) else markup
+
+
+def text_update(update_id: int, chat_id: int, text: str) -> Dict:
+    update = message_update(update_id, text, chat_id)
+    if text.startswith("/"):
+        update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return update
+
+
+def callback_update(update_id: int, chat_id: int, message_id: int, data: str) -> Dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {"message_id": message_id, "date": int(time.time()),
+                        "chat": {"id": chat_id, "type": "private"}, "text": ""},
+        },
+    }
+
+
+class SimulatedChat:
+    """One user tapping through the keyboards the bot sends."""
+
+    def __init__(self, api: FakeBotApi, chat_id: int, update_ids: "itertools.count", args, samples: Dict,
+                 outcomes: Counter):
+        self.api = api
+        self.chat_id = chat_id
+        self.update_ids = update_ids
+        self.args = args
+        self.samples = samples
+        self.outcomes = outcomes
+        self.random = random.Random(chat_id)
+        # Telegram keeps showing the last reply keyboard until another one is sent
+        self.keyboard: List[str] = []
+        self.leaf_message: Optional[int] = None
+        self.page_buttons: List[str] = []
+
+    def next_tap(self, tap: int):
+        """(kind, text or callback data)"""
+        if tap % self.args.session == 0 or not self.keyboard:
+            return SELECT, "/select"
+        if self.leaf_message is not None:
+            if self.page_buttons and self.random.random() < self.args.page:
+                return PAGE, self.random.choice(self.page_buttons)
+            return BACK, achi_bot.BACK
+        categories = [label for label in self.keyboard if label != achi_bot.BACK]
+        if not categories or (achi_bot.BACK in self.keyboard and self.random.random() < self.args.back):
+            return BACK, achi_bot.BACK
+        return CATEGORY, self.random.choice(categories)
+
+    async def tap(self, kind: str, payload: str) -> None:
+        update_id = next(self.update_ids)
+        if kind == PAGE:
+            reply = self.api.wait_for("editMessageText", self.chat_id, details=True)
+            update = callback_update(update_id, self.chat_id, self.leaf_message, payload)
+        else:
+            reply = self.api.wait_for("sendMessage", self.chat_id, details=True)
+            update = text_update(update_id, self.chat_id, payload)
+        started = time.perf_counter_ns()
+        await self.api.push_update(update)
+        try:
+            answered, parameters, result = await asyncio.wait_for(reply, self.args.timeout)
+        except asyncio.TimeoutError:
+            self.outcomes["failed"] += 1
+            return
+        markup = reply_markup(parameters)
+        if parameters.get("text", "").startswith(UNKNOWN_REPLY):
+            self.outcomes["unknown"] += 1
+        elif "keyboard" in markup:
+            self.keyboard = [row[0]["text"] for row in markup["keyboard"]]
+            self.leaf_message = None
+        elif kind != PAGE:
+            kind = LEAF
+            self.leaf_message = result["message_id"]
+        if self.leaf_message is not None:
+            self.page_buttons = [button["callback_data"] for row in markup.get("inline_keyboard", [])
+                                 for button in row if button["callback_data"].startswith(PAGE_CALLBACK_PREFIX)]
+        self.samples[kind].append(answered - started)
+        self.outcomes["answered"] += 1
+
+    async def run(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        for tap in range(self.args.taps):
+            await self.tap(*self.next_tap(tap))
+            if self.args.think:
+                await asyncio.sleep(self.random.expovariate(1 / self.args.think))
+
+
+async def generate(connection, args) -> None:
+    async with FakeBotApi(latency=args.latency, jitter=args.jitter, flood_rate=args.flood_rate,
+                          retry_after=args.retry_after) as api:
+        connection.send(api.port)
+        # Waits until the bot is serving
+        await asyncio.get_running_loop().run_in_executor(None, connection.recv)
+        while args.mode == "webhook" and not api.webhook_url:
+            await asyncio.sleep(0.01)
+        samples: Dict[str, List[int]] = defaultdict(list)
+        outcomes: Counter = Counter()
+        update_ids = itertools.count(1)
+        chats = [SimulatedChat(api, FIRST_CHAT_ID + index, update_ids, args, samples, outcomes)
+                 for index in range(args.chats)]
+        started = time.perf_counter()
+        await asyncio.gather(*(chat.run(args.ramp * index / args.chats) for index, chat in enumerate(chats)))
+        seconds = time.perf_counter() - started
+        connection.send({"samples": dict(samples), "outcomes": dict(outcomes), "seconds": seconds,
+                         "floods": api.floods, "calls": dict(api.calls)})
+        # Serves until the bot has stopped, it is still polling
+        await asyncio.get_running_loop().run_in_executor(None, connection.recv)
+
+
+def generator_process(connection, args) -> None:
+    asyncio.run(generate(connection, args))
+
+
+def build(api_base_url: str, args, persistence):
+    # The per-chat limits are Telegram's, the overall one is lifted so that it doesn't cap the throughput
+    return achi_bot.build_application(
+        ApplicationBuilder().token("1:BENCHMARK").base_url(api_base_url),
+        achi_bot.parse_data_tree(os.path.join(ACHI_DIR, achi_bot.DATA_PATH)),
+        ChatRateLimiter(overall_max_rate=args.overall_rate), persistence=persistence)
+
+
+async def sample_rss(peak: List[float]) -> None:
+    while True:
+        peak[0] = max(peak[0], rss_mb())
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+
+async def serve(application, connection, args) -> Dict:
+    """Runs the bot until the generator reports, returns the bot side of the results."""
+    loop = asyncio.get_running_loop()
+    gc.collect()
+    rss_before = rss_mb()
+    peak = [rss_before]
+    sampler = loop.create_task(sample_rss(peak))
+    cpu_before = cpu_seconds()
+    connection.send("ready")
+    report = await loop.run_in_executor(None, connection.recv)
+    cpu = cpu_seconds() - cpu_before
+    sampler.cancel()
+    gc.collect()
+    chat_data_sizes = [len(json.dumps(chat_data, ensure_ascii=False).encode("utf-8"))
+                       for chat_data in application.chat_data.values()]
+    report.update(rss_before=rss_before, rss_after=rss_mb(), rss_peak=peak[0], cpu=cpu,
+                  chat_data_bytes=sum(chat_data_sizes) / max(1, len(chat_data_sizes)))
+    return report
+
+
+async def run_polling(api_port: int, connection, args, persistence) -> Dict:
+    application = build(f"http://127.0.0.1:{api_port}/bot", args, persistence)
+    async with application:
+        await application.updater.start_polling(poll_interval=0, timeout=POLLING_TIMEOUT)
+        await application.start()
+        report = await serve(application, connection, args)
+        await application.updater.stop()
+        await application.stop()
+    return report
+
+
+async def run_webhook(api_port: int, connection, args, persistence) -> Dict:
+    application = build(f"http://127.0.0.1:{api_port}/bot", args, persistence)
+    port = free_port()
+    config = WebhookConfig(url=f"http://127.0.0.1:{port}", host="127.0.0.1", port=port, secret_token="benchmark")
+    stop_event = asyncio.Event()
+    serving = asyncio.get_running_loop().create_task(serve_webhook(application, config, stop_event))
+    while not application.running:
+        await asyncio.sleep(0.01)
+    report = await serve(application, connection, args)
+    stop_event.set()
+    await serving
+    return report
+
+
+def print_report(report: Dict, args) -> None:
+    outcomes = report["outcomes"]
+    answered = outcomes.get("answered", 0)
+    print_summary("Load", {
+        "mode": args.mode,
+        "chats": args.chats,
+        "taps": args.chats * args.taps,
+        "answered": answered,
+        "failed": outcomes.get("failed", 0),
+        "unknown": outcomes.get("unknown", 0),
+        "floods_429": report["floods"],
+        "seconds": report["seconds"],
+        "taps_per_second": answered / report["seconds"],
+        "cpu_ms_per_tap": report["cpu"] * 1000 / max(1, answered),
+    })
+    all_samples = [sample for samples in report["samples"].values() for sample in samples]
+    if all_samples:
+        print_summary("Tap-to-reply, all", latency_summary(all_samples))
+    for kind in (SELECT, CATEGORY, BACK, LEAF, PAGE):
+        if report["samples"].get(kind):
+            print_summary(f"Tap-to-reply, {kind}", latency_summary(report["samples"][kind]))
+    print_summary("Bot memory, MB", {
+        "rss_before": report["rss_before"],
+        "rss_after": report["rss_after"],
+        "rss_peak": report["rss_peak"],
+        "growth_per_chat_kb": (report["rss_after"] - report["rss_before"]) * 1024 / args.chats,
+        "chat_data_bytes": report["chat_data_bytes"],
+    })
+    print_summary("Bot API calls", report["calls"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--taps", type=int, default=30, help="Taps per chat")
+    parser.add_argument("--session", type=int, default=12, help="Taps before a chat starts over with /select")
+    parser.add_argument("--back", type=float, default=0.2, help="Chance of tapping BACK instead of a category")
+    parser.add_argument("--page", type=float, default=0.3, help="Chance of flipping a page of a leaf listing")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean pause between taps, seconds")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which the chats join")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds a tap waits for its answer")
+    parser.add_argument("--latency", type=float, default=0.05, help="Bot API and delivery latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random latency up to, seconds")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Share of Bot API calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after of the injected 429s, seconds")
+    parser.add_argument("--overall-rate", type=float, default=10_000,
+                        help="Bot-wide messages per second, Telegram allows about 30")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--persistence", action="store_true", help="Keep chat state in SQLite like in production")
+    args = parser.parse_args()
+    # Every /select and every retried 429 is logged at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    connection, generator_connection = multiprocessing.Pipe()
+    generator = multiprocessing.Process(target=generator_process, args=(generator_connection, args), daemon=True)
+    generator.start()
+    api_port = connection.recv()
+    run = run_polling if args.mode == "polling" else run_webhook
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        persistence = SqlitePersistence(os.path.join(tmp_dir, "state.sqlite3")) if args.persistence else None
+        report = asyncio.run(run(api_port, connection, args, persistence))
+    connection.send("stopped")
+    generator.join()
+    print_report(report, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Streaming MKH10 parser against the original two-pass implementation.
+
+Parses synthetic НК 025 CSVs (and the real one when ``mkh10-data/nk-025-2021.csv`` is present),
+reports rows/s and peak traced memory for both implementations and checks that they build
+identical trees. The streaming parser runs in this process (``parse_mkh10_rows``): ``tracemalloc``
+only sees the current process, the parallel ``parse_mkh10_file`` would hide the workers' memory.
+
+    python3 benchmarks/bench_mkh10_parser.py --scales 1 10
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+from common import REPO_ROOT
+from synthetic import MKH10_HEADER, mkh10_rows, write_csv
+
+import mkh10_parser
+import mkh10_parser_baseline
+
+REAL_CSV = os.path.join(REPO_ROOT, "mkh10-data", "nk-025-2021.csv")
+
+
+def profile(parse: Callable[[str], dict], csv_path: str, rows: int) -> Dict[str, float]:
+    # Timed and traced separately, tracemalloc slows allocation-heavy code down several times
+    gc.collect()
+    mkh10_parser.smart_capitalize.cache_clear()
+    started = time.perf_counter()
+    tree = parse(csv_path)
+    elapsed = time.perf_counter() - started
+
+    del tree
+    gc.collect()
+    mkh10_parser.smart_capitalize.cache_clear()
+    tracemalloc.start()
+    tree = parse(csv_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": elapsed, "rows_per_second": rows / elapsed, "peak_mb": peak / 2 ** 20, "tree": tree}
+
+
+def parse_streaming(csv_path: str) -> dict:
+    return mkh10_parser.parse_mkh10_rows(mkh10_parser.read_mkh10_rows(csv_path))
+
+
+def compare(label: str, csv_path: str, rows: int) -> None:
+    baseline = profile(mkh10_parser_baseline.parse_mkh10_file, csv_path, rows)
+    streaming = profile(parse_streaming, csv_path, rows)
+    identical = baseline.pop("tree") == streaming.pop("tree")
+    print(f"{label} ({rows} rows), identical output: {identical}")
+    for name, result in (("baseline", baseline), ("streaming", streaming)):
+        print(f"  {name:9}: {result['seconds']:.3f} s, {result['rows_per_second']:.0f} rows/s, "
+              f"peak {result['peak_mb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    if os.path.exists(REAL_CSV):
+        with open(REAL_CSV, encoding="utf-8") as csv_file:
+            compare("nk-025-2021.csv", REAL_CSV, sum(1 for _ in csv_file) - 1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            csv_path = os.path.join(tmp_dir, f"mkh10-x{scale}.csv")
+            rows = write_csv(csv_path, MKH10_HEADER, mkh10_rows(scale))
+            compare(f"synthetic x{scale}", csv_path, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Sharded mobile bundle against the single-file bundle the app ships now.
+
+Compares sizes (raw and gzipped), the time to load what the first screen needs (the whole tree vs
+the manifest and one class shard) and search latency: the app's full traversal with substring
+matching (a port of ``searchProcedures`` in achi-mobile/lib/search.ts) vs the precomputed index.
+Queries are prefixes of the first words of random leaf names, typed one character at a time, and
+substrings from the middle of names and codes. ``identical`` is the share of queries for which both
+return the same leaves, the index keeps the app's substring matching so it should be 1.
+
+    python3 benchmarks/bench_mobile_bundle.py
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from common import REPO_ROOT, latency_summary, print_summary
+from synthetic import MKH10_HEADER, mkh10_rows, write_csv
+
+import mkh10_parser
+from ingest.mobile_bundle import MANIFEST_FILE, SEARCH_FILE, BundleIndex, build_bundle
+from achi_text import tokenize
+
+MOBILE_ACHI_JSON = os.path.join(REPO_ROOT, "achi-mobile", "data", "achi.json")
+MOBILE_MKH10_JSON = os.path.join(REPO_ROOT, "achi-mobile", "data", "mkh10.json")
+QUERY_WORDS = 2
+SESSIONS = 300
+
+
+def traversal_search(data: Dict, query: str, limit: int = 50) -> List[str]:
+    """searchProcedures from the app, returns leaf codes."""
+    results = []
+    normalized_query = query.lower().strip()
+    if not normalized_query:
+        return results
+
+    def traverse(node: Dict, path: List[str]) -> bool:
+        children = node["children"]
+        if isinstance(children, list):
+            for code in children:
+                if normalized_query in code["code"].lower() or normalized_query in code["name_ua"].lower() \
+                        or normalized_query in (code.get("name_en") or "").lower():
+                    results.append((code["code"], list(path)))
+                    if len(results) >= limit:
+                        return True
+        else:
+            for key, child in children.items():
+                if traverse(child, path + [key]):
+                    return True
+        return False
+
+    for key, child in data["children"].items():
+        if traverse(child, [key]):
+            break
+    return [code for code, _ in results]
+
+
+def keystroke_queries(index: BundleIndex, rng: random.Random) -> List[str]:
+    queries = []
+    for _, code, name_ua, _ in rng.sample(index.leaves, min(SESSIONS, len(index.leaves))):
+        text = " ".join(tokenize(name_ua)[:QUERY_WORDS])
+        queries.extend(text[:length] for length in range(1, len(text) + 1))
+        start = rng.randrange(len(name_ua))
+        queries.append(name_ua[start:start + rng.randint(3, 8)])
+        queries.append(code[1:])
+    return queries
+
+
+def timed_ms(function, *args) -> float:
+    started = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def compare(name: str, single_file: bytes) -> None:
+    tree = json.loads(single_file)
+    files = build_bundle(name, tree)
+    shards = {path: data for path, data in files.items() if path not in (MANIFEST_FILE, SEARCH_FILE)}
+    largest_shard = max(shards.values(), key=len)
+    print_summary(f"{name}, sizes in KB", {
+        "single_file": len(single_file) / 1024,
+        "single_file_gzip": len(gzip.compress(single_file)) / 1024,
+        "manifest": len(files[MANIFEST_FILE]) / 1024,
+        "largest_shard": len(largest_shard) / 1024,
+        "all_shards": sum(map(len, shards.values())) / 1024,
+        "all_shards_gzip": sum(len(gzip.compress(data)) for data in shards.values()) / 1024,
+        "search_index": len(files[SEARCH_FILE]) / 1024,
+        "search_index_gzip": len(gzip.compress(files[SEARCH_FILE])) / 1024,
+    })
+    print_summary(f"{name}, load ms", {
+        "single_file": timed_ms(json.loads, single_file),
+        "manifest_and_largest_shard": timed_ms(json.loads, files[MANIFEST_FILE]) + timed_ms(json.loads, largest_shard),
+        "search_index": timed_ms(lambda: BundleIndex(json.loads(files[SEARCH_FILE]))),
+    })
+
+    index = BundleIndex(json.loads(files[SEARCH_FILE]))
+    queries = keystroke_queries(index, random.Random(42))
+    traversal_samples, index_samples = [], []
+    identical = 0
+    for query in queries:
+        started = time.perf_counter_ns()
+        traversal_codes = traversal_search(tree, query)
+        traversal_samples.append(time.perf_counter_ns() - started)
+        started = time.perf_counter_ns()
+        index_codes = [result.code for result in index.search(query)]
+        index_samples.append(time.perf_counter_ns() - started)
+        identical += traversal_codes == index_codes
+    print_summary(f"{name}, traversal search", latency_summary(traversal_samples))
+    summary = latency_summary(index_samples)
+    summary["identical"] = identical / len(queries)
+    print_summary(f"{name}, index search", summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--achi", default=MOBILE_ACHI_JSON)
+    parser.add_argument("--mkh10", default=MOBILE_MKH10_JSON,
+                        help="МКХ-10 tree, a synthetic one is generated when the file doesn't exist")
+    args = parser.parse_args()
+
+    with open(args.achi, "rb") as achi_file:
+        compare("achi", achi_file.read())
+
+    if os.path.exists(args.mkh10):
+        with open(args.mkh10, "rb") as mkh10_file:
+            compare("mkh10", mkh10_file.read())
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "mkh10.csv")
+        json_path = os.path.join(tmp_dir, "mkh10.json")
+        write_csv(csv_path, MKH10_HEADER, mkh10_rows(1))
+        mkh10_parser.write_json(mkh10_parser.parse_mkh10_file(csv_path, workers=1), json_path)
+        with open(json_path, "rb") as mkh10_file:
+            compare("mkh10 (synthetic)", mkh10_file.read())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Parallel ingestion pipeline against the single-process parsers, for both classifiers.
+
+Parses synthetic CSVs in a single pass, then with 1, 2, 4, ... worker processes up to the core
+count. Reports the time and the speedup over the single pass of each run and checks that the JSON
+output is byte-identical. The speedup is bounded by splitting the file, unpickling the subtrees
+and merging them, which stay in the main process.
+
+    python3 benchmarks/bench_pipeline.py --scales 10 100
+"""
+import argparse
+import hashlib
+import io
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from common import print_summary
+from synthetic import ACHI_HEADER, MKH10_HEADER, achi_rows, mkh10_rows, write_csv
+
+import achi_parser
+import mkh10_parser
+from ingest import json_stream, pipeline
+
+
+def output_digest(tree, indent: int) -> str:
+    output = io.StringIO()
+    json_stream.dump(tree, output, indent=indent)
+    return hashlib.sha256(output.getvalue().encode("utf-8")).hexdigest()
+
+
+CLASSIFIERS: Dict[str, Dict] = {
+    "achi": {
+        "header": ACHI_HEADER,
+        "rows": achi_rows,
+        "achi_layout": True,
+        "single_pass": lambda csv_path: achi_parser.parse_achi_rows(achi_parser.read_achi_rows(csv_path)),
+        "parse": achi_parser.parse_achi_file,
+        "caches": [achi_parser.normalize_name],
+        "indent": 4,
+    },
+    "mkh10": {
+        "header": MKH10_HEADER,
+        "rows": mkh10_rows,
+        "achi_layout": False,
+        "single_pass": lambda csv_path: mkh10_parser.parse_mkh10_rows(mkh10_parser.read_mkh10_rows(csv_path)),
+        "parse": mkh10_parser.parse_mkh10_file,
+        "caches": [mkh10_parser.smart_capitalize],
+        "indent": 2,
+    },
+}
+
+
+def worker_counts(max_workers: int) -> List[int]:
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def run(parse: Callable, caches: List, *args):
+    # Forked workers inherit the parent's caches, every run starts cold
+    for cache in caches:
+        cache.cache_clear()
+    started = time.perf_counter()
+    tree = parse(*args)
+    return tree, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--classifiers", nargs="+", choices=sorted(CLASSIFIERS), default=sorted(CLASSIFIERS))
+    parser.add_argument("--max-workers", type=int, default=pipeline.default_workers())
+    args = parser.parse_args()
+
+    print(f"{pipeline.default_workers()} cores, {pipeline.CHUNK_ROWS} rows per chunk")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.classifiers:
+            classifier = CLASSIFIERS[name]
+            for scale in args.scales:
+                csv_path = os.path.join(tmp_dir, f"{name}-x{scale}.csv")
+                rows = write_csv(csv_path, classifier["header"], classifier["rows"](scale),
+                                 achi_layout=classifier["achi_layout"])
+                tree, baseline_seconds = run(classifier["single_pass"], classifier["caches"], csv_path)
+                baseline_digest = output_digest(tree, classifier["indent"])
+                print_summary(f"{name} x{scale}, single pass", {
+                    "rows": rows, "seconds": baseline_seconds, "rows_per_second": rows / baseline_seconds})
+                for workers in worker_counts(args.max_workers):
+                    tree, seconds = run(classifier["parse"], classifier["caches"], csv_path, workers)
+                    digest = output_digest(tree, classifier["indent"])
+                    print_summary(f"{name} x{scale}, {workers} workers", {
+                        "rows": rows,
+                        "seconds": seconds,
+                        "rows_per_second": rows / seconds,
+                        "speedup": baseline_seconds / seconds,
+                        "identical_output": digest == baseline_digest,
+                    })
+
+
+if __name__ == '__main__':
+    main()
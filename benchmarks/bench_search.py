@@ -0,0 +1,43 @@
+"""
+Inline search latency over the full ACHI dataset.
+
+Replays what a user types: every prefix of a leaf name, code prefixes and full codes.
+
+    python3 benchmarks/bench_search.py
+"""
+import os
+import random
+import time
+
+from common import ACHI_DIR, latency_summary, measure, print_summary
+
+from achi_search import SearchIndex, tokenize
+from achi_store import ClassifierStore
+
+SAMPLE_LEAVES = 500
+
+
+def keystroke_queries(store: ClassifierStore, leaves, rng: random.Random):
+    queries = []
+    for leaf in rng.sample(leaves, min(SAMPLE_LEAVES, len(leaves))):
+        name = " ".join(tokenize(store.name_ua(leaf))[:2])
+        queries.extend(name[:length] for length in range(1, len(name) + 1))
+        code = store.code(leaf)
+        queries.extend(code[:length] for length in range(1, len(code) + 1))
+    return queries
+
+
+def main():
+    store = ClassifierStore.open(os.path.join(ACHI_DIR, "data", "achi.bin"))
+    started = time.perf_counter()
+    index = SearchIndex.from_store(store)
+    print(f"Index open: {(time.perf_counter() - started) * 1000:.1f} ms for {len(index.leaves)} leaves")
+
+    queries = keystroke_queries(store, index.leaves, random.Random(42))
+    for query in queries[:100]:
+        index.search(query)  # warm up
+    print_summary("Query latency", latency_summary([measure(index.search, query) for query in queries]))
+
+
+if __name__ == '__main__':
+    main()
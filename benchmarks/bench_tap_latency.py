@@ -0,0 +1,105 @@
+"""
+Per-tap latency of the navigation handler against a local fake Bot API.
+
+Every Bot API call takes ``--latency`` seconds on the fake server. The current handler overlaps
+the two deletes with the send, the serial variant reproduces the previous delete, delete, send
+sequence through the same bot for comparison.
+
+    python3 benchmarks/bench_tap_latency.py --latency 0.05 --taps 100
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+
+from common import ACHI_DIR, latency_summary, print_summary
+from fake_bot_api import FakeBotApi
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ContextTypes
+
+import achi_bot
+from achi_rate_limiter import ChatRateLimiter
+
+CHAT_ID = 42
+
+
+def message_update(update_id: int, text: str, chat_id: int = CHAT_ID) -> Dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": 10_000 + update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Benchmark"},
+            "text": text,
+        },
+    }
+
+
+async def serial_tap(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """The pre-pipelining handler flow: both deletes finish before the next step is sent."""
+    classifier = context.bot_data["classifiers"].default
+    navigation = classifier.navigation
+    node = achi_bot.current_node(context)
+    node = navigation.back(node) if update.message.text == achi_bot.BACK \
+        else navigation.skip_single_choices(navigation.child_by_label(node, update.message.text))
+    achi_bot.set_current_node(context, classifier, node)
+    await context.bot.delete_message(chat_id=CHAT_ID, message_id=update.message.message_id)
+    if achi_bot.LAST_MESSAGE_ID_KEY in context.chat_data:
+        await context.bot.delete_message(chat_id=CHAT_ID, message_id=context.chat_data.pop(achi_bot.LAST_MESSAGE_ID_KEY))
+    sent_message = await context.bot.send_message(
+        chat_id=CHAT_ID, text=navigation.breadcrumbs(node),
+        reply_markup=achi_bot.build_reply_keyboard_markup([achi_bot.BACK] + navigation.child_labels(node)))
+    context.chat_data[achi_bot.LAST_MESSAGE_ID_KEY] = sent_message.message_id
+
+
+def tap_script(application, taps: int) -> List[str]:
+    """Alternates between the first category and BACK so every tap renders a keyboard step."""
+    navigation = application.bot_data["classifiers"].default.navigation
+    first_category = navigation.child_labels(navigation.root)[0]
+    return [first_category if index % 2 == 0 else achi_bot.BACK for index in range(taps)]
+
+
+async def run(latency: float, taps: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    async with FakeBotApi(latency=latency) as api:
+        # One chat taps back-to-back, far above what the per-chat flood limit would let through
+        application = achi_bot.build_application(
+            ApplicationBuilder().token("1:BENCHMARK").base_url(api.base_url),
+            achi_bot.parse_data_tree(os.path.join(ACHI_DIR, achi_bot.DATA_PATH)),
+            ChatRateLimiter(chat_max_rate=taps, chat_burst=taps))
+        async with application:
+            script = tap_script(application, taps)
+            for name, handler in (("pipelined", None), ("serial", serial_tap)):
+                samples = []
+                application.chat_data[CHAT_ID].clear()
+                for update_id, text in enumerate(script):
+                    update = Update.de_json(message_update(update_id, text), application.bot)
+                    started = time.perf_counter_ns()
+                    if handler is None:
+                        await application.process_update(update)
+                    else:
+                        await handler(update, ContextTypes.DEFAULT_TYPE.from_update(update, application))
+                    samples.append(time.perf_counter_ns() - started)
+                results[name] = latency_summary(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Bot API latency per call, seconds")
+    parser.add_argument("--taps", type=int, default=100)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args.latency, args.taps))
+    for name, summary in results.items():
+        print_summary(f"Tap latency, {name}", summary)
+    print(f"Speedup p50: {results['serial']['p50_us'] / results['pipelined']['p50_us']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Tap-to-reply latency in long polling and webhook mode against a local fake Bot API.
+
+Every Bot API call and every update delivery takes ``--latency`` seconds. ``--chats`` chats tap at
+the same time, each tap is timed from the moment the fake server has the update until the bot's
+``sendMessage`` for that chat arrives. The webhook run also goes through the graceful shutdown.
+
+    python3 benchmarks/bench_webhook.py --latency 0.05 --chats 20 --rounds 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Dict, List
+
+from bench_tap_latency import message_update, tap_script
+from common import ACHI_DIR, latency_summary, print_summary
+from fake_bot_api import FakeBotApi
+
+from telegram.ext import ApplicationBuilder
+
+import achi_bot
+from achi_rate_limiter import ChatRateLimiter
+from achi_webhook import WebhookConfig, serve_webhook
+
+FIRST_CHAT_ID = 1000
+POLLING_TIMEOUT = 10
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+async def drive(api: FakeBotApi, application, chats: int, rounds: int) -> List[int]:
+    """Every round each chat taps once, the next round starts when all of them got their reply."""
+    script = tap_script(application, rounds)
+    update_ids = iter(range(1, chats * rounds + 1))
+    samples = []
+
+    async def tap(chat_id: int, text: str) -> None:
+        reply = api.wait_for("sendMessage", chat_id)
+        started = time.perf_counter_ns()
+        await api.push_update(message_update(next(update_ids), text, chat_id))
+        samples.append(await reply - started)
+
+    for text in script:
+        await asyncio.gather(*(tap(FIRST_CHAT_ID + chat, text) for chat in range(chats)))
+    return samples
+
+
+def build(api: FakeBotApi, rounds: int):
+    # Taps of one chat follow each other faster than the per-chat flood limit would allow
+    return achi_bot.build_application(
+        ApplicationBuilder().token("1:BENCHMARK").base_url(api.base_url),
+        achi_bot.parse_data_tree(os.path.join(ACHI_DIR, achi_bot.DATA_PATH)),
+        ChatRateLimiter(overall_max_rate=10_000, chat_max_rate=rounds, chat_burst=rounds))
+
+
+async def run_polling(latency: float, chats: int, rounds: int) -> List[int]:
+    async with FakeBotApi(latency=latency) as api:
+        application = build(api, rounds)
+        async with application:
+            await application.updater.start_polling(poll_interval=0, timeout=POLLING_TIMEOUT)
+            await application.start()
+            samples = await drive(api, application, chats, rounds)
+            await application.updater.stop()
+            await application.stop()
+    return samples
+
+
+async def run_webhook(latency: float, chats: int, rounds: int) -> List[int]:
+    async with FakeBotApi(latency=latency) as api:
+        application = build(api, rounds)
+        port = free_port()
+        config = WebhookConfig(url=f"http://127.0.0.1:{port}", host="127.0.0.1", port=port, secret_token="benchmark")
+        stop_event = asyncio.Event()
+        serving = asyncio.get_running_loop().create_task(serve_webhook(application, config, stop_event))
+        while not api.webhook_url:
+            await asyncio.sleep(0.01)
+        samples = await drive(api, application, chats, rounds)
+        stop_event.set()
+        await serving
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Bot API and delivery latency, seconds")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, run in (("polling", run_polling), ("webhook", run_webhook)):
+        results[name] = latency_summary(asyncio.run(run(args.latency, args.chats, args.rounds)))
+        print_summary(f"Tap-to-reply, {name}", results[name])
+    print(f"Speedup p50: {results['polling']['p50_us'] / results['webhook']['p50_us']:.2f}x, "
+          f"p99: {results['polling']['p99_us'] / results['webhook']['p99_us']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
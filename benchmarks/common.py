@@ -0,0 +1,42 @@
+"""Shared helpers for the benchmark scripts. Run the scripts from the repository root."""
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACHI_DIR = os.path.join(REPO_ROOT, "achi")
+MKH10_DIR = os.path.join(REPO_ROOT, "mkh10")
+
+for path in (REPO_ROOT, ACHI_DIR, MKH10_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def latency_summary(samples_ns: List[int]) -> Dict[str, float]:
+    """Summarizes nanosecond samples into microsecond percentiles."""
+    ordered = sorted(samples_ns)
+    return {
+        "count": len(ordered),
+        "p50_us": percentile(ordered, 0.50) / 1000,
+        "p90_us": percentile(ordered, 0.90) / 1000,
+        "p99_us": percentile(ordered, 0.99) / 1000,
+        "max_us": ordered[-1] / 1000,
+    }
+
+
+def measure(function: Callable, *args) -> int:
+    started = time.perf_counter_ns()
+    function(*args)
+    return time.perf_counter_ns() - started
+
+
+def print_summary(title: str, summary: Dict[str, float]) -> None:
+    details = ", ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in summary.items())
+    print(f"{title}: {details}")
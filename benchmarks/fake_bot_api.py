@@ -0,0 +1,202 @@
+"""
+Minimal local stand-in for the Telegram Bot API.
+
+Serves ``POST /bot<token>/<method>`` over HTTP/1.1 with keep-alive, answers every method the bot
+uses with a plausible result after a configurable delay (``latency`` plus up to ``jitter`` seconds),
+and can inject 429 flood errors. The bot is pointed at it with ``base_url=server.base_url``.
+
+``push_update`` delivers an update the way Telegram would: to the webhook set with ``setWebhook``
+(after the same delay) or, without one, to a pending ``getUpdates`` long poll. ``wait_for``
+resolves when the bot calls a method for a chat, which is how tap-to-reply latency is measured;
+with ``details=True`` it also returns the parameters of the call and its result, so a simulated
+chat can read the keyboard it was sent.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "ACHI", "username": "achi_selector_bot"}
+# Telegram's default and maximum for getUpdates
+UPDATES_LIMIT = 100
+
+
+class FakeBotApi:
+    def __init__(self, latency: float = 0.0, flood_rate: float = 0.0, retry_after: int = 1, seed: int = 0,
+                 jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.floods = 0
+        self.webhook_url = ""
+        self.webhook_secret = ""
+        self._updates: List[Dict] = []
+        self._new_update = asyncio.Event()
+        self._waiters: Dict[Tuple[str, int], List[Tuple[asyncio.Future, bool]]] = defaultdict(list)
+        # Idle keep-alive connections to the webhook, like Telegram's max_connections pool
+        self._webhook_connections: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1000)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    async def start(self, port: int = 0) -> "FakeBotApi":
+        self._server = await asyncio.start_server(self._serve_connection, "127.0.0.1", port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        for _, writer in self._webhook_connections:
+            writer.close()
+        self._webhook_connections.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "FakeBotApi":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _delay(self) -> None:
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def push_update(self, update: Dict) -> None:
+        if not self.webhook_url:
+            self._updates.append(update)
+            self._new_update.set()
+            return
+        await self._delay()
+        url = urlsplit(self.webhook_url)
+        if self._webhook_connections:
+            reader, writer = self._webhook_connections.pop()
+        else:
+            reader, writer = await asyncio.open_connection(url.hostname, url.port)
+        body = json.dumps(update).encode("utf-8")
+        secret = f"X-Telegram-Bot-Api-Secret-Token: {self.webhook_secret}\r\n" if self.webhook_secret else ""
+        writer.write(f"POST {url.path} HTTP/1.1\r\nHost: {url.netloc}\r\nContent-Type: application/json\r\n"
+                     f"{secret}Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        await reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._webhook_connections.append((reader, writer))
+        status = status_line.decode("latin-1").split(" ", 2)[1]
+        if status != "200":
+            raise RuntimeError(f"Webhook answered {status_line.decode('latin-1').strip()}")
+
+    def wait_for(self, method: str, chat_id: int, details: bool = False) -> "asyncio.Future":
+        """Resolves with the time of the call, or (time, parameters, result) with ``details``."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[(method, chat_id)].append((future, details))
+        return future
+
+    async def _get_updates(self, parameters: Dict[str, str]) -> List[Dict]:
+        offset = int(parameters.get("offset", 0))
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(parameters.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                return []
+            await self._delay()  # the response travels back like a webhook delivery
+        return self._updates[:int(parameters.get("limit", UPDATES_LIMIT))]
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self._handle(path.rsplit("/", 1)[-1], headers.get("content-type", ""), body)
+                response = json.dumps(payload).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(response)}\r\n\r\n".encode("latin-1") + response)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse_parameters(content_type: str, body: bytes) -> Dict[str, str]:
+        if not body:
+            return {}
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+        return dict(parse_qsl(body.decode("utf-8")))
+
+    async def _handle(self, method: str, content_type: str, body: bytes) -> Tuple[str, Dict]:
+        self.calls[method] += 1
+        await self._delay()
+        parameters = self._parse_parameters(content_type, body)
+        if self.flood_rate and method != "getMe" and self._random.random() < self.flood_rate:
+            self.floods += 1
+            return "429 Too Many Requests", {"ok": False, "error_code": 429,
+                                             "description": f"Too Many Requests: retry after {self.retry_after}",
+                                             "parameters": {"retry_after": self.retry_after}}
+        if method == "getUpdates":
+            return "200 OK", {"ok": True, "result": await self._get_updates(parameters)}
+        result = self._result(method, parameters)
+        called = time.perf_counter_ns()
+        for waiter, details in self._waiters.pop((method, int(parameters.get("chat_id", 0))), []):
+            if not waiter.done():
+                waiter.set_result((called, parameters, result) if details else called)
+        return "200 OK", {"ok": True, "result": result}
+
+    def _result(self, method: str, parameters: Dict[str, str]) -> Any:
+        if method == "getMe":
+            return BOT_USER
+        if method == "setWebhook":
+            self.webhook_url = parameters.get("url", "")
+            self.webhook_secret = parameters.get("secret_token", "")
+            return True
+        if method == "deleteWebhook":
+            self.webhook_url = ""
+            return True
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": 0}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(parameters.get("chat_id", 0))
+            return {"message_id": int(parameters.get("message_id", 0)) or next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "text": parameters.get("text", "")}
+        return True
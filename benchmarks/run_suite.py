@@ -0,0 +1,283 @@
+"""
+Benchmark suite for the parsers and the bot handlers, with machine-readable results.
+
+Cases:
+
+* ``parse/<classifier>/<input>`` — parse throughput (rows/s), peak RSS of the parser and of its
+  largest worker, and JSON write time for ``achi_parser`` and ``mkh10_parser`` on the real CSVs (when
+  present) and synthetic scaled inputs; both parse with the same ``--workers`` (all cores by default);
+* ``store_load`` — ``parse_data_tree`` load time and RSS, plus building the bot's indexes and those
+  of every other classifier in the store;
+* ``navigation`` — ``proceed_with_selected_option`` latency per step, driven through stub
+  ``Update``/context objects and an in-process fake bot.
+
+Every case runs in a fresh interpreter so peak RSS is not inflated by the previous one. Results
+are written as JSON (by default to ``benchmarks/results/<commit>.json``) and can be compared with
+an earlier run:
+
+    python3 benchmarks/run_suite.py --scales 1 10 100
+    python3 benchmarks/run_suite.py --compare benchmarks/results/<old commit>.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from common import ACHI_DIR, REPO_ROOT, latency_summary
+from ingest.pipeline import default_workers
+from synthetic import ACHI_HEADER, MKH10_HEADER, achi_rows, mkh10_rows, write_csv
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+REAL_ACHI_CSV = os.path.join(ACHI_DIR, "ACHI UKR-ENG.csv")
+REAL_MKH10_CSV = os.path.join(REPO_ROOT, "mkh10-data", "nk-025-2021.csv")
+STORE_PATH = os.path.join(ACHI_DIR, "data", "achi.bin")
+NAVIGATION_STEPS = 5000
+# Relative change of a metric that --compare reports as a regression
+REGRESSION_THRESHOLD = 0.10
+HIGHER_IS_BETTER = ("rows_per_second",)
+LOWER_IS_BETTER_SUFFIXES = ("_seconds", "_ms", "_us", "_mb")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux, for RUSAGE_CHILDREN it's the largest terminated child
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def parse_case(classifier: str, csv_path: str, rows: int, workers: int) -> Dict[str, float]:
+    if classifier == "achi":
+        import achi_parser
+        from ingest import json_stream
+
+        def parse():
+            return achi_parser.parse_achi_file(csv_path, workers)
+
+        def write(tree, path):
+            with open(path, "w") as outfile:
+                json_stream.dump(tree, outfile, indent=4)
+    else:
+        import mkh10_parser
+
+        def parse():
+            return mkh10_parser.parse_mkh10_file(csv_path, workers)
+
+        write = mkh10_parser.write_json
+
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    tree = parse()
+    parse_seconds = time.perf_counter() - started
+    parse_peak_rss = peak_rss_mb()
+    # The pool is shut down when the parse returns, so its workers are accounted for
+    worker_peak_rss = peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "output.json")
+        started = time.perf_counter()
+        write(tree, json_path)
+        write_seconds = time.perf_counter() - started
+        json_mb = os.path.getsize(json_path) / 2 ** 20
+
+    return {
+        "rows": rows,
+        "workers": workers,
+        "parse_seconds": parse_seconds,
+        "rows_per_second": rows / parse_seconds,
+        "baseline_rss_mb": baseline_rss,
+        "parse_peak_rss_mb": parse_peak_rss,
+        "parse_worker_peak_rss_mb": worker_peak_rss,
+        "json_write_seconds": write_seconds,
+        "json_size_mb": json_mb,
+    }
+
+
+def store_load_case(store_path: str) -> Dict[str, float]:
+    import achi_bot
+
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    store = achi_bot.parse_data_tree(store_path)
+    load_ms = (time.perf_counter() - started) * 1000
+    load_rss = rss_mb()
+
+    started = time.perf_counter()
+    classifiers = achi_bot.build_bot_data(store)["classifiers"]
+    bot_data_ms = (time.perf_counter() - started) * 1000
+    bot_data_rss = rss_mb()
+    result = {
+        "nodes": sum(classifier.node_count for classifier in store),
+        "load_ms": load_ms,
+        "load_rss_delta_mb": load_rss - baseline_rss,
+        "bot_data_ms": bot_data_ms,
+        "bot_data_rss_delta_mb": bot_data_rss - load_rss,
+    }
+    # Indexes of the other classifiers are built when the first chat switches to them
+    for classifier in classifiers:
+        if classifier is not classifiers.default:
+            started = time.perf_counter()
+            classifier.warm_up()
+            result[f"{classifier.name}_warm_up_ms"] = (time.perf_counter() - started) * 1000
+            result[f"{classifier.name}_warm_up_rss_delta_mb"] = rss_mb() - bot_data_rss
+            bot_data_rss = rss_mb()
+    return result
+
+
+async def _navigate(bot_data: Dict, steps: int, seed: int) -> Dict[str, Dict[str, float]]:
+    import achi_bot
+    from stubs import StubBot, StubContext, stub_message_update
+
+    navigation = bot_data["classifiers"].default.navigation
+    context = StubContext(StubBot(), bot_data)
+    rng = random.Random(seed)
+    samples: List[int] = []
+    by_depth: Dict[int, List[int]] = {}
+    node = navigation.root
+    for step in range(steps):
+        # Walk down to a page of codes, then back up to the root, and over again
+        descending = node == navigation.root or (not navigation.has_leaf_children(node) and rng.random() < 0.8)
+        text = rng.choice(navigation.child_labels(node)) if descending else achi_bot.BACK
+        update = stub_message_update(chat_id=42, message_id=step + 1, text=text)
+        started = time.perf_counter_ns()
+        await achi_bot.proceed_with_selected_option(text, update, context)
+        elapsed = time.perf_counter_ns() - started
+        node = achi_bot.current_node(context)
+        samples.append(elapsed)
+        by_depth.setdefault(navigation.depth(node), []).append(elapsed)
+
+    results = {"all": latency_summary(samples)}
+    for depth in sorted(by_depth):
+        results[f"depth_{depth}"] = latency_summary(by_depth[depth])
+    return results
+
+
+def navigation_case(store_path: str, steps: int, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    import achi_bot
+
+    bot_data = achi_bot.build_bot_data(achi_bot.parse_data_tree(store_path))
+    return asyncio.run(_navigate(bot_data, steps, seed))
+
+
+def run_isolated(function: Callable, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def count_csv_rows(csv_path: str, header_lines: int) -> int:
+    with open(csv_path, encoding="utf-8") as csv_file:
+        return sum(1 for _ in csv_file) - header_lines
+
+
+def run_suite(scales: List[int], steps: int, workers: int) -> Dict:
+    cases = {
+        "store_load": run_isolated(store_load_case, STORE_PATH),
+        "navigation": run_isolated(navigation_case, STORE_PATH, steps),
+    }
+    if os.path.exists(REAL_ACHI_CSV):
+        cases["parse/achi/real"] = run_isolated(parse_case, "achi", REAL_ACHI_CSV,
+                                                count_csv_rows(REAL_ACHI_CSV, 2), workers)
+    if os.path.exists(REAL_MKH10_CSV):
+        cases["parse/mkh10/real"] = run_isolated(parse_case, "mkh10", REAL_MKH10_CSV,
+                                                 count_csv_rows(REAL_MKH10_CSV, 1), workers)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in scales:
+            achi_csv = os.path.join(tmp_dir, f"achi-x{scale}.csv")
+            rows = write_csv(achi_csv, ACHI_HEADER, achi_rows(scale), achi_layout=True)
+            cases[f"parse/achi/x{scale}"] = run_isolated(parse_case, "achi", achi_csv, rows, workers)
+            os.remove(achi_csv)
+
+            mkh10_csv = os.path.join(tmp_dir, f"mkh10-x{scale}.csv")
+            rows = write_csv(mkh10_csv, MKH10_HEADER, mkh10_rows(scale))
+            cases[f"parse/mkh10/x{scale}"] = run_isolated(parse_case, "mkh10", mkh10_csv, rows, workers)
+            os.remove(mkh10_csv)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+
+
+def flatten(metrics: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(previous: Dict, current: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Prints the relative change of every timing, throughput and memory metric, returns regressions."""
+    old_metrics = flatten(previous["cases"])
+    new_metrics = flatten(current["cases"])
+    regressions = []
+    print(f"Compared with {previous.get('commit')}:")
+    for name, new_value in new_metrics.items():
+        old_value = old_metrics.get(name)
+        metric = name.rsplit(".", 1)[-1]
+        higher_is_better = metric in HIGHER_IS_BETTER
+        if not old_value or not (higher_is_better or metric.endswith(LOWER_IS_BETTER_SUFFIXES)):
+            continue
+        change = new_value / old_value - 1
+        regressed = -change > threshold if higher_is_better else change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name}: {old_value:.4g} -> {new_value:.4g} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--steps", type=int, default=NAVIGATION_STEPS, help="Navigation steps to replay")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Parser processes for every parse case, all cores by default")
+    parser.add_argument("--output", help="Results file, benchmarks/results/<commit>.json by default")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, args.steps, args.workers)
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+        output_file.write("\n")
+    print(json.dumps(results["cases"], indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            regressions = compare(json.load(previous_file), results)
+        if regressions:
+            sys.exit(f"{len(regressions)} metrics regressed by more than {REGRESSION_THRESHOLD:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+In-process stand-ins for the python-telegram-bot objects the handlers touch.
+
+Handlers only read a few attributes of ``Update`` and ``CallbackContext`` and await a handful of
+``Bot`` methods, so driving them through these stubs measures the handler itself without HTTP.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+
+class StubBot:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1000)
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] += 1
+        await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> SimpleNamespace:
+        await self._call("sendMessage")
+        return SimpleNamespace(message_id=next(self._message_ids), chat_id=chat_id, text=text)
+
+    async def delete_message(self, chat_id: int, message_id: int) -> bool:
+        await self._call("deleteMessage")
+        return True
+
+    async def answer_inline_query(self, inline_query_id: str, results, **kwargs) -> bool:
+        await self._call("answerInlineQuery")
+        return True
+
+
+class StubContext(SimpleNamespace):
+    def __init__(self, bot: StubBot, bot_data: Dict, chat_data: Optional[Dict] = None):
+        super().__init__(bot=bot, bot_data=bot_data, chat_data={} if chat_data is None else chat_data, args=[])
+
+
+def stub_message_update(chat_id: int, message_id: int, text: str) -> SimpleNamespace:
+    user = SimpleNamespace(id=chat_id, first_name="Benchmark", last_name=None, username=None)
+    return SimpleNamespace(
+        message=SimpleNamespace(message_id=message_id, text=text, from_user=user),
+        effective_chat=SimpleNamespace(id=chat_id),
+        callback_query=None,
+        inline_query=None,
+    )
@@ -0,0 +1,99 @@
+"""
+Synthetic classifier CSVs in the shape of the real sources, for scaling benchmarks.
+
+``scale=1`` is roughly the size of the real file, larger scales add more classes.
+"""
+import csv
+import random
+from typing import Iterator, List
+
+WORDS = [
+    "хвороба", "інфекція", "гострий", "хронічний", "ураження", "синдром", "травма", "перелом", "пухлина",
+    "запалення", "судин", "серця", "легень", "нирки", "печінки", "шкіри", "кістки", "нерва", "ока", "вуха",
+    "спричинена", "неуточнена", "інша", "вроджена", "токсична", "вторинна", "первинна", "лівого", "правого",
+    "висічення", "видалення", "пункція", "біопсія", "обстеження", "відновлення", "трансплантація", "дренування",
+]
+EN_WORDS = ["disease", "infection", "acute", "chronic", "lesion", "syndrome", "injury", "fracture", "neoplasm",
+            "unspecified", "other", "congenital", "toxic", "secondary", "primary", "left", "right", "excision"]
+
+MKH10_HEADER = ["Клас", "Опис класу", "Код блоку", "Назва блоку", "Код нозології", "Нозологія EN", "Нозологія UA",
+                "Код 4-digit", "4-digit EN", "4-digit UA", "Код 5-digit", "5-digit EN", "5-digit UA"]
+ACHI_HEADER = ["Клас", "Назва", "Вісь анатомічної локалізації", "Назва", "Вісь процедурної типології", "Назва",
+               "Вісь блоків ", "Назва", "Код", "Назва UKR", "Назва ENG"]
+
+
+def _name(rng: random.Random, words: List[str], count: int) -> str:
+    return " ".join(rng.choice(words) for _ in range(count))
+
+
+def mkh10_rows(scale: int = 1, seed: int = 0) -> Iterator[List[str]]:
+    """Rows with terminal nosologies, 4-digit leaves, 5-digit subdivisions, their mixes and duplicates."""
+    rng = random.Random(seed)
+    nosology_numbers = {}
+    for class_index in range(22 * scale):
+        letter = chr(ord("A") + class_index % 26)
+        first = nosology_numbers.get(letter, 0)
+        last = first + 12 * 8 - 1
+        class_desc = f"{_name(rng, WORDS, 3).upper()} ({letter.lower()}{first:02d}-{letter}{last:02d})"
+        for block_index in range(12):
+            block_first = first + block_index * 8
+            block_code = f"{letter}{block_first:02d}-{letter}{block_first + 7:02d}"
+            block_name = f"{_name(rng, WORDS, 3)} {block_code.lower()}"
+            for nosology_index in range(8):
+                nosology_code = f"{letter}{block_first + nosology_index:02d}"
+                nosology_en = _name(rng, EN_WORDS, 2)
+                nosology_ua = f"{_name(rng, WORDS, 2)} {nosology_code}".upper()
+                prefix = [f"Клас {class_index + 1}", class_desc, block_code, block_name,
+                          nosology_code, nosology_en, nosology_ua]
+                kind = rng.random()
+                if kind < 0.15:
+                    yield prefix + ["-", "-", "-", "-", "-", "-"]
+                    continue
+                for sub_index in range(rng.randint(3, 10)):
+                    code_4 = f"{nosology_code}.{sub_index}"
+                    name_4_en = _name(rng, EN_WORDS, 3)
+                    name_4_ua = f"{_name(rng, WORDS, 4)} ({nosology_code.lower()})"
+                    if kind > 0.8 and sub_index % 2 == 0:
+                        for five_index in range(rng.randint(1, 4)):
+                            yield prefix + [code_4, name_4_en, name_4_ua, f"{code_4}{five_index}",
+                                            rng.choice(["-", _name(rng, EN_WORDS, 2)]), _name(rng, WORDS, 5)]
+                    else:
+                        row = prefix + [code_4, name_4_en, name_4_ua, "-", "-", "-"]
+                        yield row
+                        if rng.random() < 0.05:
+                            yield row
+        nosology_numbers[letter] = last + 1
+
+
+def achi_rows(scale: int = 1, seed: int = 0) -> Iterator[List[str]]:
+    rng = random.Random(seed)
+    code = 30000
+    for class_index in range(20 * scale):
+        class_name = _name(rng, WORDS, 3).upper() + " "
+        for anatomy_index in range(6):
+            anatomy_name = _name(rng, WORDS, 3).upper() + " "
+            for typology_index in range(5):
+                typology_name = _name(rng, WORDS, 2).upper()
+                for block_index in range(3):
+                    block_name = _name(rng, WORDS, 4)
+                    for _ in range(rng.randint(1, 5)):
+                        code += 1
+                        yield [f"Клас {class_index + 1}", class_name, str(anatomy_index + 1), anatomy_name,
+                               str(typology_index + 1), typology_name, str(block_index + 1), block_name,
+                               f"{code}-{rng.randint(0, 9):02d}", _name(rng, WORDS, 5), _name(rng, EN_WORDS, 4)]
+
+
+def write_csv(path: str, header: List[str], rows, achi_layout: bool = False) -> int:
+    """Writes rows with the source delimiter, the ACHI export has two header lines and trailing separators."""
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.writer(csv_file, delimiter=";")
+        if achi_layout:
+            writer.writerow(["LEVEL 0", "", "LEVEL 1", "", "LEVEL 2", "", "LEVEL 3", "", "LEVEL 4", "", "", ""])
+            writer.writerow(header + [""])
+        else:
+            writer.writerow(header)
+        for row in rows:
+            writer.writerow(row + [""] if achi_layout else row)
+            count += 1
+    return count
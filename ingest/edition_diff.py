@@ -0,0 +1,322 @@
+"""
+Differences between two editions of a classifier tree, and patches that turn one into the other.
+
+Both editions are indexed in one pass each, and the indexes are joined by key in dict lookups, so a
+diff is linear in the size of the trees. Codes (the leaves) are keyed by their code, categories by
+the path of codes from the root (``Клас 1/1/1/1``, ``(A00-B99)/A00-A09/A01``), since category codes
+like ACHI's ``1`` repeat across the tree. A key that repeats gets ``#<n>`` appended in tree order.
+
+Codes are ``added``, ``removed``, ``renamed`` (any field other than the code changed) or ``moved``
+(to another category). Categories are ``added``, ``removed``, ``renamed`` or ``moved``. Renaming a
+category doesn't move its codes. A category is moved when its code (its children key for categories
+without one) is gone from one place and appears at another, once on each side: the old edition is
+re-keyed to the new paths of the moved categories and their subtrees before the two are joined, so
+the categories and codes under a moved category are neither removed and added nor moved themselves.
+
+A patch holds just what changed:
+
+* ``base``/``target``: digests of the trees it applies to and produces;
+* ``moved_categories``: old key -> new key of every moved category, its subtree moves with it;
+* ``removed_categories``, ``removed_codes``: keys gone from the target;
+* ``categories``: ``[children key, fields]`` of added and renamed categories;
+* ``codes``: fields of added and renamed codes;
+* ``category_layout``, ``code_layout``: child keys, in order, of every category whose categories or
+  codes changed. Moved codes are in the layouts of their old and new category.
+
+``apply_patch`` rebuilds the target tree from the base one and the patch, and checks both digests.
+
+    python3 ingest/edition_diff.py old.json new.json [patch.json]
+    python3 ingest/edition_diff.py --apply old.json patch.json new.json
+"""
+import hashlib
+import json
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+PATCH_VERSION = 2
+ROOT = ""
+PATH_SEPARATOR = "/"
+DIGEST_LENGTH = 16
+
+
+def tree_digest(tree: Dict) -> str:
+    data = json.dumps(tree, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+
+
+def _unique(key: str, seen: Dict[str, int]) -> str:
+    count = seen.get(key, 0)
+    seen[key] = count + 1
+    return f"{key}#{count + 1}" if count else key
+
+
+@dataclass
+class Edition:
+    """Hash indexes of one edition, every node by its key."""
+    categories: Dict[str, Dict] = field(default_factory=dict)  # key -> fields without children
+    category_keys: Dict[str, str] = field(default_factory=dict)  # key -> key in the parent's children
+    category_labels: Dict[str, str] = field(default_factory=dict)  # key -> code, or children key without one
+    category_parents: Dict[str, str] = field(default_factory=dict)
+    category_children: Dict[str, List[str]] = field(default_factory=dict)  # categories holding categories
+    codes: Dict[str, Dict] = field(default_factory=dict)
+    code_parents: Dict[str, str] = field(default_factory=dict)
+    code_children: Dict[str, List[str]] = field(default_factory=dict)  # categories holding codes
+
+    @classmethod
+    def index(cls, tree: Dict) -> "Edition":
+        edition = cls()
+        code_seen: Dict[str, int] = {}
+        stack = [(ROOT, None, ROOT, tree)]
+        while stack:
+            key, parent, children_key, node = stack.pop()
+            edition.categories[key] = {name: value for name, value in node.items() if name != "children"}
+            edition.category_keys[key] = children_key
+            edition.category_labels[key] = node.get("code") or node.get("clazz") or children_key
+            if parent is not None:
+                edition.category_parents[key] = parent
+            children = node.get("children")
+            if isinstance(children, list):
+                child_codes = edition.code_children[key] = []
+                for leaf in children:
+                    code = _unique(leaf.get("code") or leaf.get("name_ua") or "", code_seen)
+                    edition.codes[code] = leaf
+                    edition.code_parents[code] = key
+                    child_codes.append(code)
+                continue
+            sibling_seen: Dict[str, int] = {}
+            child_categories = edition.category_children[key] = []
+            pending: List[Tuple[str, Optional[str], str, Dict]] = []
+            for child_key, child in (children or {}).items():
+                label = child.get("code") or child.get("clazz") or child_key
+                child_category = _unique(f"{key}{PATH_SEPARATOR}{label}" if key else label, sibling_seen)
+                child_categories.append(child_category)
+                pending.append((child_category, key, child_key, child))
+            # Reversed so that the tree is walked in order and repeated codes are numbered in that order
+            stack.extend(reversed(pending))
+        return edition
+
+    def rekey(self, moves: Dict[str, str]) -> None:
+        """Renames the keys of moved categories (old key -> new key) and of everything under them."""
+        if not moves:
+            return
+
+        def moved(key: str) -> str:
+            end = len(key)
+            # The longest moved prefix wins, a category never moves into its own subtree
+            while end > 0:
+                prefix = key[:end]
+                if prefix in moves:
+                    return moves[prefix] + key[end:]
+                end = key.rfind(PATH_SEPARATOR, 0, end)
+            return key
+
+        for index in (self.categories, self.category_keys, self.category_labels):
+            rekeyed = {moved(key): value for key, value in index.items()}
+            index.clear()
+            index.update(rekeyed)
+        self.category_parents = {moved(key): moved(parent) for key, parent in self.category_parents.items()}
+        self.category_children = {moved(key): [moved(child) for child in children]
+                                  for key, children in self.category_children.items()}
+        self.code_children = {moved(key): children for key, children in self.code_children.items()}
+        self.code_parents = {code: moved(parent) for code, parent in self.code_parents.items()}
+
+    def path(self, category: str) -> List[str]:
+        """Names of the categories from the first level down to ``category``."""
+        names = []
+        while category != ROOT:
+            names.append(self.categories[category].get("name_ua") or self.category_keys[category])
+            category = self.category_parents[category]
+        return names[::-1]
+
+
+@dataclass
+class EditionDiff:
+    old: Edition
+    new: Edition
+    base: str
+    target: str
+    added_codes: List[str]
+    removed_codes: List[str]
+    renamed_codes: List[str]
+    moved_codes: List[str]
+    added_categories: List[str]
+    removed_categories: List[str]
+    renamed_categories: List[str]
+    moved_categories: Dict[str, str]  # old key -> new key, ``old`` is already re-keyed
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {name: len(getattr(self, name)) for name in (
+            "added_codes", "removed_codes", "renamed_codes", "moved_codes",
+            "added_categories", "removed_categories", "renamed_categories", "moved_categories")}
+
+    def report(self) -> List[str]:
+        old, new = self.old, self.new
+
+        def code_line(edition: Edition, code: str) -> str:
+            leaf = edition.codes[code]
+            return f"{leaf.get('code', '')} {leaf.get('name_ua', '')} ({' / '.join(edition.path(edition.code_parents[code]))})"
+
+        lines = [f"+ {code_line(new, code)}" for code in self.added_codes]
+        lines += [f"- {code_line(old, code)}" for code in self.removed_codes]
+        for code in self.renamed_codes:
+            lines.append(f"~ {old.codes[code].get('code', '')} {old.codes[code].get('name_ua', '')} -> "
+                         f"{new.codes[code].get('name_ua', '')}")
+        for code in self.moved_codes:
+            lines.append(f"> {new.codes[code].get('code', '')} {' / '.join(old.path(old.code_parents[code]))} -> "
+                         f"{' / '.join(new.path(new.code_parents[code]))}")
+        lines += [f"+ {' / '.join(new.path(category))}" for category in self.added_categories]
+        lines += [f"- {' / '.join(old.path(category))}" for category in self.removed_categories]
+        lines += [f"~ {' / '.join(old.path(category))} -> {new.categories[category].get('name_ua', '')}"
+                  for category in self.renamed_categories]
+        lines += [f"> {' / '.join(old.path(category))} -> {' / '.join(new.path(category))}"
+                  for category in self.moved_categories.values()]
+        return lines
+
+    def patch(self) -> Dict:
+        old, new = self.old, self.new
+        changed_categories = self.added_categories + self.renamed_categories
+        category_layout = {category: children for category, children in new.category_children.items()
+                           if old.category_children.get(category) != children}
+        code_layout = {category: children for category, children in new.code_children.items()
+                       if old.code_children.get(category) != children}
+        return {
+            "version": PATCH_VERSION,
+            "base": self.base,
+            "target": self.target,
+            "moved_categories": self.moved_categories,
+            "removed_categories": self.removed_categories,
+            "removed_codes": self.removed_codes,
+            "categories": {category: [new.category_keys[category], new.categories[category]]
+                           for category in changed_categories},
+            "codes": {code: new.codes[code] for code in self.added_codes + self.renamed_codes},
+            "category_layout": category_layout,
+            "code_layout": code_layout,
+        }
+
+
+def _category_moves(old: Edition, new: Edition) -> Dict[str, str]:
+    """Old key -> new key of categories whose label left one place and appeared at exactly one other."""
+    removed = [category for category in old.categories if category not in new.categories]
+    added = [category for category in new.categories if category not in old.categories]
+    removed_labels = Counter(old.category_labels[category] for category in removed)
+    added_by_label: Dict[str, List[str]] = {}
+    for category in added:
+        added_by_label.setdefault(new.category_labels[category], []).append(category)
+
+    moves: Dict[str, str] = {}
+    moved_to = set()
+    for category in removed:
+        # Keys are walked in tree order, the subtree of a moved category is re-keyed with it
+        parent = old.category_parents[category]
+        while parent != ROOT and parent not in moves:
+            parent = old.category_parents[parent]
+        if parent in moves:
+            continue
+        label = old.category_labels[category]
+        candidates = added_by_label.get(label, [])
+        if removed_labels[label] != 1 or len(candidates) != 1 or candidates[0] in moved_to:
+            continue
+        moves[category] = candidates[0]
+        moved_to.add(candidates[0])
+    return moves
+
+
+def diff(old_tree: Dict, new_tree: Dict) -> EditionDiff:
+    old, new = Edition.index(old_tree), Edition.index(new_tree)
+    moved_categories = _category_moves(old, new)
+    old.rekey(moved_categories)
+    common_codes = [code for code in new.codes if code in old.codes]
+    common_categories = [category for category in new.categories if category in old.categories]
+    return EditionDiff(
+        old=old,
+        new=new,
+        base=tree_digest(old_tree),
+        target=tree_digest(new_tree),
+        added_codes=[code for code in new.codes if code not in old.codes],
+        removed_codes=[code for code in old.codes if code not in new.codes],
+        renamed_codes=[code for code in common_codes if old.codes[code] != new.codes[code]],
+        moved_codes=[code for code in common_codes if old.code_parents[code] != new.code_parents[code]],
+        added_categories=[category for category in new.categories if category not in old.categories],
+        removed_categories=[category for category in old.categories if category not in new.categories],
+        renamed_categories=[category for category in common_categories
+                            if old.categories[category] != new.categories[category]
+                            or old.category_keys[category] != new.category_keys[category]],
+        moved_categories=moved_categories,
+    )
+
+
+def apply_patch(tree: Dict, patch: Dict) -> Dict:
+    """The target edition of the patch, built from its base edition. Raises ValueError for another base."""
+    if patch.get("version") != PATCH_VERSION:
+        raise ValueError(f"Unsupported patch version {patch.get('version')}")
+    if tree_digest(tree) != patch["base"]:
+        raise ValueError(f"The patch applies to edition {patch['base']}, not {tree_digest(tree)}")
+    edition = Edition.index(tree)
+    edition.rekey(patch["moved_categories"])
+    categories, category_keys = edition.categories, edition.category_keys
+    codes = edition.codes
+    category_children, code_children = edition.category_children, edition.code_children
+    for category in patch["removed_categories"]:
+        del categories[category]
+        category_children.pop(category, None)
+        code_children.pop(category, None)
+    for code in patch["removed_codes"]:
+        del codes[code]
+    for category, (children_key, fields) in patch["categories"].items():
+        categories[category] = fields
+        category_keys[category] = children_key
+    codes.update(patch["codes"])
+    for category, children in patch["category_layout"].items():
+        category_children[category] = children
+        code_children.pop(category, None)
+    for category, children in patch["code_layout"].items():
+        code_children[category] = children
+        category_children.pop(category, None)
+
+    def build(category: str) -> Dict:
+        node = dict(categories[category])
+        if category in code_children:
+            node["children"] = [codes[code] for code in code_children[category]]
+        elif category in category_children or category == ROOT:
+            node["children"] = {category_keys[child]: build(child) for child in category_children.get(category, [])}
+        return node
+
+    result = build(ROOT)
+    if tree_digest(result) != patch["target"]:
+        raise ValueError("The patched edition doesn't match the patch target")
+    return result
+
+
+def dump_patch(patch: Dict) -> bytes:
+    return json.dumps(patch, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _load(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) == 5 and argv[1] == "--apply":
+        result = apply_patch(_load(argv[2]), _load(argv[3]))
+        with open(argv[4], "w", encoding="utf-8") as output:
+            json.dump(result, output, ensure_ascii=False, indent=2)
+        return
+    if len(argv) not in (3, 4):
+        print(f"Usage: {argv[0]} <old.json> <new.json> [<patch.json>]\n"
+              f"       {argv[0]} --apply <old.json> <patch.json> <new.json>")
+        sys.exit(1)
+    edition_diff = diff(_load(argv[1]), _load(argv[2]))
+    for line in edition_diff.report():
+        print(line)
+    print(", ".join(f"{name.replace('_', ' ')}: {count}" for name, count in edition_diff.counts.items()))
+    if len(argv) == 4:
+        with open(argv[3], "wb") as output:
+            output.write(dump_patch(edition_diff.patch()))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,76 @@
+"""
+Incremental JSON serializer for classifier trees.
+
+Walks parser dataclasses (``DataTree``, ``RecordLevel*``) and plain dicts/lists directly and
+writes the text in small chunks, so serializing never holds a copy of the tree or the whole
+output string. The output is identical to ``json.dumps(tree, indent=indent, ensure_ascii=False)``
+(with dataclasses serialized like ``dataclasses.asdict``), or uses the most compact separators
+when ``indent`` is None.
+"""
+import dataclasses
+from json.encoder import encode_basestring
+from typing import IO, Iterator, Optional
+
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+def _items(obj):
+    if dataclasses.is_dataclass(obj):
+        return ((field.name, getattr(obj, field.name)) for field in dataclasses.fields(obj))
+    return obj.items()
+
+
+def _encode_scalar(value) -> str:
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_json(obj, indent: Optional[int] = None, level: int = 0) -> Iterator[str]:
+    if isinstance(obj, (dict, list)) or dataclasses.is_dataclass(obj):
+        is_list = isinstance(obj, list)
+        items = obj if is_list else list(_items(obj))
+        opening, closing = ("[", "]") if is_list else ("{", "}")
+        if not items:
+            yield opening + closing
+            return
+        if indent is None:
+            separator, key_separator, closing_indent = ",", ":", ""
+        else:
+            separator = ",\n" + " " * (indent * (level + 1))
+            key_separator = ": "
+            closing_indent = "\n" + " " * (indent * level)
+            opening += separator[1:]
+        yield opening
+        for index, item in enumerate(items):
+            if index:
+                yield separator
+            if not is_list:
+                key, item = item
+                yield encode_basestring(key) + key_separator
+            yield from iter_json(item, indent, level + 1)
+        yield closing_indent + closing
+    else:
+        yield _encode_scalar(obj)
+
+
+def dump(obj, output: IO[str], indent: Optional[int] = None) -> None:
+    """Writes ``obj`` to a text file, buffering chunks up to WRITE_BUFFER_SIZE characters."""
+    buffer = []
+    buffered = 0
+    for chunk in iter_json(obj, indent):
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= WRITE_BUFFER_SIZE:
+            output.write("".join(buffer))
+            buffer.clear()
+            buffered = 0
+    output.write("".join(buffer))
@@ -0,0 +1,132 @@
+"""
+Ingestion manifest for incremental data regeneration.
+
+For every generated target the manifest records content hashes of its input files, of the code
+that normalizes and serializes the data ("rules"), of each class worth of input rows and of the
+produced outputs. A parser asks for a plan before building:
+
+* ``skip``    — inputs, rules and outputs are unchanged, nothing is written;
+* ``partial`` — only some classes changed, just their rows are re-parsed and the rebuilt class
+  subtrees are spliced into the existing output;
+* ``full``    — anything else (first run, rules changed, outputs missing or edited by hand).
+"""
+import hashlib
+import inspect
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+MANIFEST_VERSION = 1
+SKIP = "skip"
+PARTIAL = "partial"
+FULL = "full"
+# Re-parsing more than this share of classes is no cheaper than a full rebuild
+MAX_PARTIAL_SHARE = 0.5
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_digest(*objects) -> str:
+    """Hash of the source code of functions, classes or modules that define how outputs are produced."""
+    digest = hashlib.sha256()
+    for obj in objects:
+        digest.update(inspect.getsource(obj).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def class_digests(rows: Iterable[List[str]], class_column: int = 0) -> "OrderedDict[str, str]":
+    """Digest of the rows of each class, in order of first appearance."""
+    digests: "OrderedDict[str, hashlib._Hash]" = OrderedDict()
+    for row in rows:
+        clazz = row[class_column].strip()
+        digest = digests.get(clazz)
+        if digest is None:
+            digest = digests[clazz] = hashlib.sha256()
+        digest.update("\x1f".join(row).encode("utf-8"))
+        digest.update(b"\x1e")
+    return OrderedDict((clazz, digest.hexdigest()) for clazz, digest in digests.items())
+
+
+def _class_id(node) -> str:
+    return node["clazz"] if isinstance(node, dict) else node.clazz
+
+
+def splice_classes(existing_children: Dict, rebuilt_children: Dict, class_order: Iterable[str],
+                   changed_classes: Set[str]) -> "OrderedDict":
+    """
+    Merges class subtrees keyed by name into one children mapping ordered like ``class_order``.
+
+    Changed classes come from the rebuilt tree, the rest from the existing output. Classes that no
+    longer appear in ``class_order`` are dropped.
+    """
+    existing_by_class = {_class_id(node): (key, node) for key, node in existing_children.items()}
+    rebuilt_by_class = {_class_id(node): (key, node) for key, node in rebuilt_children.items()}
+    children = OrderedDict()
+    for clazz in class_order:
+        key, node = (rebuilt_by_class if clazz in changed_classes else existing_by_class)[clazz]
+        children[key] = node
+    return children
+
+
+@dataclass
+class RebuildPlan:
+    mode: str
+    changed_classes: Set[str] = field(default_factory=set)
+
+
+class Manifest:
+    def __init__(self, path: str, targets: Optional[Dict] = None):
+        self.path = path
+        self.targets = targets or {}
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, "r", encoding="utf-8") as manifest_file:
+            data = json.load(manifest_file)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data["targets"])
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump({"version": MANIFEST_VERSION, "targets": self.targets}, manifest_file,
+                      indent=2, ensure_ascii=False, sort_keys=True)
+            manifest_file.write("\n")
+        os.replace(tmp_path, self.path)
+
+    def plan(self, target: str, inputs: Dict[str, str], rules: str, classes: "OrderedDict[str, str]",
+             outputs: List[str], force: bool = False) -> RebuildPlan:
+        entry = self.targets.get(target)
+        if force or entry is None or entry["rules"] != rules or sorted(entry["outputs"]) != sorted(outputs):
+            return RebuildPlan(FULL)
+        for output in outputs:
+            if not os.path.exists(output) or file_digest(output) != entry["outputs"][output]:
+                return RebuildPlan(FULL)
+        if entry["inputs"] == inputs:
+            return RebuildPlan(SKIP)
+
+        previous_classes = dict(entry["classes"])
+        changed_classes = {clazz for clazz, digest in classes.items() if previous_classes.get(clazz) != digest}
+        if len(changed_classes) > MAX_PARTIAL_SHARE * len(classes):
+            return RebuildPlan(FULL)
+        return RebuildPlan(PARTIAL, changed_classes)
+
+    def record(self, target: str, inputs: Dict[str, str], rules: str, classes: "OrderedDict[str, str]",
+               outputs: List[str]) -> None:
+        self.targets[target] = {
+            "inputs": inputs,
+            "rules": rules,
+            "classes": [[clazz, digest] for clazz, digest in classes.items()],
+            "outputs": {output: file_digest(output) for output in outputs},
+        }
@@ -0,0 +1,244 @@
+"""
+Sharded data bundle of a classifier for the mobile app.
+
+The app bundles a whole classifier tree as one JSON file and searches it by walking every node.
+A bundle splits the tree so that the app only loads what it shows:
+
+* ``manifest.json``   — the classes (the first screen) with the file, size, digest and leaf count
+  of their shard, and the search index file;
+* ``classes/<n>.json`` — the subtree of class ``n`` in the app's ``CategoryNode`` shape;
+* ``search.json``     — a precomputed search index, so that a query never walks the tree:
+
+  - ``categories``: ``[parent, key]`` of every category node, classes first in manifest order
+    (parent -1); keys are the keys of the ``children`` objects, the path of a leaf is the chain
+    of keys from its category up to a class;
+  - ``leaves``: ``[category, code, name_ua, name_en]`` of every leaf in tree order, enough to
+    list a result before its shard is loaded and to check a match;
+  - ``trigrams``: sorted character trigrams of the lowercased leaf codes and names;
+  - ``postings``: leaf ids of every trigram, ascending and delta-encoded.
+
+Search keeps the app's semantics: a leaf matches when the lowercased, trimmed query is a substring
+of its lowercased code, ``name_ua`` or ``name_en``, and results come in tree order. The leaves that
+have every trigram of the query are the candidates, each is then checked against its texts. A query
+shorter than a trigram is checked against the leaves in order, it fills the result limit within the
+first few. ``search`` is the reference implementation of the lookup.
+
+    python3 ingest/mobile_bundle.py achi-mobile/data/achi.json achi-mobile/data/achi
+"""
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+# The bundle splits text like the bot's inline search, the shared normalizers live with the bot
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'achi'))
+from achi_text import trigrams  # noqa: E402
+
+BUNDLE_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+SEARCH_FILE = "search.json"
+CLASSES_DIR = "classes"
+MAX_RESULTS = 50
+# Digests only tell the app whether a cached shard is stale
+DIGEST_LENGTH = 16
+
+
+def leaf_texts(leaf: List) -> List[str]:
+    """The lowercased texts a query is matched against, from a ``leaves`` entry."""
+    return [text.lower() for text in leaf[1:]]
+
+
+def normalize_query(query: str) -> str:
+    return query.lower().strip()
+
+
+def dump_compact(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def delta_encode(values: List[int]) -> List[int]:
+    return [value - previous for previous, value in zip([0] + values, values)]
+
+
+def delta_decode(deltas: List[int]) -> List[int]:
+    values = []
+    total = 0
+    for delta in deltas:
+        total += delta
+        values.append(total)
+    return values
+
+
+def build_search_index(classes: List[Tuple[str, Dict]]) -> Dict:
+    categories: List[List] = []
+    leaves: List[List] = []
+    postings: Dict[str, List[int]] = {}
+
+    def walk(node: Dict, category: int) -> None:
+        children = node["children"]
+        if isinstance(children, list):
+            for leaf in children:
+                leaf_id = len(leaves)
+                entry = [category, leaf.get("code") or "", leaf.get("name_ua") or "", leaf.get("name_en") or ""]
+                leaves.append(entry)
+                # Trigrams of each text on its own, a query never matches across two of them
+                for trigram in set().union(*map(trigrams, leaf_texts(entry))):
+                    postings.setdefault(trigram, []).append(leaf_id)
+            return
+        for key, child in children.items():
+            categories.append([category, key])
+            walk(child, len(categories) - 1)
+
+    # Classes take the first category ids so that a class id is also its shard number
+    categories.extend([-1, key] for key, _ in classes)
+    for class_id, (_, class_node) in enumerate(classes):
+        walk(class_node, class_id)
+
+    index_trigrams = sorted(postings)
+    return {
+        "version": BUNDLE_VERSION,
+        "categories": categories,
+        "leaves": leaves,
+        "trigrams": index_trigrams,
+        "postings": [delta_encode(postings[trigram]) for trigram in index_trigrams],
+    }
+
+
+def _file_entry(path: str, data: bytes) -> Dict:
+    return {"file": path, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]}
+
+
+def build_bundle(name: str, tree: Dict) -> Dict[str, bytes]:
+    """File contents of the bundle by path relative to the bundle directory."""
+    classes = list(tree["children"].items())
+    files: Dict[str, bytes] = {}
+    manifest_classes = []
+    for index, (key, class_node) in enumerate(classes):
+        path = f"{CLASSES_DIR}/{index}.json"
+        files[path] = dump_compact(class_node)
+        entry = {"key": key}
+        entry.update((field, value) for field, value in class_node.items() if field != "children")
+        entry.update(_file_entry(path, files[path]))
+        entry["leaf_count"] = _leaf_count(class_node)
+        manifest_classes.append(entry)
+
+    files[SEARCH_FILE] = dump_compact(build_search_index(classes))
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "classifier": name,
+        "leaf_count": sum(entry["leaf_count"] for entry in manifest_classes),
+        "search": _file_entry(SEARCH_FILE, files[SEARCH_FILE]),
+        "classes": manifest_classes,
+    }
+    files[MANIFEST_FILE] = dump_compact(manifest)
+    return files
+
+
+def _leaf_count(node: Dict) -> int:
+    children = node["children"]
+    if isinstance(children, list):
+        return len(children)
+    return sum(_leaf_count(child) for child in children.values())
+
+
+def write_bundle(name: str, tree: Dict, output_dir: str) -> Dict[str, bytes]:
+    """Writes the bundle into a sibling directory and swaps it in, stale shards don't survive."""
+    files = build_bundle(name, tree)
+    tmp_dir = f"{output_dir.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, CLASSES_DIR))
+    for path, data in files.items():
+        with open(os.path.join(tmp_dir, path), "wb") as output:
+            output.write(data)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return files
+
+
+@dataclass
+class SearchResult:
+    leaf_id: int
+    code: str
+    name_ua: str
+    path: List[str]  # keys from the class down to the leaf's category, like SearchResult.path in the app
+    shard: int  # class number, classes/<shard>.json holds the full leaf
+
+
+class BundleIndex:
+    """The lookup the app is expected to do over ``search.json``."""
+
+    def __init__(self, index: Dict):
+        if index.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported bundle version {index.get('version')}")
+        self.categories = index["categories"]
+        self.leaves = index["leaves"]
+        self.postings = dict(zip(index["trigrams"], index["postings"]))
+
+    @classmethod
+    def load(cls, path: str) -> "BundleIndex":
+        with open(path, "r", encoding="utf-8") as index_file:
+            return cls(json.load(index_file))
+
+    def _candidates(self, query: str) -> Iterable[int]:
+        """Leaves having the query's rarest trigram in ascending order, all of them for a shorter query.
+
+        The leaves are checked against the query anyway and the search stops at the result limit,
+        so decoding the other posting lists to intersect them costs more than it saves.
+        """
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return range(len(self.leaves))
+        postings = [self.postings.get(trigram) for trigram in query_trigrams]
+        if None in postings:
+            return []
+        return itertools.accumulate(min(postings, key=len))
+
+    def path(self, category: int) -> List[str]:
+        keys = []
+        while category != -1:
+            category, key = self.categories[category]
+            keys.append(key)
+        return keys[::-1]
+
+    def class_of(self, category: int) -> int:
+        """The class (and shard) number of a category."""
+        while self.categories[category][0] != -1:
+            category = self.categories[category][0]
+        return category
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> List[SearchResult]:
+        """Leaves whose code or a name contains the query, in tree order, like ``searchProcedures`` in the app."""
+        query = normalize_query(query)
+        results: List[SearchResult] = []
+        if not query:
+            return results
+        for leaf_id in self._candidates(query):
+            leaf = self.leaves[leaf_id]
+            if any(query in text for text in leaf_texts(leaf)):
+                category, code, name_ua, _ = leaf
+                results.append(SearchResult(leaf_id, code, name_ua, self.path(category), self.class_of(category)))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) not in (3, 4):
+        print(f"Usage: {argv[0]} <tree.json> <output dir> [<classifier name>]")
+        sys.exit(1)
+    with open(argv[1], "r", encoding="utf-8") as tree_file:
+        tree = json.load(tree_file)
+    name = argv[3] if len(argv) == 4 else os.path.splitext(os.path.basename(argv[1]))[0]
+    files = write_bundle(name, tree, argv[2])
+    shards = [size for path, size in ((path, len(data)) for path, data in files.items())
+              if path.startswith(CLASSES_DIR)]
+    print(f"{name}: {len(shards)} class shards up to {max(shards, default=0) / 1024:.0f} KB, "
+          f"search index {len(files[SEARCH_FILE]) / 1024:.0f} KB, manifest {len(files[MANIFEST_FILE]) / 1024:.1f} KB")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,103 @@
+"""
+Parallel ingestion of classifier CSVs.
+
+The main process only splits the file into chunks of ``CHUNK_ROWS`` lines, cut at record
+boundaries. A worker process parses the CSV of a chunk, normalizes the cells and builds the
+subtree of just those rows. The parsers memoize their normalizers and a worker keeps its caches
+for its lifetime, so a class or block name repeated over thousands of rows is normalized once per
+worker (and pickled back once per chunk). Subtrees come back in chunk order and are merged as if
+their rows had been read one after another, so the result is exactly the tree a single pass builds.
+
+A parser provides the functions:
+
+* ``build_chunk(rows)`` — the subtree of the rows;
+* ``merge(tree, later)`` — adds a subtree built from later rows to the tree, returns the tree;
+* optionally ``pack(tree)`` and ``unpack(packed)`` — the subtree as nested tuples and back.
+  Unpickling a subtree is work the main process can't share, and tuples of strings unpickle
+  several times faster than dataclasses or dicts.
+
+Functions that run in workers (``build_chunk``, ``pack``) must be defined at module level.
+
+A file that fits into one chunk is built in-process, the pool only pays off on large files.
+"""
+import csv
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial, reduce
+from itertools import chain, islice
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional, TypeVar
+
+CHUNK_ROWS = 5000
+# Chunks submitted ahead per worker: keeps workers busy without reading the whole file into memory
+CHUNKS_PER_WORKER = 2
+DELIMITER = ';'
+
+Tree = TypeVar("Tree")
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def workers_option(argv: List[str]) -> Optional[int]:
+    """Value of the ``--workers=N`` command line option, None (all cores) when it's absent."""
+    for argument in argv:
+        if argument.startswith("--workers="):
+            return int(argument.split("=", 1)[1])
+    return None
+
+
+def line_chunks(csv_path: str, skip_lines: int = 0, chunk_rows: int = CHUNK_ROWS,
+                encoding: Optional[str] = None) -> Iterator[List[str]]:
+    """Lines of the file after the header, in chunks that never split a quoted multi-line cell."""
+    with open(csv_path, 'r', encoding=encoding) as csv_file:
+        for _ in range(skip_lines):
+            next(csv_file, None)
+        chunk: List[str] = []
+        quotes = 0
+        for line in csv_file:
+            chunk.append(line)
+            quotes += line.count('"')
+            if len(chunk) >= chunk_rows and quotes % 2 == 0:
+                yield chunk
+                chunk = []
+                quotes = 0
+        if chunk:
+            yield chunk
+
+
+def build_lines(build_chunk: Callable[[Iterable[List[str]]], Tree], pack: Optional[Callable[[Tree], Any]],
+                min_columns: int, lines: Iterable[str]):
+    """Runs in a worker: the subtree of a chunk of lines, rows shorter than min_columns are skipped."""
+    rows = csv.reader(lines, delimiter=DELIMITER)
+    tree = build_chunk(row for row in rows if len(row) >= min_columns)
+    return tree if pack is None else pack(tree)
+
+
+def map_ordered(executor: Executor, function: Callable, items: Iterable, in_flight: int) -> Iterator:
+    """Like ``executor.map``, but submits at most ``in_flight`` items ahead of the consumer."""
+    pending: Deque = deque()
+    for item in items:
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def build_file(csv_path: str, build_chunk: Callable[[Iterable[List[str]]], Tree], merge: Callable[[Tree, Tree], Tree],
+               workers: Optional[int] = None, skip_lines: int = 0, min_columns: int = 0,
+               encoding: Optional[str] = None, pack: Optional[Callable[[Tree], Any]] = None,
+               unpack: Optional[Callable[[Any], Tree]] = None, chunk_rows: int = CHUNK_ROWS) -> Tree:
+    """Builds the tree of a CSV with ``workers`` processes, all cores by default."""
+    workers = default_workers() if workers is None else workers
+    chunks = line_chunks(csv_path, skip_lines, chunk_rows, encoding)
+    head = list(islice(chunks, 2))
+    chunks = chain(head, chunks)
+    if workers <= 1 or len(head) < 2:
+        return build_lines(build_chunk, None, min_columns, chain.from_iterable(chunks))
+    build = partial(build_lines, build_chunk, pack, min_columns)
+    with ProcessPoolExecutor(workers) as executor:
+        subtrees = map_ordered(executor, build, chunks, workers * CHUNKS_PER_WORKER)
+        return reduce(merge, subtrees if unpack is None else map(unpack, subtrees))
@@ -0,0 +1,138 @@
+"""
+SQLite export of classifier trees.
+
+The database answers single questions (children of a node, a code, a text search) without loading
+the whole tree, see ``achi/achi_sqlite.py`` for the queries. One database holds any number of
+classifiers:
+
+* ``classifiers`` — name and root node of every classifier;
+* ``nodes``       — every node with its parent, position among the siblings, depth and the
+  materialized path of node ids from the root (``/1/4/17/``), which selects a subtree with a
+  prefix match. Ids are assigned in breadth-first order like in the binary store, so
+  ``id - root_id`` of a node is its id in ``achi/data/achi.bin``;
+* ``leaves``      — leaf codes keyed by their normalized form (``A41.50`` -> ``A4150``);
+* ``leaves_fts``  — FTS5 index over ``name_ua`` and ``name_en`` of the leaves, its content is
+  read from ``nodes``.
+
+The database is generated and not committed. ``meta`` records the digest of the output it was
+exported with (``source``), so the parsers export it again when it's missing or stale.
+"""
+import json
+import os
+import sqlite3
+import sys
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# The bot normalizes typed codes with the same function, it ships only the achi directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'achi'))
+from achi_text import node_fields, normalize_code  # noqa: E402
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE classifiers (name TEXT PRIMARY KEY, root_id INTEGER NOT NULL, position INTEGER NOT NULL);
+CREATE TABLE nodes (
+    id INTEGER PRIMARY KEY,
+    classifier TEXT NOT NULL,
+    parent_id INTEGER,
+    position INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    name_ua TEXT NOT NULL,
+    name_en TEXT NOT NULL,
+    path TEXT NOT NULL,
+    is_leaf INTEGER NOT NULL
+);
+CREATE TABLE leaves (node_id INTEGER PRIMARY KEY, classifier TEXT NOT NULL, code_key TEXT NOT NULL);
+CREATE VIRTUAL TABLE leaves_fts USING fts5(
+    name_ua, name_en, content='nodes', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+);
+"""
+# Created after the rows are inserted, which is faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX nodes_children ON nodes (parent_id, position);
+CREATE INDEX nodes_path ON nodes (path);
+CREATE INDEX leaves_code ON leaves (code_key, classifier);
+"""
+
+
+def _node_rows(name: str, tree, first_id: int) -> Iterator[Tuple]:
+    """Rows of the nodes table in breadth-first order, the root gets first_id."""
+    queue = deque([(tree, None, 0, 0, "/")])
+    node_id = first_id
+    while queue:
+        node, parent_id, position, depth, parent_path = queue.popleft()
+        code, name_ua, name_en, children = node_fields(node)
+        path = f"{parent_path}{node_id}/"
+        for child_position, child in enumerate(children or ()):
+            queue.append((child, node_id, child_position, depth + 1, path))
+        yield node_id, name, parent_id, position, depth, code, name_ua, name_en, path, int(children is None)
+        node_id += 1
+
+
+def build_database(trees: Dict[str, object], path: str, source: str = "") -> None:
+    connection = sqlite3.connect(path)
+    try:
+        # A half-written file is replaced anyway, durability only slows the build down
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+        connection.execute("INSERT INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        connection.execute("INSERT INTO meta VALUES ('source', ?)", (source,))
+        first_id = 1
+        for position, (name, tree) in enumerate(trees.items()):
+            connection.execute("INSERT INTO classifiers VALUES (?, ?, ?)", (name, first_id, position))
+            rows = list(_node_rows(name, tree, first_id))
+            connection.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.executemany("INSERT INTO leaves VALUES (?, ?, ?)",
+                                   ((row[0], name, normalize_code(row[5])) for row in rows if row[9]))
+            first_id += len(rows)
+        connection.execute("INSERT INTO leaves_fts (rowid, name_ua, name_en) "
+                           "SELECT id, name_ua, name_en FROM nodes WHERE is_leaf")
+        connection.execute("INSERT INTO leaves_fts (leaves_fts) VALUES ('optimize')")
+        connection.executescript(INDEXES)
+        connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def write_database(trees: Dict[str, object], path: str, source: str = "") -> None:
+    """Builds the database next to the path and replaces it atomically, readers keep the previous file."""
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    build_database(trees, tmp_path, source)
+    os.replace(tmp_path, path)
+
+
+def database_source(path: str) -> Optional[str]:
+    """The source digest the database at path was exported with, None when there is no readable database."""
+    if not os.path.exists(path):
+        return None
+    try:
+        connection = sqlite3.connect(path)
+        try:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row is not None else None
+
+
+def main(argv: List[str]) -> None:
+    if len(argv) < 3 or not all("=" in argument for argument in argv[2:]):
+        print(f"Usage: {argv[0]} <output.sqlite> <name>=<tree.json> [<name>=<tree.json> ...]")
+        sys.exit(1)
+    trees = {}
+    for argument in argv[2:]:
+        name, tree_path = argument.split("=", 1)
+        with open(tree_path, "r", encoding="utf-8") as tree_file:
+            trees[name] = json.load(tree_file)
+    write_database(trees, argv[1])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
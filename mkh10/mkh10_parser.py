@@ -1,30 +1,100 @@
 import csv
 import json
+import os
 import re
+import sys
 from collections import OrderedDict
-
-
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+# Shared ingestion helpers live in the repository root package, the normalizers they share with the bot in achi/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'achi'))
+import achi_text  # noqa: E402
+from ingest import json_stream, pipeline, sqlite_export  # noqa: E402
+from ingest.manifest import PARTIAL, SKIP, Manifest, class_digests, file_digest, source_digest, \
+    splice_classes  # noqa: E402
+
+CSV_PATH = '../mkh10-data/nk-025-2021.csv'
+OUTPUT_PATH = 'data/mkh10.json'
+SQLITE_PATH = 'data/mkh10.sqlite'
+MANIFEST_PATH = 'ingest-manifest.json'
+MANIFEST_TARGET = 'mkh10'
+MIN_COLUMNS = 13
+
+
+# ICD code ranges like (A00-B99), (H00-H59)
+CODE_RANGE_PATTERN = re.compile(r'\(([a-z]\d{2})\s*[-–]\s*([a-z]\d{2})')
+# Single codes and complex ranges like (U50 –U73, U90, V00-Y98)
+SINGLE_CODE_PATTERN = re.compile(r'(?<=[\(,\s])([a-z])(\d{2})')
+# Class, block and nosology names repeat on every row of their subtree
+NAME_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
 def smart_capitalize(text: str) -> str:
     """Capitalize first letter but preserve case of medical codes in parentheses."""
     if not text:
         return text
     result = text[0].upper() + text[1:].lower()
     # Restore uppercase for ICD code ranges like (A00-B99), (H00-H59)
-    result = re.sub(
-        r'\(([a-z]\d{2})\s*[-–]\s*([a-z]\d{2})',
+    result = CODE_RANGE_PATTERN.sub(
         lambda m: f'({m.group(1).upper()}-{m.group(2).upper()}',
         result
     )
     # Also handle single codes and complex ranges like (U50 –U73, U90, V00-Y98)
-    result = re.sub(
-        r'(?<=[\(,\s])([a-z])(\d{2})',
+    result = SINGLE_CODE_PATTERN.sub(
         lambda m: m.group(1).upper() + m.group(2),
         result
     )
     return result
 
 
-def parse_mkh10_file(csv_path: str) -> dict:
+def clean_en(name: str) -> str:
+    return name if name and name != '-' else ""
+
+
+class PendingCode:
+    """A 4-digit code (or a terminal nosology) seen while streaming, placed in the tree once all rows are read."""
+    __slots__ = ("code", "name_ua", "name_en", "is_nosology", "five_digit")
+
+    def __init__(self, code: str, name_ua: str, name_en: str, is_nosology: bool):
+        self.code = code
+        self.name_ua = name_ua
+        self.name_en = name_en
+        self.is_nosology = is_nosology
+        self.five_digit = OrderedDict()  # code -> leaf, first occurrence wins
+
+    def as_leaf(self) -> dict:
+        return {
+            "code": self.code,
+            "name_ua": self.name_ua,
+            "name_en": self.name_en if self.is_nosology else clean_en(self.name_en)
+        }
+
+
+class PendingTree:
+    """Classes of a run of rows whose nosologies still hold PendingCode children."""
+    __slots__ = ("classes", "four_digit_has_five")
+
+    def __init__(self):
+        self.classes = OrderedDict()
+        self.four_digit_has_five = set()
+
+
+def read_mkh10_rows(csv_path: str) -> Iterator[List[str]]:
+    """Streams data rows of a НК 025 CSV, skipping the header and malformed lines."""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=';')
+        next(reader)  # skip header
+
+        for row in reader:
+            if len(row) < MIN_COLUMNS:
+                continue
+            yield row
+
+
+def parse_mkh10_file(csv_path: str, workers: Optional[int] = None) -> dict:
     """
     Parse the НК 025:2021 CSV into a hierarchical JSON structure
     matching the ACHI app format.
@@ -51,25 +121,42 @@ def parse_mkh10_file(csv_path: str) -> dict:
     we group by 4-digit code: if any 5-digit codes exist for a 4-digit code,
     the 4-digit becomes a category and 5-digit codes are its leaves.
     If no 5-digit codes exist, the 4-digit code itself is a leaf.
+
+    The rows are collected in chunks by a process pool of ``workers``, see ingest/pipeline.py.
     """
-    # First pass: collect all rows and determine which 4-digit codes have 5-digit children
-    rows = []
-    four_digit_has_five = set()
+    return build_mkh10_tree(pipeline.build_file(csv_path, collect_mkh10_rows, merge_pending_trees, workers,
+                                                skip_lines=1, min_columns=MIN_COLUMNS, encoding='utf-8',
+                                                pack=pack_pending_tree, unpack=unpack_pending_tree))
 
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter=';')
-        header = next(reader)  # skip header
 
-        for row in reader:
-            if len(row) < 13:
-                continue
-            rows.append(row)
-            code_5 = row[10].strip()
-            if code_5 and code_5 != '-':
-                four_digit_has_five.add(row[7].strip())
+def parse_mkh10_rows(rows: Iterable[List[str]]) -> dict:
+    """
+    Build the hierarchy from CSV rows in a single pass, see parse_mkh10_file for the format.
 
-    # Second pass: build hierarchy
-    tree = OrderedDict()
+    Rows are not kept: each nosology collects its codes (deduplicated by code) while streaming,
+    and whether a 4-digit code becomes a category is decided once all its 5-digit rows are seen.
+    """
+    return build_mkh10_tree(collect_mkh10_rows(rows))
+
+
+def build_mkh10_tree(pending_tree: PendingTree) -> dict:
+    """Places the pending codes of every nosology once all rows are collected."""
+    tree = pending_tree.classes
+    for class_node in tree.values():
+        for block_node in class_node["children"].values():
+            for nosology_node in block_node["children"].values():
+                nosology_node["children"] = build_nosology_children(nosology_node["children"],
+                                                                    pending_tree.four_digit_has_five)
+
+    result = {"children": tree}
+    return result
+
+
+def collect_mkh10_rows(rows: Iterable[List[str]]) -> PendingTree:
+    """Classes, blocks and nosologies of the rows with the codes of each nosology still pending."""
+    pending_tree = PendingTree()
+    tree = pending_tree.classes
+    four_digit_has_five = pending_tree.four_digit_has_five
 
     for row in rows:
         clazz = row[0].strip()
@@ -80,11 +167,6 @@ def parse_mkh10_file(csv_path: str) -> dict:
         nosology_en = row[5].strip()
         nosology_ua = smart_capitalize(row[6].strip())
         code_4 = row[7].strip()
-        name_4_en = row[8].strip()
-        name_4_ua = smart_capitalize(row[9].strip())
-        code_5 = row[10].strip()
-        name_5_en = row[11].strip()
-        name_5_ua = smart_capitalize(row[12].strip())
 
         # Level 0: Class
         if class_desc not in tree:
@@ -110,99 +192,147 @@ def parse_mkh10_file(csv_path: str) -> dict:
                 "code": nosology_code,
                 "name_ua": nosology_ua,
                 "name_en": nosology_en,
-                "children": OrderedDict()  # will be converted to list later
+                "children": OrderedDict()  # code -> PendingCode, converted once all rows are read
             }
-        nosology_node = block_node["children"][nosology_ua]
+        pending_codes = block_node["children"][nosology_ua]["children"]
 
         # Level 3+: Disease codes
-        # Skip rows where nosology has no subdivisions (code_4 is "-")
-        # These terminal nosologies become their own leaf codes
+        # Terminal nosologies (code_4 is "-") become their own leaf codes
         if code_4 == '-':
-            if "_leaves" not in nosology_node["children"]:
-                nosology_node["children"]["_leaves"] = []
-            leaves = nosology_node["children"]["_leaves"]
-            leaf = {
-                "code": nosology_code,
-                "name_ua": nosology_ua,
-                "name_en": nosology_en if nosology_en and nosology_en != '-' else ""
-            }
-            if not any(c["code"] == nosology_code for c in leaves):
-                leaves.append(leaf)
+            if nosology_code not in pending_codes:
+                pending_codes[nosology_code] = PendingCode(nosology_code, nosology_ua, clean_en(nosology_en), True)
             continue
 
-        has_five = code_4 in four_digit_has_five
-
-        if has_five:
-            # 4-digit code becomes a category node with 5-digit leaves
-            if name_4_ua not in nosology_node["children"]:
-                nosology_node["children"][name_4_ua] = {
-                    "code": code_4,
-                    "name_ua": name_4_ua,
-                    "name_en": name_4_en,
-                    "children": []
-                }
-            four_node = nosology_node["children"][name_4_ua]
+        pending = pending_codes.get(code_4)
+        if pending is None:
+            pending = pending_codes[code_4] = PendingCode(code_4, smart_capitalize(row[9].strip()),
+                                                          row[8].strip(), False)
 
-            if code_5 and code_5 != '-':
+        code_5 = row[10].strip()
+        if code_5 and code_5 != '-':
+            four_digit_has_five.add(code_4)
+            if code_5 not in pending.five_digit:
+                name_4_en = row[8].strip()
+                name_5_en = row[11].strip()
+                name_5_ua = smart_capitalize(row[12].strip())
                 en_name = name_5_en if name_5_en and name_5_en != '-' else name_4_en
-                leaf = {
+                pending.five_digit[code_5] = {
                     "code": code_5,
-                    "name_ua": name_5_ua if name_5_ua and name_5_ua != '-' else name_4_ua,
-                    "name_en": en_name if en_name and en_name != '-' else ""
+                    "name_ua": name_5_ua if name_5_ua and name_5_ua != '-' else smart_capitalize(row[9].strip()),
+                    "name_en": clean_en(en_name)
                 }
-                # Avoid duplicates
-                if not any(c["code"] == code_5 for c in four_node["children"]):
-                    four_node["children"].append(leaf)
-        else:
-            # 4-digit code is a leaf directly under nosology
-            # We collect leaves in a special "_leaves" key
-            if "_leaves" not in nosology_node["children"]:
-                nosology_node["children"]["_leaves"] = []
-            leaves = nosology_node["children"]["_leaves"]
-            leaf = {
-                "code": code_4,
-                "name_ua": name_4_ua,
-                "name_en": name_4_en if name_4_en and name_4_en != '-' else ""
-            }
-            if not any(c["code"] == code_4 for c in leaves):
-                leaves.append(leaf)
 
-    # Post-process: convert nosology children
-    # If a nosology has only _leaves (no 5-digit subcategories), make children a flat list
-    # If it has both _leaves and 5-digit categories, merge them
-    for class_node in tree.values():
-        for block_node in class_node["children"].values():
-            for nosology_key, nosology_node in block_node["children"].items():
-                children = nosology_node["children"]
-                leaves = children.pop("_leaves", [])
-                categories = {k: v for k, v in children.items()}
-
-                if not categories and leaves:
-                    # All 4-digit codes are leaves
-                    nosology_node["children"] = leaves
-                elif categories and not leaves:
-                    # All have 5-digit subcategories
-                    nosology_node["children"] = categories
-                elif categories and leaves:
-                    # Mix: some 4-digit are leaves, some have 5-digit children
-                    # Make the leaves into a flat list under the nosology
-                    # by converting each leaf into a single-item category
-                    # Actually, let's keep the categories as-is and add leaves directly
-                    # The simplest approach: wrap leaves in a category named after themselves
-                    for leaf in leaves:
-                        categories[leaf["name_ua"]] = {
-                            "code": leaf["code"],
-                            "name_ua": leaf["name_ua"],
-                            "name_en": leaf["name_en"],
-                            "children": [leaf]
-                        }
-                    nosology_node["children"] = categories
-                else:
-                    # Empty - shouldn't happen
-                    nosology_node["children"] = []
+    return pending_tree
 
-    result = {"children": tree}
-    return result
+
+def merge_pending_trees(pending_tree: PendingTree, later: PendingTree) -> PendingTree:
+    """Adds the codes of later rows, nodes and codes keep the names of their first row as when streaming."""
+    pending_tree.four_digit_has_five |= later.four_digit_has_five
+    for class_desc, later_class in later.classes.items():
+        class_node = pending_tree.classes.setdefault(class_desc, later_class)
+        if class_node is later_class:
+            continue
+        for block_name, later_block in later_class["children"].items():
+            block_node = class_node["children"].setdefault(block_name, later_block)
+            if block_node is later_block:
+                continue
+            for nosology_ua, later_nosology in later_block["children"].items():
+                nosology_node = block_node["children"].setdefault(nosology_ua, later_nosology)
+                if nosology_node is later_nosology:
+                    continue
+                pending_codes = nosology_node["children"]
+                for code, later_pending in later_nosology["children"].items():
+                    pending = pending_codes.setdefault(code, later_pending)
+                    if pending is not later_pending:
+                        for code_5, leaf in later_pending.five_digit.items():
+                            pending.five_digit.setdefault(code_5, leaf)
+    return pending_tree
+
+
+def pack_pending_tree(pending_tree: PendingTree) -> tuple:
+    """The collected rows as nested tuples for the ingestion pipeline, node names are their keys."""
+    return tuple(pending_tree.four_digit_has_five), tuple(
+        (class_node["clazz"], class_node["name_ua"], tuple(
+            (block_node["code"], block_node["name_ua"], tuple(
+                (nosology_node["code"], nosology_node["name_ua"], nosology_node["name_en"], tuple(
+                    (pending.code, pending.name_ua, pending.name_en, pending.is_nosology,
+                     tuple((leaf["code"], leaf["name_ua"], leaf["name_en"]) for leaf in pending.five_digit.values()))
+                    for pending in nosology_node["children"].values()))
+                for nosology_node in block_node["children"].values()))
+            for block_node in class_node["children"].values()))
+        for class_node in pending_tree.classes.values())
+
+
+def unpack_pending_tree(packed: tuple) -> PendingTree:
+    four_digit_has_five, classes = packed
+    pending_tree = PendingTree()
+    pending_tree.four_digit_has_five.update(four_digit_has_five)
+    for clazz, class_desc, blocks in classes:
+        class_node = pending_tree.classes[class_desc] = {"clazz": clazz, "name_ua": class_desc,
+                                                         "children": OrderedDict()}
+        for block_code, block_name, nosologies in blocks:
+            block_node = class_node["children"][block_name] = {"code": block_code, "name_ua": block_name,
+                                                               "children": OrderedDict()}
+            for nosology_code, nosology_ua, nosology_en, codes in nosologies:
+                pending_codes = OrderedDict()
+                block_node["children"][nosology_ua] = {"code": nosology_code, "name_ua": nosology_ua,
+                                                       "name_en": nosology_en, "children": pending_codes}
+                for code, name_ua, name_en, is_nosology, five_digit in codes:
+                    pending = pending_codes[code] = PendingCode(code, name_ua, name_en, is_nosology)
+                    for code_5, name_5_ua, name_5_en in five_digit:
+                        pending.five_digit[code_5] = {"code": code_5, "name_ua": name_5_ua, "name_en": name_5_en}
+    return pending_tree
+
+
+def build_nosology_children(pending_codes: Dict[str, PendingCode], four_digit_has_five: Set[str]):
+    """
+    Convert collected codes of a nosology into its children.
+
+    If a nosology has only leaves (no 5-digit subcategories), children is a flat list.
+    If it has 5-digit categories, children is a dict of categories, and plain leaves
+    are wrapped into a single-item category named after themselves.
+    """
+    categories = OrderedDict()
+    category_codes = {}
+    leaves = []
+    for pending in pending_codes.values():
+        if pending.is_nosology or pending.code not in four_digit_has_five:
+            leaves.append(pending.as_leaf())
+            continue
+        # 4-digit code becomes a category node with 5-digit leaves
+        if pending.name_ua not in categories:
+            categories[pending.name_ua] = {
+                "code": pending.code,
+                "name_ua": pending.name_ua,
+                "name_en": pending.name_en,
+                "children": []
+            }
+            category_codes[pending.name_ua] = set()
+        four_node = categories[pending.name_ua]
+        seen_codes = category_codes[pending.name_ua]
+        for code_5, leaf in pending.five_digit.items():
+            if code_5 not in seen_codes:
+                seen_codes.add(code_5)
+                four_node["children"].append(leaf)
+
+    if not categories and leaves:
+        # All 4-digit codes are leaves
+        return leaves
+    if categories and not leaves:
+        # All have 5-digit subcategories
+        return categories
+    if categories and leaves:
+        # Mix: some 4-digit are leaves, some have 5-digit children
+        for leaf in leaves:
+            categories[leaf["name_ua"]] = {
+                "code": leaf["code"],
+                "name_ua": leaf["name_ua"],
+                "name_en": leaf["name_en"],
+                "children": [leaf]
+            }
+        return categories
+    # Empty - shouldn't happen
+    return []
 
 
 def count_stats(tree: dict) -> dict:
@@ -232,26 +362,65 @@ def count_stats(tree: dict) -> dict:
     return stats
 
 
-def write_json(data: dict, output_path: str) -> None:
+def write_json(data: dict, output_path: str, indent: Optional[int] = 2) -> None:
+    """Stream the tree to the file, indent=None writes the compact form."""
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+        json_stream.dump(data, f, indent=indent)
+
+
+def rebuild_changed_classes(csv_path: str, output_path: str, changed_classes: Iterable[str],
+                            class_order: Iterable[str]) -> dict:
+    """Re-parse only the rows of changed classes and splice them into the existing output."""
+    changed_classes = set(changed_classes)
+    rebuilt = parse_mkh10_rows(row for row in read_mkh10_rows(csv_path) if row[0].strip() in changed_classes)
+    with open(output_path, 'r', encoding='utf-8') as f:
+        existing = json.load(f, object_pairs_hook=OrderedDict)
+    return {"children": splice_classes(existing["children"], rebuilt["children"], class_order, changed_classes)}
+
+
+def regenerate(csv_path: str = CSV_PATH, output_path: str = OUTPUT_PATH, sqlite_path: str = SQLITE_PATH,
+               force: bool = False, workers: Optional[int] = None) -> Optional[dict]:
+    """Rebuild the outputs if the CSV or the parsing rules changed, returns None when it was skipped."""
+    manifest = Manifest.load(MANIFEST_PATH)
+    inputs = {csv_path: file_digest(csv_path)}
+    rules = source_digest(sys.modules[__name__], json_stream, pipeline, achi_text, sqlite_export)
+    classes = class_digests(read_mkh10_rows(csv_path))
+    outputs = [output_path]
+
+    plan = manifest.plan(MANIFEST_TARGET, inputs, rules, classes, outputs, force)
+    if plan.mode == SKIP:
+        print(f"{csv_path} is unchanged, skipping")
+        # Generated on demand and not committed, exported again whenever the JSON changes
+        if sqlite_export.database_source(sqlite_path) != file_digest(output_path):
+            print(f"Exporting {sqlite_path}...")
+            with open(output_path, 'r', encoding='utf-8') as json_file:
+                sqlite_export.write_database({"mkh10": json.load(json_file, object_pairs_hook=OrderedDict)},
+                                             sqlite_path, source=file_digest(output_path))
+        return None
+    if plan.mode == PARTIAL:
+        print(f"Rebuilding {len(plan.changed_classes)} of {len(classes)} classes from {csv_path}...")
+        tree = rebuild_changed_classes(csv_path, output_path, plan.changed_classes, classes)
+    else:
+        print(f"Parsing {csv_path}...")
+        tree = parse_mkh10_file(csv_path, workers)
+
+    print(f"Writing to {output_path} and {sqlite_path}...")
+    write_json(tree, output_path)
+    sqlite_export.write_database({"mkh10": tree}, sqlite_path, source=file_digest(output_path))
+    manifest.record(MANIFEST_TARGET, inputs, rules, classes, outputs)
+    manifest.save()
+    return tree
 
 
 if __name__ == '__main__':
-    csv_path = '../mkh10-data/nk-025-2021.csv'
-    output_path = 'data/mkh10.json'
-
-    print(f"Parsing {csv_path}...")
-    tree = parse_mkh10_file(csv_path)
-
-    stats = count_stats(tree)
-    print(f"Statistics:")
-    print(f"  Classes: {stats['classes']}")
-    print(f"  Blocks: {stats['blocks']}")
-    print(f"  Nosologies: {stats['nosologies']}")
-    print(f"  Leaf codes: {stats['leaf_codes']}")
-
-    print(f"Writing to {output_path}...")
-    write_json(tree, output_path)
+    tree = regenerate(force='--force' in sys.argv, workers=pipeline.workers_option(sys.argv))
+
+    if tree is not None:
+        stats = count_stats(tree)
+        print(f"Statistics:")
+        print(f"  Classes: {stats['classes']}")
+        print(f"  Blocks: {stats['blocks']}")
+        print(f"  Nosologies: {stats['nosologies']}")
+        print(f"  Leaf codes: {stats['leaf_codes']}")
 
     print("Done!")
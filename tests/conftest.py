@@ -0,0 +1,11 @@
+"""Puts the bot modules and the parsers on the import path the way they run. Run the tests from the repository root."""
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACHI_DIR = os.path.join(REPO_ROOT, "achi")
+MKH10_DIR = os.path.join(REPO_ROOT, "mkh10")
+
+for path in (REPO_ROOT, ACHI_DIR, MKH10_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
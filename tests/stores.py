@@ -0,0 +1,14 @@
+"""Small classifier trees for the tests, in the JSON layout the parsers write."""
+from achi_store import StoreFile, build_store
+
+
+def leaf(code: str, name_ua: str) -> dict:
+    return {"code": code, "name_ua": name_ua, "name_en": ""}
+
+
+def category(name_ua: str, children, code: str = "") -> dict:
+    return {"code": code, "name_ua": name_ua, "children": children}
+
+
+def store_file(**trees) -> StoreFile:
+    return StoreFile(build_store(trees))
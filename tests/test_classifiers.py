@@ -0,0 +1,14 @@
+from achi_classifiers import Classifiers
+
+from stores import category, leaf, store_file
+
+INDEXES = ("navigation", "leaf_pages", "search_index", "fuzzy_index")
+
+
+def test_indexes_of_every_classifier_are_built_up_front():
+    tree = category("", {"Клас 1": category("Клас 1", [leaf("40803-00", "Пункція")], code="1")})
+    classifiers = Classifiers(store_file(achi=tree, mkh10=tree), {})
+
+    for classifier in classifiers:
+        # cached_property keeps built values in the instance dict, nothing is left for a handler to build
+        assert all(index in vars(classifier) for index in INDEXES), classifier.name
@@ -0,0 +1,18 @@
+from achi_bot import format_code_match
+from achi_classifiers import Classifiers
+
+from stores import category, leaf, store_file
+from test_pages import assert_markdown_v2
+
+
+def test_code_match_is_escaped():
+    tree = category("", {"(A00-B99)": category("Деякі_інфекційні хвороби", {"A00-A09": category(
+        "Кишкові інфекції [A00-A09]", [leaf("A01.0", "Черевний тиф *(з ускладненнями)*")], code="A00-A09")},
+        code="(A00-B99)")})
+    classifiers = Classifiers(store_file(mkh10=tree), {"mkh10": "МКХ-10"})
+    match = classifiers.code_index.lookup("A01.0")[0]
+
+    answer = format_code_match(classifiers, match)
+
+    assert_markdown_v2(answer)
+    assert answer.startswith(r"МКХ\-10: ")
@@ -0,0 +1,102 @@
+import copy
+
+import pytest
+
+from ingest.edition_diff import apply_patch, diff
+
+from stores import category, leaf
+
+
+def edition() -> dict:
+    return category("", {
+        "Клас 1": category("Клас 1", {
+            "Блок 1": category("Блок 1", [leaf("30390-00", "Пункція"), leaf("30390-01", "Біопсія")], code="1"),
+            "Блок 2": category("Блок 2", {
+                "Підблок": category("Підблок", [leaf("30400-00", "Дренування")], code="2.1")}, code="2"),
+        }, code="I"),
+        "Клас 2": category("Клас 2", {
+            "Блок 3": category("Блок 3", [leaf("40803-00", "Резекція")], code="3"),
+        }, code="II"),
+    })
+
+
+def round_trip(old: dict, new: dict):
+    edition_diff = diff(old, new)
+    patched = apply_patch(copy.deepcopy(old), edition_diff.patch())
+    assert patched == new
+    return edition_diff
+
+
+def test_renamed_and_removed_codes_round_trip():
+    new = edition()
+    block = new["children"]["Клас 1"]["children"]["Блок 1"]
+    block["children"][0]["name_ua"] = "Пункція (нова редакція)"
+    del block["children"][1]
+
+    edition_diff = round_trip(edition(), new)
+
+    assert edition_diff.renamed_codes == ["30390-00"]
+    assert edition_diff.removed_codes == ["30390-01"]
+    assert not edition_diff.moved_codes and not edition_diff.removed_categories
+
+
+def test_moved_code_round_trips():
+    new = edition()
+    moved = new["children"]["Клас 1"]["children"]["Блок 1"]["children"].pop()
+    new["children"]["Клас 2"]["children"]["Блок 3"]["children"].append(moved)
+
+    edition_diff = round_trip(edition(), new)
+
+    assert edition_diff.moved_codes == ["30390-01"]
+    assert not edition_diff.renamed_codes
+
+
+def test_moved_category_is_a_move_of_its_subtree():
+    new = edition()
+    moved = new["children"]["Клас 1"]["children"].pop("Блок 2")
+    new["children"]["Клас 2"]["children"]["Блок 2"] = moved
+
+    edition_diff = round_trip(edition(), new)
+
+    assert edition_diff.moved_categories == {"I/2": "II/2"}
+    assert not edition_diff.added_categories and not edition_diff.removed_categories
+    # The codes and the subcategory under it move with it
+    assert not edition_diff.moved_codes
+    patch = edition_diff.patch()
+    assert not patch["categories"] and not patch["codes"]
+    assert set(patch["category_layout"]) == {"I", "II"}
+    assert edition_diff.report() == ["> Клас 1 / Блок 2 -> Клас 2 / Блок 2"]
+
+
+def test_moved_and_renamed_category_round_trips():
+    new = edition()
+    moved = new["children"]["Клас 1"]["children"].pop("Блок 2")
+    moved["name_ua"] = "Блок 2 (нова редакція)"
+    moved["children"]["Підблок"]["children"].append(leaf("30400-01", "Промивання"))
+    new["children"]["Клас 2"]["children"]["Блок 2 (нова редакція)"] = moved
+
+    edition_diff = round_trip(edition(), new)
+
+    assert edition_diff.moved_categories == {"I/2": "II/2"}
+    assert edition_diff.renamed_categories == ["II/2"]
+    assert edition_diff.added_codes == ["30400-01"]
+
+
+def test_removed_category_with_its_codes_round_trips():
+    new = edition()
+    del new["children"]["Клас 2"]
+
+    edition_diff = round_trip(edition(), new)
+
+    assert edition_diff.removed_categories == ["II", "II/3"]
+    assert edition_diff.removed_codes == ["40803-00"]
+    assert not edition_diff.moved_categories
+
+
+def test_patch_refuses_another_base():
+    new = edition()
+    new["children"]["Клас 2"]["name_ua"] = "Клас 2 (нова редакція)"
+    patch = diff(edition(), new).patch()
+
+    with pytest.raises(ValueError):
+        apply_patch(new, patch)
@@ -0,0 +1,56 @@
+import os
+
+import achi_parser
+import mkh10_parser
+from benchmarks.synthetic import ACHI_HEADER, MKH10_HEADER, achi_rows, mkh10_rows, write_csv
+
+
+def edit_class(rows, clazz: str, column: int):
+    """The rows with one cell changed in every row of a class."""
+    for row in rows:
+        if row[0] == clazz:
+            row = row[:column] + [row[column] + " (нова редакція)"] + row[column + 1:]
+        yield row
+
+
+def read_outputs(paths) -> dict:
+    outputs = {}
+    for path in paths:
+        with open(path, "rb") as output:
+            outputs[path] = output.read()
+    return outputs
+
+
+def test_achi_partial_rebuild_matches_a_full_one(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    outputs = [achi_parser.JSON_PATH, achi_parser.STORE_PATH, achi_parser.SQLITE_PATH]
+    write_csv(achi_parser.CSV_PATH, ACHI_HEADER, achi_rows(), achi_layout=True)
+    achi_parser.regenerate(workers=1)
+    before = read_outputs(outputs)
+
+    write_csv(achi_parser.CSV_PATH, ACHI_HEADER, edit_class(achi_rows(), "Клас 3", 9), achi_layout=True)
+    achi_parser.regenerate(workers=1)
+    assert "Rebuilding 1 of" in capsys.readouterr().out
+    partial = read_outputs(outputs)
+    assert partial[achi_parser.JSON_PATH] != before[achi_parser.JSON_PATH]
+
+    achi_parser.regenerate(force=True, workers=1)
+    assert read_outputs(outputs) == partial
+
+
+def test_mkh10_partial_rebuild_matches_a_full_one(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    csv_path, json_path, sqlite_path = "mkh10.csv", "mkh10.json", "mkh10.sqlite"
+    write_csv(csv_path, MKH10_HEADER, mkh10_rows())
+    mkh10_parser.regenerate(csv_path, json_path, sqlite_path, workers=1)
+    before = read_outputs([json_path])
+
+    write_csv(csv_path, MKH10_HEADER, edit_class(mkh10_rows(), "Клас 3", 6))
+    mkh10_parser.regenerate(csv_path, json_path, sqlite_path, workers=1)
+    assert "Rebuilding 1 of" in capsys.readouterr().out
+    partial = read_outputs([json_path, sqlite_path])
+    assert partial[json_path] != before[json_path]
+
+    mkh10_parser.regenerate(csv_path, json_path, sqlite_path, force=True, workers=1)
+    assert read_outputs([json_path, sqlite_path]) == partial
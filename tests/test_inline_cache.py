@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+from achi_classifiers import Classifiers
+from achi_inline_cache import HIT, MISS, REFINED, InlineQueryCache
+from achi_reload import DataReloader
+from achi_store import StoreFile, write_store
+
+from stores import category, leaf, store_file
+
+NAMES = ["Пункція спинного мозку", "Пункція суглоба", "Біопсія шкіри", "Біопсія печінки", "Ехографія серця",
+         "Холецистектомія лапароскопічна", "Холангіографія"]
+
+
+def tree(suffix: str = "") -> dict:
+    leaves = [leaf(f"{40800 + index}-{index % 100:02d}", f"{NAMES[index % len(NAMES)]}{suffix} {index}")
+              for index in range(60)]
+    return category("", {"Клас 1": category("Клас 1", leaves, code="1")})
+
+
+def classifiers() -> Classifiers:
+    return Classifiers(store_file(achi=tree()), {})
+
+
+def typed(query: str):
+    return [query[:length] for length in range(1, len(query) + 1)]
+
+
+def test_refined_results_equal_a_fresh_search():
+    cache = InlineQueryCache()
+    classifier = classifiers().default
+    # Separate indexes, so nothing memoized by the cached searches is shared
+    fresh = classifiers().default.search_index
+
+    for query in typed("холецист лапароскоп") + typed("пункція суглоба"):
+        assert cache.search(classifier, query) == fresh.search(query), query
+
+    assert cache.stats[REFINED] > 0
+
+
+def test_repeated_queries_are_hits():
+    cache = InlineQueryCache()
+    classifier = classifiers().default
+
+    first = cache.search(classifier, "біопсія")
+    assert cache.search(classifier, "Біопсія ") == first
+    assert cache.stats[HIT] == 1 and cache.stats[MISS] == 1
+    assert cache.hit_rate() == 0.5
+
+
+def test_least_recently_used_and_expired_entries_are_evicted():
+    now = [0.0]
+    cache = InlineQueryCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    classifier = classifiers().default
+
+    for query in ("біопсія", "пункція", "біопсія", "ехографія"):
+        cache.search(classifier, query)
+    assert len(cache) == 2 and cache.stats["evicted"] == 1
+    # "пункція" was the least recently used
+    cache.search(classifier, "пункція")
+    assert cache.stats[HIT] == 1 and cache.stats["evicted"] == 2
+
+    now[0] = 11
+    cache.search(classifier, "пункція")
+    assert cache.stats["expired"] == 1 and cache.stats[HIT] == 1
+
+
+def test_cache_is_cleared_when_the_data_is_reloaded(tmp_path):
+    path = str(tmp_path / "achi.bin")
+    write_store({"achi": tree()}, path)
+    cache = InlineQueryCache()
+    application = SimpleNamespace(bot_data={"classifiers": Classifiers(StoreFile.open(path), {}),
+                                            "inline_cache": cache}, handlers={})
+    reloader = DataReloader(path, {})
+    reloader.attach(application)
+    cache.search(application.bot_data["classifiers"].default, "біопсія")
+    assert len(cache) == 1
+
+    write_store({"achi": tree(" (нова редакція)")}, path)
+    assert asyncio.run(reloader.check())
+
+    assert len(cache) == 0
+    reloaded = application.bot_data["classifiers"].default
+    leaves = cache.search(reloaded, "біопсія")
+    assert cache.stats[MISS] == 2
+    assert all("нова редакція" in reloaded.store.name_ua(node) for node in leaves)
@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from achi_metrics import HANDLER_METRIC, INLINE_CACHE_METRIC, LATENCY_BUCKETS, Metrics, MetricsExporter
+
+
+async def scrape(port: int, path: str = "/metrics"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    response = (await reader.read()).decode("utf-8")
+    writer.close()
+    head, body = response.split("\r\n\r\n", 1)
+    return head.split("\r\n"), body
+
+
+def samples(body: str) -> dict:
+    """Sample lines by series, comment lines are left out."""
+    return dict(line.rsplit(" ", 1) for line in body.splitlines() if not line.startswith("#"))
+
+
+async def handle_updates(metrics: Metrics) -> None:
+    async def show_category(update, context):
+        return update
+
+    async def broken(update, context):
+        raise RuntimeError("broken handler")
+
+    show = metrics.instrument("show_category", show_category, lambda context: context.level)
+    fail = metrics.instrument("broken", broken, lambda context: context.level)
+    for level in ("1", "1", "2"):
+        await show(None, SimpleNamespace(level=level))
+    with pytest.raises(RuntimeError):
+        await fail(None, SimpleNamespace(level="-"))
+    # A slow update lands in the +Inf bucket only
+    metrics.observe(HANDLER_METRIC, (("handler", "show_category"), ("level", "2")), LATENCY_BUCKETS[-1] + 1)
+    metrics.count(INLINE_CACHE_METRIC, (("result", "hit"),), 3)
+
+
+def test_exporter_serves_histograms_error_counters_and_levels():
+    async def run():
+        metrics = Metrics()
+        await handle_updates(metrics)
+        exporter = MetricsExporter(metrics, port=0)
+        await exporter.start()
+        try:
+            return await scrape(exporter.port), await scrape(exporter.port, "/")
+        finally:
+            await exporter.stop()
+
+    (head, body), (not_found, _) = asyncio.run(run())
+    assert head[0] == "HTTP/1.1 200 OK"
+    assert "Content-Type: text/plain; version=0.0.4; charset=utf-8" in head
+    assert not_found[0] == "HTTP/1.1 404 Not Found"
+    assert f"# TYPE {HANDLER_METRIC} histogram" in body.splitlines()
+    assert "# TYPE achi_handler_errors_total counter" in body.splitlines()
+    values = samples(body)
+
+    # Every level has its own series, buckets are cumulative and end with +Inf, the total count
+    for level, count in (("1", 2), ("2", 2), ("-", 1)):
+        series = f'handler="{"broken" if level == "-" else "show_category"}",level="{level}"'
+        buckets = [int(values[f'{HANDLER_METRIC}_bucket{{{series},le="{bound!r}"}}']) for bound in LATENCY_BUCKETS]
+        assert buckets == sorted(buckets)
+        assert int(values[f'{HANDLER_METRIC}_bucket{{{series},le="+Inf"}}']) == count
+        assert int(values[f"{HANDLER_METRIC}_count{{{series}}}"]) == count
+        assert float(values[f"{HANDLER_METRIC}_sum{{{series}}}"]) >= 0
+    level_2 = 'handler="show_category",level="2"'
+    assert int(values[f'{HANDLER_METRIC}_bucket{{{level_2},le="{LATENCY_BUCKETS[-1]!r}"}}']) == 1
+    assert float(values[f"{HANDLER_METRIC}_sum{{{level_2}}}"]) > LATENCY_BUCKETS[-1] + 1
+
+    assert values['achi_handler_errors_total{handler="broken",level="-"}'] == "1"
+    assert values['achi_handler_errors_total{handler="show_category",level="1"}'] == "0"
+    assert values[f'{INLINE_CACHE_METRIC}{{result="hit"}}'] == "3"
+    assert float(values["achi_uptime_seconds"]) >= 0
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.count(INLINE_CACHE_METRIC, (("result", 'a "b"\\c\nd'),))
+    assert f'{INLINE_CACHE_METRIC}{{result="a \\"b\\"\\\\c\\nd"}} 1' in metrics.render().splitlines()
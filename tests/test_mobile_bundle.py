@@ -0,0 +1,73 @@
+import json
+import os
+import random
+
+from ingest.mobile_bundle import SEARCH_FILE, BundleIndex, build_bundle, delta_decode
+
+from stores import category, leaf
+
+ACHI_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "achi-mobile", "data", "achi.json")
+
+
+def traversal_search(tree: dict, query: str, limit: int = 50) -> list:
+    """searchProcedures from achi-mobile/lib/search.ts, returns leaf codes."""
+    query = query.lower().strip()
+    if not query:
+        return []
+    codes = []
+
+    def traverse(node: dict) -> bool:
+        children = node["children"]
+        if isinstance(children, list):
+            for code in children:
+                if any(query in (code.get(field) or "").lower() for field in ("code", "name_ua", "name_en")):
+                    codes.append(code["code"])
+                    if len(codes) >= limit:
+                        return True
+            return False
+        return any(traverse(child) for child in children.values())
+
+    traverse(tree)
+    return codes
+
+
+def bundle_index(tree: dict) -> BundleIndex:
+    return BundleIndex(json.loads(build_bundle("achi", tree)[SEARCH_FILE]))
+
+
+def test_index_matches_substrings_like_the_app():
+    tree = category("", {
+        "Клас 1": category("Клас 1", {"Блок": category("Блок", [
+            leaf("30390-00", "Пункція спинного мозку"),
+            {"code": "30390-01", "name_ua": "Біопсія шкіри", "name_en": "Skin biopsy"},
+            leaf("90660-00", "Лапароскопічна пункція")])}, code="I"),
+    })
+    index = bundle_index(tree)
+    for query in ["пункц", "нкці", "ПУНКЦІЯ", "  мозку ", "я с", "0-0", "390", "biop", "sk", "к", "", "хірург"]:
+        assert [result.code for result in index.search(query)] == traversal_search(tree, query), query
+
+    [result] = index.search("спинного")
+    assert (result.path, result.shard, result.name_ua) == (["Клас 1", "Блок"], 0, "Пункція спинного мозку")
+    assert [result.code for result in index.search("пункція", limit=1)] == ["30390-00"]
+
+
+def test_index_returns_the_traversal_results_on_the_achi_data():
+    with open(ACHI_JSON, "r", encoding="utf-8") as tree_file:
+        tree = json.load(tree_file)
+    index = bundle_index(tree)
+    rng = random.Random(7)
+    queries = []
+    for _, code, name_ua, name_en in rng.sample(index.leaves, 40):
+        queries.extend(name_ua[:length] for length in range(1, 12))
+        start = rng.randrange(len(name_ua))
+        queries.extend([name_ua[start:start + 5], code[2:], name_en[-6:].upper()])
+    for query in queries:
+        assert [result.code for result in index.search(query)] == traversal_search(tree, query), query
+
+
+def test_postings_are_delta_encoded_leaf_ids():
+    tree = category("", {"Клас": category("Клас", [leaf("1", "шкіра"), leaf("2", "кров"), leaf("3", "шкіра")])})
+    index = json.loads(build_bundle("achi", tree)[SEARCH_FILE])
+    postings = dict(zip(index["trigrams"], index["postings"]))
+    assert delta_decode(postings["шкі"]) == [0, 2]
+    assert delta_decode(postings["кро"]) == [1]
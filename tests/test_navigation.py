@@ -0,0 +1,29 @@
+from achi_navigation import NavigationIndex
+
+from stores import category, leaf, store_file
+
+
+def tree(*classes) -> dict:
+    return category("", {name: category(name, {
+        f"{name}, блок": category(f"{name}, блок", [leaf(f"{code}-00", "Пункція"), leaf(f"{code}-01", "Біопсія")],
+                                  code=code)}, code=name) for name, code in classes})
+
+
+def test_node_key_finds_the_same_category_in_another_version():
+    old = NavigationIndex(store_file(achi=tree(("Клас 1", "40803"), ("Клас 2", "40804")))["achi"])
+    new = NavigationIndex(store_file(achi=tree(("Клас 0", "40800"), ("Клас 1", "40803"),
+                                               ("Клас 2", "40804")))["achi"])
+    block = old.child_by_label(old.child_by_label(old.root, "Клас 2"), "Клас 2, блок")
+
+    moved = new.node_by_key(old.key(block))
+
+    assert moved is not None and moved != block
+    assert new.breadcrumbs(moved) == old.breadcrumbs(block)
+
+
+def test_node_key_of_a_removed_category_is_not_found():
+    old = NavigationIndex(store_file(achi=tree(("Клас 1", "40803"), ("Клас 2", "40804")))["achi"])
+    new = NavigationIndex(store_file(achi=tree(("Клас 1", "40803")))["achi"])
+
+    assert new.node_by_key(old.key(old.child_by_label(old.root, "Клас 2"))) is None
+    assert new.node_by_key(old.key(old.root)) == new.root
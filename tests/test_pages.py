@@ -0,0 +1,45 @@
+import re
+
+from achi_navigation import NavigationIndex
+from achi_pages import LeafPages
+
+from stores import category, leaf, store_file
+
+MARKDOWN_V2_SPECIAL = set("_*[]()~`>#+-=|{}.!\\")
+ESCAPED = re.compile(r"\\.")
+
+
+def assert_markdown_v2(text: str) -> None:
+    """Every special character is escaped apart from the pairs of ``*`` around bold spans."""
+    unescaped = ESCAPED.sub("", text)
+    assert set(unescaped) & MARKDOWN_V2_SPECIAL <= {"*"}, text
+    assert unescaped.count("*") % 2 == 0, text
+
+
+def test_leaf_page_under_markdown_labels_is_escaped():
+    tree = category("", {"_": category("_", {"__": category("__", [
+        leaf("G01*", "Менінгіт при *бактеріальних* хворобах"),
+        leaf("40803-00[1]", "Пункція_спинного мозку (люмбальна)"),
+    ], code="1")}, code="Клас 1")})
+    navigation = NavigationIndex(store_file(achi=tree)["achi"])
+    node = navigation.child_by_label(navigation.child_by_label(navigation.root, "_"), "__")
+
+    text, markup = LeafPages(navigation).render(node, 0)
+
+    assert_markdown_v2(text)
+    assert text.startswith(r"\_ \-\> \_\_")
+    assert r"*Код: G01\**" in text
+    assert markup is None
+
+
+def test_paged_leaves_are_escaped_on_every_page():
+    tree = category("", {"_": category("_", [leaf(f"{index}.1-{index}", f"Код_{index}") for index in range(60)])})
+    navigation = NavigationIndex(store_file(achi=tree)["achi"])
+    node = navigation.child_by_label(navigation.root, "_")
+    leaf_pages = LeafPages(navigation, message_limit=512)
+
+    assert leaf_pages.page_count(node) > 1
+    for page in range(leaf_pages.page_count(node)):
+        text, _ = leaf_pages.render(node, page)
+        assert_markdown_v2(text)
+        assert len(text) <= 512
@@ -0,0 +1,159 @@
+import asyncio
+import sqlite3
+from collections import defaultdict
+from types import MappingProxyType, SimpleNamespace
+
+import achi_persistence
+from achi_bot import CLASSIFIER_KEY, inline_search
+from achi_classifiers import Classifiers
+from achi_inline_cache import InlineQueryCache
+from achi_persistence import SqlitePersistence
+
+from stores import category, leaf, store_file
+
+
+def database(tmp_path) -> str:
+    return str(tmp_path / "chat_state.sqlite3")
+
+
+def fail_writes(batch):
+    raise sqlite3.OperationalError("database is locked")
+
+
+def stored_rows(path) -> dict:
+    with sqlite3.connect(path) as connection:
+        return dict(connection.execute("SELECT chat_id, data FROM chat_data"))
+
+
+def test_changes_are_written_behind(tmp_path):
+    async def scenario(path):
+        persistence = SqlitePersistence(path)
+        await persistence.get_chat_data()
+        await persistence.update_chat_data(1, {"node": 1})
+        await persistence.update_chat_data(2, {"node": 2})
+        # Handing chats over doesn't wait for the disk
+        assert stored_rows(path) == {}
+        await persistence.flush()
+        assert stored_rows(path) == {1: '{"node": 1}', 2: '{"node": 2}'}
+
+    asyncio.run(scenario(database(tmp_path)))
+
+
+def test_state_is_loaded_lazily_after_a_restart(tmp_path):
+    async def scenario(path):
+        before_restart = SqlitePersistence(path)
+        await before_restart.get_chat_data()
+        await before_restart.update_chat_data(1, {"node": 1, CLASSIFIER_KEY: "mkh10"})
+        await before_restart.flush()
+
+        persistence = SqlitePersistence(path)
+        assert await persistence.get_chat_data() == {}
+        chat_data = {"node": 5}
+        await persistence.refresh_chat_data(1, chat_data)
+        # State already in memory is newer than the row
+        assert chat_data == {"node": 5}
+
+        persistence = SqlitePersistence(path)
+        await persistence.get_chat_data()
+        chat_data = {}
+        await persistence.refresh_chat_data(1, chat_data)
+        assert chat_data == {"node": 1, CLASSIFIER_KEY: "mkh10"}
+        chat_data.pop("node")
+        await persistence.refresh_chat_data(1, chat_data)
+        assert chat_data == {CLASSIFIER_KEY: "mkh10"}
+        await persistence.flush()
+
+    asyncio.run(scenario(database(tmp_path)))
+
+
+def test_a_failed_batch_is_retried_on_its_own(tmp_path, monkeypatch):
+    monkeypatch.setattr(achi_persistence, "RETRY_INTERVAL", 0.01)
+
+    async def scenario(path):
+        persistence = SqlitePersistence(path)
+        await persistence.get_chat_data()
+        write_batch = persistence._write_batch
+        failures = []
+
+        def failing_once(batch):
+            if not failures:
+                failures.append(batch)
+                fail_writes(batch)
+            write_batch(batch)
+
+        persistence._write_batch = failing_once
+        await persistence.update_chat_data(1, {"node": 1})
+        for _ in range(100):
+            if stored_rows(path):
+                break
+            await asyncio.sleep(0.01)
+        assert failures and stored_rows(path) == {1: '{"node": 1}'}
+        await persistence.flush()
+
+    asyncio.run(scenario(database(tmp_path)))
+
+
+def test_pending_state_is_written_when_the_application_stops(tmp_path, monkeypatch):
+    # Longer than the test, only write_pending can write the failed batch
+    monkeypatch.setattr(achi_persistence, "RETRY_INTERVAL", 60)
+
+    async def scenario(path):
+        persistence = SqlitePersistence(path)
+        await persistence.get_chat_data()
+        write_batch = persistence._write_batch
+        persistence._write_batch = fail_writes
+        await persistence.update_chat_data(1, {"node": 1})
+        await asyncio.sleep(0.05)
+        assert stored_rows(path) == {}
+
+        persistence._write_batch = write_batch
+        await asyncio.wait_for(persistence.write_pending(), timeout=1)
+        assert stored_rows(path) == {1: '{"node": 1}'}
+        await persistence.flush()
+
+    asyncio.run(scenario(database(tmp_path)))
+
+
+def test_loaded_chats_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(achi_persistence, "MAX_LOADED_CHATS", 2)
+
+    async def scenario(path):
+        persistence = SqlitePersistence(path)
+        await persistence.get_chat_data()
+        for chat_id in range(1, 4):
+            await persistence.refresh_chat_data(chat_id, {})
+        assert list(persistence._loaded_chats) == [2, 3]
+        await persistence.flush()
+
+    asyncio.run(scenario(database(tmp_path)))
+
+
+def test_inline_query_uses_the_classifier_of_a_chat_not_loaded_since_the_restart(tmp_path):
+    async def scenario(path):
+        before_restart = SqlitePersistence(path)
+        await before_restart.get_chat_data()
+        await before_restart.update_chat_data(7, {CLASSIFIER_KEY: "mkh10"})
+        await before_restart.flush()
+
+        persistence = SqlitePersistence(path)
+        await persistence.get_chat_data()
+        tree = category("", {"Клас": category("Клас", [leaf("30390-00", "Пункція")], code="1")})
+        answers = []
+
+        async def answer_inline_query(query_id, results, **kwargs):
+            answers.append(results)
+
+        context = SimpleNamespace(
+            application=SimpleNamespace(persistence=persistence, chat_data=MappingProxyType(defaultdict(dict))),
+            bot_data={"classifiers": Classifiers(store_file(achi=tree, mkh10=tree), {}),
+                      "inline_cache": InlineQueryCache()},
+            bot=SimpleNamespace(answer_inline_query=answer_inline_query))
+        update = SimpleNamespace(inline_query=SimpleNamespace(id="1", query="пункція",
+                                                              from_user=SimpleNamespace(id=7)))
+        await inline_search(update, context)
+        await persistence.flush()
+
+        assert [result.id.split(":")[0] for result in answers[0]] == ["mkh10"]
+
+    asyncio.run(scenario(database(tmp_path)))
+
@@ -0,0 +1,42 @@
+from bisect import bisect_left, bisect_right
+
+from achi_search import SearchIndex
+from achi_store import KEY_FENCE_STEP
+
+from stores import category, leaf, store_file
+
+NAMES = ["Пункція спинного мозку", "Пункція суглоба", "Біопсія шкіри", "Біопсія печінки", "Ехографія серця"]
+
+
+def search_index(leaf_count: int = 40) -> SearchIndex:
+    leaves = [leaf(f"{40800 + index}-{index % 100:02d}", f"{NAMES[index % len(NAMES)]} {index}")
+              for index in range(leaf_count)]
+    tree = category("", {"Клас 1": category("Клас 1", leaves, code="1")})
+    return SearchIndex.from_store(store_file(achi=tree)["achi"])
+
+
+def test_key_search_matches_bisect_over_decoded_keys():
+    vocabulary = search_index(KEY_FENCE_STEP * 8)._vocabulary
+    keys = list(vocabulary)
+    assert len(keys) > KEY_FENCE_STEP * 4
+    for value in keys + ["", "а", "пун", "я\U0010ffff", "\U0010ffff"]:
+        for lo, hi in ((0, len(keys)), (3, len(keys) - 3), (KEY_FENCE_STEP + 1, KEY_FENCE_STEP * 2 - 1)):
+            assert vocabulary.bisect_left(value, lo, hi) == bisect_left(keys, value, lo, hi)
+            assert vocabulary.bisect_right(value, lo, hi) == bisect_right(keys, value, lo, hi)
+
+
+def test_search_by_code_and_name():
+    index = search_index()
+    leaf_nodes = [index.leaves[ordinal] for ordinal in range(len(index.leaves))]
+
+    assert index.search("40805-05")[0] == leaf_nodes[5]
+    assert set(index.search("біопсія шкіри")[:8]) == {leaf_nodes[ordinal] for ordinal in range(2, 40, 5)}
+    assert index.search("уйц") == []
+
+
+def test_separators_only_query_matches_no_codes():
+    index = search_index()
+
+    for query in (".", "-", " . - ", "–"):
+        assert index.search(query) == []
+    assert index.search("40805.-05")[0] == index.leaves[5]
@@ -0,0 +1,64 @@
+import os
+
+import achi_parser
+from achi_sqlite import ClassifierDatabase
+from achi_store import StoreFile, build_store
+from benchmarks.synthetic import ACHI_HEADER, achi_rows, write_csv
+from ingest import sqlite_export
+
+from stores import category, leaf
+
+
+def trees() -> dict:
+    return {
+        "achi": category("", {"Клас 1": category("Клас 1", {"Блок": category("Блок", [
+            leaf("30390-00", "Пункція спинного мозку"), leaf("30390-01", "Біопсія шкіри")], code="1")},
+            code="I")}),
+        "mkh10": category("", {"(A00-B99)": category("Інфекції", {"A00-A09": category("Кишкові інфекції", [
+            {"code": "A01.0", "name_ua": "Черевний тиф", "name_en": "Typhoid fever"}], code="A00-A09")},
+            code="(A00-B99)")}),
+    }
+
+
+def test_export_answers_children_code_lookup_and_text_search(tmp_path):
+    path = str(tmp_path / "classifiers.sqlite")
+    sqlite_export.write_database(trees(), path, source="edition")
+    database = ClassifierDatabase.open(path)
+    try:
+        assert database.names == ["achi", "mkh10"]
+        root = database.root("achi")
+        block = database.children(database.children(root.id)[0].id)[0]
+        assert [node.code for node in database.children(block.id)] == ["30390-00", "30390-01"]
+        assert [node.code for node in database.children(block.id, offset=1, limit=1)] == ["30390-01"]
+
+        # Codes are matched in their normalized form, in every classifier or one
+        assert [node.name_ua for node in database.lookup("3039000")] == ["Пункція спинного мозку"]
+        assert [node.code for node in database.lookup("a01.0", "mkh10")] == ["A01.0"]
+        assert database.lookup("A01.0", "achi") == []
+
+        # FTS5 over both names, the last token is a prefix
+        assert [node.code for node in database.search("пункція спин")] == ["30390-00"]
+        assert [node.code for node in database.search("typhoid")] == ["A01.0"]
+        assert database.search("біопсія", "mkh10") == []
+
+        # Ids match the store, offset by the classifier's root
+        leaf_node = database.lookup("30390-01")[0]
+        store = StoreFile(build_store(trees()))["achi"]
+        assert store.code(leaf_node.id - root.id) == "30390-01"
+        assert [node.name_ua for node in database.ancestors(leaf_node)][1:] == ["Клас 1", "Блок"]
+    finally:
+        database.close()
+    assert sqlite_export.database_source(path) == "edition"
+
+
+def test_parser_exports_a_missing_database_on_demand(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    write_csv(achi_parser.CSV_PATH, ACHI_HEADER, achi_rows(), achi_layout=True)
+    achi_parser.regenerate(workers=1)
+    exported = (tmp_path / achi_parser.SQLITE_PATH).read_bytes()
+
+    os.remove(achi_parser.SQLITE_PATH)
+    achi_parser.regenerate(workers=1)
+    assert "unchanged, skipping" in capsys.readouterr().out
+    assert (tmp_path / achi_parser.SQLITE_PATH).read_bytes() == exported
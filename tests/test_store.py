@@ -0,0 +1,21 @@
+import hashlib
+
+from achi_store import HEADER, StoreFile, build_store
+
+from stores import category, leaf
+
+
+def tree(name_ua: str) -> dict:
+    return category("", {"Клас": category("Клас", [leaf("30390-00", name_ua)], code="1")})
+
+
+def test_digest_is_written_at_build_time_and_read_from_the_header():
+    data = build_store({"achi": tree("Пункція")})
+    digest = StoreFile(data).digest
+    assert hashlib.sha256(data[HEADER.size:]).hexdigest().startswith(digest)
+    assert StoreFile(build_store({"achi": tree("Біопсія")})).digest != digest
+
+    # Opening doesn't hash the file: a body changed after the build keeps the recorded digest
+    tampered = bytearray(data)
+    tampered[-1] ^= 1
+    assert StoreFile(bytes(tampered)).digest == digest
@@ -0,0 +1,94 @@
+import asyncio
+import datetime
+
+from telegram import Chat, Message, Update
+
+from achi_updates import ChatOrderedUpdateProcessor
+
+DATE = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def chat_update(update_id: int, chat_id: int) -> Update:
+    return Update(update_id, message=Message(update_id, DATE, Chat(chat_id, Chat.PRIVATE), text="tap"))
+
+
+def test_backlog_of_one_chat_does_not_delay_another():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(2)
+        release = asyncio.Event()
+        handled = []
+
+        async def busy(update_id):
+            await release.wait()
+            handled.append(update_id)
+
+        async def quick(update_id):
+            handled.append(update_id)
+
+        busy_chat = [asyncio.ensure_future(processor.process_update(chat_update(update_id, 1), busy(update_id)))
+                     for update_id in range(1, 5)]
+        other_chat = asyncio.ensure_future(processor.process_update(chat_update(5, 2), quick(5)))
+        # The busy chat's first update holds a slot and its backlog waits for it, the other chat has the second
+        await asyncio.wait_for(other_chat, timeout=1)
+        assert handled == [5]
+
+        release.set()
+        await asyncio.gather(*busy_chat)
+        assert handled == [5, 1, 2, 3, 4]
+
+    asyncio.run(scenario())
+
+
+def test_updates_of_a_chat_run_one_at_a_time_in_order():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(8)
+        running = []
+        handled = []
+
+        async def handle(update_id):
+            running.append(update_id)
+            assert len(running) == 1
+            await asyncio.sleep(0)
+            running.remove(update_id)
+            handled.append(update_id)
+
+        await asyncio.gather(*(processor.process_update(chat_update(update_id, 1), handle(update_id))
+                               for update_id in range(1, 6)))
+        assert handled == [1, 2, 3, 4, 5]
+
+    asyncio.run(scenario())
+
+
+def test_chats_run_concurrently_while_each_chat_keeps_its_order():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(4)
+        other_chat_started = asyncio.Event()
+        running = {1: 0, 2: 0}
+        handled = []
+
+        async def handle(update_id, chat_id):
+            running[chat_id] += 1
+            assert running[chat_id] == 1
+            if update_id == 1:
+                # Only finishes if the other chat runs while this one is busy
+                await asyncio.wait_for(other_chat_started.wait(), timeout=1)
+            if update_id == 3:
+                other_chat_started.set()
+            await asyncio.sleep(0)
+            running[chat_id] -= 1
+            handled.append(update_id)
+
+        updates = [(1, 1), (2, 1), (3, 2), (4, 2)]
+        tasks = [asyncio.ensure_future(processor.process_update(chat_update(update_id, chat_id),
+                                                                handle(update_id, chat_id)))
+                 for update_id, chat_id in updates]
+        await asyncio.sleep(0)
+        # The library counts every accepted update, running or waiting for its chat's turn
+        assert processor.current_concurrent_updates == len(updates)
+        await asyncio.gather(*tasks)
+
+        assert [update_id for update_id in handled if update_id in (1, 2)] == [1, 2]
+        assert [update_id for update_id in handled if update_id in (3, 4)] == [3, 4]
+        assert processor.current_concurrent_updates == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from achi_webhook import SECRET_TOKEN_HEADER, WebhookConfig, WebhookServer
+
+SECRET = "test-secret"
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"},
+                                      "text": "tap"}}
+
+
+async def post(port: int, body: bytes, headers=None) -> asyncio.Task:
+    """Sends one request, the task resolves to the response status code."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    header_lines = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    writer.write(f"POST /telegram HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n{header_lines}\r\n".encode("latin-1") + body)
+    await writer.drain()
+
+    async def status() -> int:
+        try:
+            return int((await reader.readline()).split()[1])
+        finally:
+            writer.close()
+
+    return asyncio.ensure_future(status())
+
+
+def serve(scenario, queue_size: int = 10):
+    async def run():
+        application = SimpleNamespace(update_queue=asyncio.Queue(maxsize=queue_size), bot=None)
+        server = WebhookServer(application, WebhookConfig(url="http://localhost", secret_token=SECRET,
+                                                          host="127.0.0.1", port=0))
+        await server.start()
+        try:
+            await scenario(server.port, application.update_queue)
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_requests_without_the_secret_token_are_rejected():
+    async def scenario(port, queue):
+        body = json.dumps(UPDATE).encode()
+        assert await (await post(port, body)) == 403
+        assert await (await post(port, body, {SECRET_TOKEN_HEADER: "forged"})) == 403
+        assert queue.empty()
+        assert await (await post(port, body, {SECRET_TOKEN_HEADER: SECRET})) == 200
+        assert (await queue.get()).effective_chat.id == 7
+
+    serve(scenario)
+
+
+def test_bad_json_and_chunked_bodies_are_refused():
+    async def scenario(port, queue):
+        assert await (await post(port, b"{not json", {SECRET_TOKEN_HEADER: SECRET})) == 400
+        assert await (await post(port, b"", {SECRET_TOKEN_HEADER: SECRET, "Transfer-Encoding": "chunked"})) == 501
+        assert queue.empty()
+
+    serve(scenario)
+
+
+def test_a_full_update_queue_holds_the_response_back():
+    async def scenario(port, queue):
+        body = json.dumps(UPDATE).encode()
+        headers = {SECRET_TOKEN_HEADER: SECRET}
+        assert await (await post(port, body, headers)) == 200
+        held = await post(port, body, headers)
+        await asyncio.sleep(0.1)
+        assert not held.done()
+
+        await queue.get()
+        assert await asyncio.wait_for(held, timeout=1) == 200
+
+    serve(scenario, queue_size=1)
+
+
+def test_webhook_mode_does_not_start_without_a_secret(monkeypatch):
+    monkeypatch.setenv("WEBHOOK_URL", "https://achi-bot.fly.dev")
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    with pytest.raises(ValueError):
+        WebhookConfig.from_env()
+    monkeypatch.setenv("WEBHOOK_SECRET", "has spaces")
+    with pytest.raises(ValueError):
+        WebhookConfig.from_env()
+    monkeypatch.setenv("WEBHOOK_SECRET", SECRET)
+    assert WebhookConfig.from_env().secret_token == SECRET